@@ -0,0 +1,41 @@
+"""Add (user_id, reading_date, id) index to tarot_reading_history for keyset pagination
+
+Revision ID: b7e2c4a91d05
+Revises: 818a88d5404a
+Create Date: 2026-10-18 10:12:41.306512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2c4a91d05'
+down_revision: Union[str, None] = '818a88d5404a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently so the table stays writable; that cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_tarot_reading_history_user_date_id',
+            'tarot_reading_history',
+            ['user_id', 'reading_date', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_tarot_reading_history_user_date_id',
+            table_name='tarot_reading_history',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
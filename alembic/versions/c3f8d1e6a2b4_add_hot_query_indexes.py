@@ -0,0 +1,54 @@
+"""Add composite and partial indexes for the counsellor, plan and reflection hot queries
+
+Revision ID: c3f8d1e6a2b4
+Revises: b7e2c4a91d05
+Create Date: 2026-10-18 11:02:17.554920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8d1e6a2b4'
+down_revision: Union[str, None] = 'b7e2c4a91d05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ('ix_counsellor_message_history_user_session_updated', 'counsellor_message_history', ['user_id', 'session_id', 'last_updated_timestamp'], None),
+    ('ix_counsellor_message_history_user_private_updated', 'counsellor_message_history', ['user_id', 'private_message', 'last_updated_timestamp'], None),
+    ('ix_user_plans_user_type_updated', 'user_plans', ['user_id', 'plan_type', 'updated_at'], None),
+    ('ix_user_plans_user_active', 'user_plans', ['user_id'], 'active_plan'),
+    ('ix_user_reflections_user_updated', 'user_reflections', ['user_id', 'updated_at'], None),
+]
+
+
+def upgrade() -> None:
+    # The model has had private_message for a while, but no earlier migration adds it.
+    op.execute("ALTER TABLE counsellor_message_history ADD COLUMN IF NOT EXISTS private_message BOOLEAN DEFAULT false")
+
+    # Built concurrently so the tables stay writable; that cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    # private_message is deliberately kept: databases created from the models already had it
+    # before this revision, and dropping it would lose which messages were private.
@@ -0,0 +1,143 @@
+"""Partition counsellor_message_history by month on creation_timestamp
+
+Revision ID: d5a9e3c7b1f2
+Revises: c3f8d1e6a2b4
+Create Date: 2026-10-18 12:40:05.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9e3c7b1f2'
+down_revision: Union[str, None] = 'c3f8d1e6a2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = "id, user_id, creation_timestamp, last_updated_timestamp, user_message, counsellor_response, session_id, importance_score, embedding, private_message"
+
+# Created on the parent, so every partition (including ones created later) gets its own copy.
+INDEXES = [
+    "CREATE INDEX ix_counsellor_message_history_id ON counsellor_message_history (id)",
+    "CREATE INDEX ix_counsellor_message_history_user_session_updated ON counsellor_message_history (user_id, session_id, last_updated_timestamp)",
+    "CREATE INDEX ix_counsellor_message_history_user_private_updated ON counsellor_message_history (user_id, private_message, last_updated_timestamp)",
+    "CREATE INDEX counsellor_message_history_embedding_idx ON counsellor_message_history USING hnsw (embedding vector_l2_ops)",
+]
+
+OLD_INDEXES = [
+    "ix_counsellor_message_history_id",
+    "ix_counsellor_message_history_user_session_updated",
+    "ix_counsellor_message_history_user_private_updated",
+    "counsellor_message_history_embedding_idx",
+]
+
+# Creates the missing monthly partitions covering [start_at, end_at]. Called by the application
+# (app/services/database/partition_database_services.py) to stay a few months ahead.
+CREATE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_counsellor_message_partitions(start_at timestamp, end_at timestamp)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', start_at);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    -- Several workers run this at startup.
+    PERFORM pg_advisory_xact_lock(hashtext('create_counsellor_message_partitions'));
+    WHILE month_start <= end_at LOOP
+        partition_name := 'counsellor_message_history_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF counsellor_message_history FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + interval '1 month'
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    # Rewrites the table under an exclusive lock; run it in a quiet period.
+    op.execute("LOCK TABLE counsellor_message_history IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE counsellor_message_history RENAME TO counsellor_message_history_unpartitioned")
+    op.execute("ALTER TABLE counsellor_message_history_unpartitioned RENAME CONSTRAINT counsellor_message_history_pkey TO counsellor_message_history_unpartitioned_pkey")
+    for name in OLD_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("ALTER TABLE counsellor_message_history_unpartitioned ADD COLUMN IF NOT EXISTS private_message BOOLEAN DEFAULT false")
+
+    # The partition key has to be part of the primary key. ids still come from the existing sequence.
+    op.execute("""
+        CREATE TABLE counsellor_message_history (
+            id INTEGER NOT NULL DEFAULT nextval('counsellor_message_history_id_seq'),
+            user_id INTEGER REFERENCES users (id),
+            creation_timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            last_updated_timestamp TIMESTAMP WITHOUT TIME ZONE DEFAULT now(),
+            user_message TEXT,
+            counsellor_response TEXT,
+            session_id VARCHAR,
+            importance_score INTEGER,
+            embedding vector(384),
+            private_message BOOLEAN DEFAULT false,
+            PRIMARY KEY (id, creation_timestamp)
+        ) PARTITION BY RANGE (creation_timestamp)
+    """)
+    op.execute("ALTER SEQUENCE counsellor_message_history_id_seq OWNED BY counsellor_message_history.id")
+    # Catches rows outside every monthly partition, so an insert never fails for lack of one.
+    op.execute("CREATE TABLE counsellor_message_history_default PARTITION OF counsellor_message_history DEFAULT")
+
+    op.execute(CREATE_PARTITIONS_FUNCTION)
+    op.execute("""
+        SELECT create_counsellor_message_partitions(
+            COALESCE((SELECT min(creation_timestamp) FROM counsellor_message_history_unpartitioned), now()::timestamp),
+            (now() + interval '3 months')::timestamp
+        )
+    """)
+
+    op.execute(f"""
+        INSERT INTO counsellor_message_history ({COLUMNS})
+        SELECT id, user_id, COALESCE(creation_timestamp, last_updated_timestamp, now()), last_updated_timestamp,
+               user_message, counsellor_response, session_id, importance_score, embedding, COALESCE(private_message, false)
+        FROM counsellor_message_history_unpartitioned
+    """)
+    # Built after the copy, which is much faster than maintaining them row by row.
+    for statement in INDEXES:
+        op.execute(statement)
+
+    op.execute("DROP TABLE counsellor_message_history_unpartitioned")
+
+
+def downgrade() -> None:
+    op.execute("LOCK TABLE counsellor_message_history IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE counsellor_message_history RENAME TO counsellor_message_history_partitioned")
+    for name in OLD_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.execute("""
+        CREATE TABLE counsellor_message_history (
+            id INTEGER NOT NULL DEFAULT nextval('counsellor_message_history_id_seq'),
+            user_id INTEGER REFERENCES users (id),
+            creation_timestamp TIMESTAMP WITHOUT TIME ZONE DEFAULT now(),
+            last_updated_timestamp TIMESTAMP WITHOUT TIME ZONE DEFAULT now(),
+            user_message TEXT,
+            counsellor_response TEXT,
+            session_id VARCHAR,
+            importance_score INTEGER,
+            embedding vector(384),
+            private_message BOOLEAN DEFAULT false
+        )
+    """)
+    op.execute("ALTER SEQUENCE counsellor_message_history_id_seq OWNED BY counsellor_message_history.id")
+    op.execute(f"INSERT INTO counsellor_message_history ({COLUMNS}) SELECT {COLUMNS} FROM counsellor_message_history_partitioned")
+    op.execute("DROP TABLE counsellor_message_history_partitioned")
+    op.execute("ALTER TABLE counsellor_message_history ADD CONSTRAINT counsellor_message_history_pkey PRIMARY KEY (id)")
+    for statement in INDEXES:
+        op.execute(statement)
+    op.execute("DROP FUNCTION IF EXISTS create_counsellor_message_partitions(timestamp, timestamp)")
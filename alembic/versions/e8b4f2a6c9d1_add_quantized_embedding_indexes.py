@@ -0,0 +1,72 @@
+"""Add halfvec and binary-quantized HNSW expression indexes on the 384-d embeddings
+
+Needs pgvector 0.7.0 or later, and does not update the extension itself.
+
+Revision ID: e8b4f2a6c9d1
+Revises: d5a9e3c7b1f2
+Create Date: 2026-10-18 14:15:52.730418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b4f2a6c9d1'
+down_revision: Union[str, None] = 'd5a9e3c7b1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, partitioned). The expressions must match QUANTIZED_DISTANCES in
+# app/services/database/embedding_database_services.py for the planner to use the indexes.
+TABLES = [
+    ('importance_sample_messages', False),
+    ('user_reflections', False),
+    ('counsellor_message_history', True),
+]
+
+INDEXES = {
+    'halfvec': "USING hnsw ((embedding::halfvec(384)) halfvec_l2_ops)",
+    'binary': "USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops)",
+}
+
+
+# halfvec and binary_quantize were added in pgvector 0.7.0.
+MIN_PGVECTOR_VERSION = (0, 7, 0)
+
+
+def check_pgvector_version() -> None:
+    """
+    Upgrading the extension is left to the database owner: it needs the newer
+    pgvector binaries installed, and ALTER EXTENSION needs the extension owner.
+    """
+    version = op.get_bind().execute(sa.text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    required = '.'.join(map(str, MIN_PGVECTOR_VERSION))
+    if version is None:
+        raise RuntimeError(f"The vector extension is not installed; this migration needs pgvector {required} or later.")
+    if tuple(int(part) for part in version.split('.')[:3]) < MIN_PGVECTOR_VERSION:
+        raise RuntimeError(
+            f"pgvector {version} is installed, but this migration needs {required} or later for halfvec and "
+            f"binary_quantize. Install a newer pgvector and run ALTER EXTENSION vector UPDATE as the extension owner."
+        )
+
+
+def upgrade() -> None:
+    check_pgvector_version()
+    with op.get_context().autocommit_block():
+        for table, partitioned in TABLES:
+            for kind, definition in INDEXES.items():
+                # Partitioned tables cannot build an index concurrently; each partition's copy is built in turn.
+                concurrently = "" if partitioned else "CONCURRENTLY "
+                op.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS {table}_embedding_{kind}_idx ON {table} {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, partitioned in TABLES:
+            for kind in INDEXES:
+                concurrently = "" if partitioned else "CONCURRENTLY "
+                op.execute(f"DROP INDEX {concurrently}IF EXISTS {table}_embedding_{kind}_idx")
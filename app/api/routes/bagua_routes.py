@@ -2,15 +2,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 
-from redis.asyncio import Redis
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.core.dependencies import get_redis_client
-from app.data.database import get_db
+from app.core.tracing import traced_stream
 
 from app.models.llm_models import ChatRequest
 from app.services.auth_services import get_current_user_from_cookie
 from app.services.bagua_services import analyze_bagua_request
+from app.services.streaming.resumable import text_stream
+from app.services.streaming.single_flight import join_single_flight, single_flight_key
 
 router = APIRouter()
 
@@ -18,14 +16,16 @@ router = APIRouter()
 async def analyze_bagua(
     request: ChatRequest,
     user: str | None = Depends(get_current_user_from_cookie),
-    redis_client: Redis = Depends(get_redis_client),
-    db: AsyncSession = Depends(get_db)
 ):
     """
     Analyze a Bagua-related query.  The user provides their question/context.
+    Identical requests in flight at the same time share one LLM stream.
     """
     try:
-        return StreamingResponse(analyze_bagua_request(request, db=db, user=user), media_type="text/plain")
+        user_id = getattr(user, "id", None)
+        key = single_flight_key("bagua", user_id, request)
+        broadcaster = join_single_flight(key, lambda db, redis_client: analyze_bagua_request(request, db=db, redis_client=redis_client, user=user), "bagua", user_id, grace_seconds=0)
+        return StreamingResponse(traced_stream("bagua", text_stream(broadcaster)), media_type="text/plain")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -1,18 +1,15 @@
 # app/api/routes/counsellor_routes.py
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import StreamingResponse
 
-from redis.asyncio import Redis
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.core.dependencies import get_redis_client
-from app.data.database import get_db
+from app.core.tracing import traced_stream
 
 from app.models.counsellor_models import CounsellorChatRequest
 from app.models.database_models.user import User
 
 from app.services.auth_services import get_current_user_from_cookie
-from app.services.counsellor_services import analyse_counsellor_request
+from app.services.counsellor_services import analyse_counsellor_request, validate_counsellor_request
+from app.services.streaming.resumable import resume_stream, sse_events, start_stream
 
 
 router = APIRouter()
@@ -20,17 +17,30 @@ router = APIRouter()
 @router.post("/chat")
 async def chat(
     request: CounsellorChatRequest,
-    db: AsyncSession = Depends(get_db), 
-    redis_client: Redis = Depends(get_redis_client),
     user: User | None = Depends(get_current_user_from_cookie),
+    last_event_id: str | None = Header(None),
 ):
     """
     Handle user chat with LLM session management.
+    A reconnect with a Last-Event-ID header resumes the reply from the Redis buffer
+    instead of sending the message again.
     """
+    user_id = getattr(user, "id", None)
     try:
         # print(f"User:{user}")
-        return StreamingResponse(analyse_counsellor_request(request, db, redis_client, user), media_type="text/event-stream")
-
+        if last_event_id:
+            resumed = await resume_stream(last_event_id, user_id, "counsellor")
+            if resumed is None:
+                raise HTTPException(status_code=410, detail="Stream can no longer be resumed")
+            broadcaster, last_seq = resumed
+            return StreamingResponse(traced_stream("counsellor", sse_events(broadcaster, last_seq)), media_type="text/event-stream")
+
+        validate_counsellor_request(request)
+        broadcaster = start_stream(lambda db, redis_client: analyse_counsellor_request(request, db, redis_client, user), "counsellor", user_id)
+        return StreamingResponse(traced_stream("counsellor", sse_events(broadcaster)), media_type="text/event-stream")
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
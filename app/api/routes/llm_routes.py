@@ -6,6 +6,7 @@ from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.dependencies import get_redis_client
+from app.core.tracing import traced_stream
 from app.data.database import get_db
 
 from app.models.database_models.user import User
@@ -24,7 +25,7 @@ async def chat(request: ChatRequest,
     Handle user chat with LLM session management, streaming the response.
     """
     try:
-        return StreamingResponse(chat_logic(request, db, redis_client, "dummy_user_id"), media_type="text/event-stream")
+        return StreamingResponse(traced_stream("llm_chat", chat_logic(request, db, redis_client, "dummy_user_id")), media_type="text/event-stream")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,7 +1,27 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response
+
+from app.core.tracing import render_metrics
+from app.core.warmup import warmup_state
 
 router = APIRouter()
 
 @router.get("/")
 async def read_root():
     return {"message": "Welcome to the Fortune Telling API!"}
+
+@router.get("/ready")
+async def ready():
+    """
+    Readiness probe for the load balancer. Returns 503 until the worker's warm-up has finished.
+    """
+    status_code = 200 if warmup_state["ready"] else 503
+    return JSONResponse(status_code=status_code, content=warmup_state)
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency, time to first chunk, LLM TTFT and tokens/sec.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
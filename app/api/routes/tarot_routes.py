@@ -1,19 +1,28 @@
 # app/api/routes/tarot_routes.py
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
-from redis.asyncio import Redis
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.dependencies import get_redis_client
+from app.core.tracing import traced_stream
+from app.data.card_images import card_image_path, get_card_image_manifest
 from app.data.database import get_db
+from app.data.tarot_catalog import CatalogPayload, get_card_payload, get_catalog, negotiate_encoding
 
-from app.models.database_models.tarot_reading_history import TarotReadingHistory
-from app.models.tarot_models import TarotAnalysisRequest
+from app.models.tarot_models import TarotAnalysisRequest, TarotBatchDrawRequest, TarotDrawRequest
 
 from app.services.auth_services import get_current_user_from_cookie
-from app.services.tarot_services import analyze_tarot_logic
+from app.services.database.tarot_database_services import (
+    compute_etag,
+    get_tarot_reading,
+    get_tarot_reading_page,
+    parse_cards,
+)
+from app.services.streaming.resumable import resume_stream, sse_events
+from app.services.streaming.single_flight import join_single_flight, single_flight_key
+from app.services.tarot_draw_services import SPREADS, draw_batch, draw_spread, new_seed
+from app.services.tarot_services import analyze_tarot_logic, validate_tarot_request
 
 router = APIRouter()
 
@@ -21,45 +30,202 @@ router = APIRouter()
 async def analyze_tarot(
     request: TarotAnalysisRequest,
     user: str | None = Depends(get_current_user_from_cookie),
-    redis_client: Redis = Depends(get_redis_client),
-    db: AsyncSession = Depends(get_db)
+    last_event_id: str | None = Header(None),
 ):
     """
     Analyze the tarot draw results in the context of the user's query.
+    Identical requests in flight at the same time share one LLM stream.
+    A reconnect with a Last-Event-ID header resumes the stream from the Redis buffer.
     """
+    user_id = getattr(user, "id", None)
     try:
-        print(request)
-        return StreamingResponse(analyze_tarot_logic(request, db=db, redis_client=redis_client, user=user), media_type="text/event-stream")
+        if last_event_id:
+            resumed = await resume_stream(last_event_id, user_id, "tarot")
+            if resumed is None:
+                raise HTTPException(status_code=410, detail="Stream can no longer be resumed")
+            broadcaster, last_seq = resumed
+            return StreamingResponse(traced_stream("tarot", sse_events(broadcaster, last_seq)), media_type="text/event-stream")
 
-        
+        validate_tarot_request(request)
+        key = single_flight_key("tarot", user_id, request)
+        broadcaster = join_single_flight(key, lambda db, redis_client: analyze_tarot_logic(request, db=db, redis_client=redis_client, user=user), "tarot", user_id)
+        return StreamingResponse(traced_stream("tarot", sse_events(broadcaster)), media_type="text/event-stream")
+
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@router.get("/spreads")
+async def get_tarot_spreads():
+    """The spreads /draw supports, with the position of each card."""
+    return SPREADS
+
+@router.post("/draw")
+async def draw_tarot_spread(request: TarotDrawRequest):
+    """
+    Draws a spread without repeated cards. The response carries the seed:
+    posting it back replays exactly the same draw.
+    """
+    try:
+        return draw_spread(request.spread, request.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/draw/batch")
+async def draw_tarot_spreads(request: TarotBatchDrawRequest):
+    """Draws `count` spreads with new seeds, or replays the given seeds, in one call."""
+    try:
+        return {"draws": draw_batch(request.seeds or [new_seed() for _ in range(request.count)], request.spread)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _format_date(value):
+    return value.strftime("%Y-%m-%d %H:%M") if value else None
+
+
+def _etag_matches(if_none_match: str | None, etags: list) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or any(etag in tags for etag in etags)
+
+
+def _conditional_json(payload, if_none_match: str | None, response: Response):
+    """
+    Returns `payload` with an ETag set on the route's injected `response`, or a 304
+    with no body if the client already has this version. Headers already set on
+    `response`, such as the cookies get_current_user_from_cookie sets when it
+    refreshes the tokens, are kept either way.
+    """
+    payload = jsonable_encoder(payload)
+    etag = compute_etag(payload)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if _etag_matches(if_none_match, [etag]):
+        not_modified = Response(status_code=304)
+        not_modified.raw_headers.extend(response.raw_headers)
+        return not_modified
+    return payload
+
+
+def _catalog_response(payload: CatalogPayload, accept_encoding: str | None, if_none_match: str | None):
+    """Sends pre-serialized catalog bytes in the best pre-compressed coding the client accepts."""
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {
+        "ETag": payload.etag_for(encoding),
+        "Cache-Control": "public, max-age=3600",
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(if_none_match, [payload.etag_for(coding) for coding in (None, "gzip", "br")]):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(payload.encoded(encoding), media_type="application/json", headers=headers)
+
+
+@router.get("/cards")
+async def get_tarot_card_catalog(
+    language: str = Query("en"),
+    accept_encoding: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+):
+    """
+    The whole card catalog in one language (en, zh or zh_TW). Pass a card's
+    `name` (always English) to /analyze; `display_name` is the translated name.
+    """
+    return _catalog_response(get_catalog(language).catalog, accept_encoding, if_none_match)
+
+@router.get("/cards/{key}")
+async def get_tarot_card(
+    key: str,
+    language: str = Query("en"),
+    accept_encoding: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+):
+    """A single card by id (m00, s05), English or translated name, or major arcana number."""
+    payload = get_card_payload(language, key)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Card not found")
+    return _catalog_response(payload, accept_encoding, if_none_match)
+
+
+@router.get("/card-images/manifest")
+async def get_card_images(response: Response, if_none_match: str | None = Header(None)):
+    """
+    The built card images: card image name -> orientation -> width -> format -> file name.
+    Fetch a file from /card-images/{file_name}.
+    """
+    manifest = get_card_image_manifest()
+    return _conditional_json({key: value for key, value in manifest.items() if key != "files"}, if_none_match, response)
+
+@router.get("/card-images/{file_name}")
+async def get_card_image(file_name: str):
+    """Serves a built card image. File names carry a content hash, so they can be cached forever."""
+    path = card_image_path(file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(
+        path,
+        media_type=f"image/{file_name.rsplit('.', 1)[-1]}",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
 @router.get("/history")
-async def get_tarot_history(user_id: str = Depends(get_current_user_from_cookie), db: AsyncSession = Depends(get_db)):
-    """Fetch a user's tarot reading history."""
-    result = await db.execute(select(TarotReadingHistory).where(TarotReadingHistory.user_id == user_id).order_by(TarotReadingHistory.date.desc()))
-    readings = result.scalars().all()
-    
-    return [
+async def get_tarot_history(
+    response: Response,
+    cursor: str | None = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    user = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Fetch one page of a user's tarot reading history, newest first.
+    Readings are summarised without their interpretation; fetch /history/{reading_id} for that.
+    Pass the returned next_cursor to get the following page.
+    """
+    try:
+        summaries, next_cursor = await get_tarot_reading_page(db, user.id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for summary in summaries:
+        summary["date"] = _format_date(summary["date"])
+    return _conditional_json({"items": summaries, "next_cursor": next_cursor}, if_none_match, response)
+
+@router.get("/history/{reading_id}")
+async def get_tarot_reading_detail(
+    reading_id: int,
+    response: Response,
+    user = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db),
+    if_none_match: str | None = Header(None),
+):
+    """Fetch a single tarot reading, including its interpretation."""
+    reading = await get_tarot_reading(db, user.id, reading_id)
+    if not reading:
+        raise HTTPException(status_code=404, detail="Reading not found")
+
+    return _conditional_json(
         {
             "id": reading.id,
-            "date": reading.date.strftime("%Y-%m-%d %H:%M"),
+            "date": _format_date(reading.reading_date),
             "spread": reading.spread,
-            "cards": reading.cards,
+            "cards": parse_cards(reading.cards_drawn),
             "user_context": reading.user_context,
-            "analysis": reading.analysis
-        }
-        for reading in readings
-    ]
+            "interpretation": reading.interpretation,
+        },
+        if_none_match,
+        response,
+    )
 
 @router.delete("/history/{reading_id}")
-async def delete_tarot_reading(reading_id: int, user_id: str = Depends(get_current_user_from_cookie), db: AsyncSession = Depends(get_db)):
+async def delete_tarot_reading(reading_id: int, user = Depends(get_current_user_from_cookie), db: AsyncSession = Depends(get_db)):
     """Delete a specific tarot reading."""
-    result = await db.execute(select(TarotReadingHistory).where(TarotReadingHistory.id == reading_id, TarotReadingHistory.user_id == user_id))
-    reading = result.scalars().first()
+    reading = await get_tarot_reading(db, user.id, reading_id)
     
     if not reading:
         raise HTTPException(status_code=404, detail="Reading not found")
@@ -1,9 +1,12 @@
 # app/core/config.py
+import logging
 import os
+from functools import lru_cache
 
-from google import genai
 from pydantic_settings import BaseSettings
 
+logger = logging.getLogger(__name__)
+
 class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -25,6 +28,91 @@ class Settings(BaseSettings):
     GOOGLE_PROJECT_ID: str
     GOOGLE_REGION: str
     DEBUG: bool = False
+
+    WARMUP_ENABLED: bool = True
+    WARMUP_DB_CONNECTIONS: int = 2
+    WARMUP_REDIS_CONNECTIONS: int = 2
+    WARMUP_RETRY_SECONDS: float = 5.0
+
+    OTEL_ENABLED: bool = False
+
+    # Once a chat session's history passes CHAT_SUMMARY_TRIGGER_TOKENS, all but the last
+    # CHAT_SUMMARY_KEEP_TURNS turns are summarised in the background.
+    CHAT_SUMMARY_TRIGGER_TOKENS: int = 6000
+    CHAT_SUMMARY_KEEP_TURNS: int = 2
+    CHAT_SUMMARY_MAX_TOKENS: int = 400
+    CHAT_SUMMARY_MODEL: str = "gemini-2.0-flash-lite"
+
+    # Gemini context caching of system instructions. Instructions shorter than the minimum are sent inline.
+    CONTEXT_CACHE_ENABLED: bool = True
+    CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    CONTEXT_CACHE_MIN_TOKENS: int = 1024
+    CONTEXT_CACHE_FAILURE_TTL_SECONDS: int = 600
+
+    # Identical in-flight tarot/bagua requests share one upstream stream, across workers via Redis.
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_LOCK_TTL_SECONDS: int = 60
+
+    # Streamed responses are buffered in Redis this long, for relays to other workers and Last-Event-ID resumes.
+    STREAM_BUFFER_TTL_SECONDS: int = 300
+    STREAM_IDLE_TIMEOUT_SECONDS: float = 30.0
+    # Chunks are written to the client in batches of up to STREAM_COALESCE_BYTES, or after STREAM_COALESCE_MS.
+    STREAM_COALESCE_MS: int = 20
+    STREAM_COALESCE_BYTES: int = 512
+    # The upstream call is cancelled once no client has been connected for this long.
+    STREAM_ABANDON_GRACE_SECONDS: float = 10.0
+    # On shutdown, streams still being produced get this long to finish (and save their results)
+    # before they are cancelled and the batch writers are closed.
+    STREAM_SHUTDOWN_DRAIN_SECONDS: float = 20.0
+    # Store what was generated before a cancelled stream stopped (marked with " …") instead of discarding it.
+    PERSIST_PARTIAL_RESULTS: bool = False
+
+    # counsellor_message_history is partitioned by month. Partitions are kept this many months
+    # ahead, checked every MESSAGE_PARTITION_CHECK_HOURS.
+    MESSAGE_PARTITION_MONTHS_AHEAD: int = 3
+    MESSAGE_PARTITION_CHECK_HOURS: float = 24.0
+    # Retrieval only reads messages this recent, so older partitions are pruned. 0 searches them all.
+    COUNSELLOR_RETRIEVAL_MAX_AGE_DAYS: int = 180
+    # Retrieval with a scoring profile fetches the RETRIEVAL_CANDIDATES nearest rows and re-ranks
+    # them in NumPy (see app/services/database/reranking.py) instead of scoring every row in SQL.
+    # Off by default: the HNSW index applies the per-user filter only after returning ef_search rows
+    # from the whole table, so a user's candidates can come back short or empty. Enable it together
+    # with RETRIEVAL_HNSW_ITERATIVE_SCAN (pgvector 0.8+), which keeps scanning until enough rows match.
+    RETRIEVAL_RERANK_IN_NUMPY: bool = False
+    RETRIEVAL_HNSW_ITERATIVE_SCAN: bool = False
+    RETRIEVAL_CANDIDATES: int = 100
+    # Vector search runs on the full-precision embeddings ("full"), or on the halfvec or binary-quantized
+    # expression indexes ("halfvec", "binary"), fetching VECTOR_RESCORE_FACTOR times as many
+    # candidates and rescoring them against the full vectors. The quantized modes need pgvector 0.7+.
+    VECTOR_SEARCH_MODE: str = "full"
+    VECTOR_RESCORE_FACTOR: int = 4
+    # Retrieved counsellor history is diversified with MMR (1.0 = relevance only), and turns at least
+    # this cosine-similar to one already picked are dropped before the prompt is built.
+    COUNSELLOR_MMR_LAMBDA: float = 0.7
+    COUNSELLOR_DUPLICATE_SIMILARITY: float = 0.92
+
+    # Output of app/scripts/build_card_images.py, served by /api/tarot/card-images.
+    CARD_IMAGE_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "cards")
+
+    # Tarot readings are saved by a batch writer (app/services/database/batch_writer.py) in multi-row
+    # INSERTs of up to TAROT_HISTORY_BATCH_ROWS, at most TAROT_HISTORY_FLUSH_MS after the first is queued.
+    # With TAROT_HISTORY_AWAIT_WRITE a reading's stream ends only once the reading is committed.
+    TAROT_HISTORY_BATCH_ROWS: int = 100
+    TAROT_HISTORY_FLUSH_MS: float = 200
+    TAROT_HISTORY_AWAIT_WRITE: bool = True
+    # Counsellor turns go through a batch writer too, and a reply waits for its turn to be committed
+    # before the turn is pushed to the Redis history the next prompt reads. With
+    # COUNSELLOR_MESSAGE_WRITE_BEHIND it only waits for the turn to be queued: replies finish sooner,
+    # but turns still buffered when a worker crashes are lost (counted as "failed" rows).
+    COUNSELLOR_MESSAGE_BATCH_ROWS: int = 100
+    COUNSELLOR_MESSAGE_FLUSH_MS: float = 100
+    COUNSELLOR_MESSAGE_WRITE_BEHIND: bool = False
+
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""
+    LOG_FORMAT: str = "text"
+    LOG_PAYLOAD_MAX_CHARS: int = 2000
+    LOG_PAYLOAD_SAMPLE_SECONDS: float = 60.0
     
     class Config:
         env_file = ".env"
@@ -32,9 +120,8 @@ class Settings(BaseSettings):
 
 
 settings = Settings()
-print(f"Loaded SERVER_IP: {settings.SERVER_IP}")
-print(f"Loaded REDIS_URL: {settings.REDIS_URL}")
-print(f"Loaded DATABASE_URL: {settings.DATABASE_URL}")
+logger.debug("Loaded SERVER_IP: %s", settings.SERVER_IP)
+logger.debug("Loaded REDIS_URL: %s", settings.REDIS_URL)
 
 def load_gemini_api_key():
     """
@@ -50,5 +137,9 @@ def load_gemini_api_key():
     except Exception as e:
         raise RuntimeError(f"Error reading API key file: {e}")
 
-GEMINI_API_KEY = load_gemini_api_key()
-gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+@lru_cache(maxsize=None)
+def get_gemini_api_key() -> str:
+    """
+    Returns the Gemini API key, reading the secrets file on first use only.
+    """
+    return load_gemini_api_key()
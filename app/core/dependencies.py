@@ -3,10 +3,18 @@ import redis.asyncio as redis
 
 from app.core.config import settings
 
+# Shared by every request so connections are reused instead of opened per request.
+redis_pool = redis.ConnectionPool.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+def create_redis_client() -> redis.Redis:
+    """Creates a Redis client backed by the shared connection pool."""
+    return redis.Redis(connection_pool=redis_pool)
+
 async def get_redis_client():
     """Dependency to provide a Redis client."""
-    redis_client = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+    redis_client = create_redis_client()
     try:
         yield redis_client
     finally:
-        await redis_client.close()
\ No newline at end of file
+        # Returns connections to the shared pool; the pool itself stays open.
+        await redis_client.close()
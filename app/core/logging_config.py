@@ -0,0 +1,108 @@
+# app/core/logging_config.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Optional
+
+from app.core.config import settings
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+_payload_lock = threading.Lock()
+_payload_last_logged = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra={...}` fields passed to the log call."""
+
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self._RESERVED})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _parse_levels(levels: str) -> dict:
+    """Parses "app.services=DEBUG,sqlalchemy.engine=WARNING" into {logger name: level}."""
+    parsed = {}
+    for item in levels.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+def configure_logging():
+    """
+    Configures logging once for the whole application.
+
+    Records are put on an in-memory queue by a QueueHandler and written to
+    stderr by a QueueListener thread, so request handlers never block on log
+    I/O. The root level comes from LOG_LEVEL and per-module overrides from
+    LOG_LEVELS, e.g. LOG_LEVELS="app.services.counsellor_services=DEBUG".
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    if settings.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    for name, level in _parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def log_payload(logger: logging.Logger, label: str, payload, level: int = logging.DEBUG):
+    """
+    Logs a potentially large payload (prompt, system instruction, request body).
+
+    Nothing is formatted unless `level` is enabled for `logger`. The payload
+    itself is included at most once per LOG_PAYLOAD_SAMPLE_SECONDS for each
+    (logger, label) pair and is truncated to LOG_PAYLOAD_MAX_CHARS; other
+    calls only log its size.
+    """
+    if not logger.isEnabledFor(level):
+        return
+
+    text = payload if isinstance(payload, str) else repr(payload)
+    size = len(text)
+    key = (logger.name, label)
+    now = time.monotonic()
+    with _payload_lock:
+        sampled = now - _payload_last_logged.get(key, float("-inf")) >= settings.LOG_PAYLOAD_SAMPLE_SECONDS
+        if sampled:
+            _payload_last_logged[key] = now
+
+    if not sampled:
+        logger.log(level, "%s (%d chars, not sampled)", label, size, extra={"payload_chars": size})
+        return
+
+    if size > settings.LOG_PAYLOAD_MAX_CHARS:
+        text = text[:settings.LOG_PAYLOAD_MAX_CHARS] + f"... [truncated {size - settings.LOG_PAYLOAD_MAX_CHARS} chars]"
+    logger.log(level, "%s (%d chars): %s", label, size, text, extra={"payload_chars": size})
@@ -1,47 +1,90 @@
 # app/core/startup.py
-from datetime import datetime  # Corrected import
+import asyncio
 
 from fastapi import FastAPI
 from fastapi_limiter import FastAPILimiter
 
-from google import genai
 from redis.asyncio import Redis
 
-from app.core.config import GEMINI_API_KEY, settings
-from app.core.dependencies import get_redis_client
-from app.core.sessions import chat_sessions
-from app.data.tarot import load_tarot_data
+from app.core.config import get_gemini_api_key, settings
+from app.core.dependencies import create_redis_client
 
 redis_client_instance: Redis = None
 llm_clients = {}
 
+# Model of one-off queries (reflections, plans, importance ratings) that name none.
+ONE_SHOT_MODEL = "gemini-2.0-flash-lite"
+
+
+def get_llm_client(client_type: str):
+    """
+    Returns the genai client for `client_type` ("gemini" or "vertex"), creating it on first use.
+    google.genai is imported here so that importing the app does not pay for it.
+    """
+    if client_type not in llm_clients:
+        from google import genai
+
+        if client_type == "gemini":
+            llm_clients["gemini"] = genai.Client(api_key=get_gemini_api_key())
+        elif client_type == "vertex":
+            llm_clients["vertex"] = genai.Client(vertexai=True, project=settings.GOOGLE_PROJECT_ID, location=settings.GOOGLE_REGION)
+        else:
+            raise ValueError(f"Unknown LLM client type: {client_type}")
+
+    return llm_clients[client_type]
+
+
 async def startup_event(app: FastAPI):
     """
     Initialize resources on application startup.
+
+    Only cheap resources are set up here. The tarot data, LLM clients and the
+    embedding model are created lazily by their accessors on first use, and
+    pre-loaded by the warm-up task started at the end (see app/core/warmup.py).
+    Background tasks are kept on app.state so that shutdown_event can stop them.
     """
     global redis_client_instance
-    global llm_clients
-    global chat_sessions
 
     try:
-        load_tarot_data("app/data/optimized_tarot_translated.json")
-        print("Tarot data loaded successfully.")
-
-        llm_clients["gemini"] = genai.Client(api_key=GEMINI_API_KEY)
-        llm_clients["vertex"] = genai.Client(vertexai=True, project=settings.GOOGLE_PROJECT_ID, location=settings.GOOGLE_REGION)
-
-        chat_sessions["dummy_session"] = {
-            "chat_session": llm_clients["gemini"].chats.create(model="gemini-2.0-flash-lite"),
-            "last_used": datetime.now(),
-            "user_id": "dummy_user_id"
-        }
-        async for client in get_redis_client():
-            redis_client_instance = client
-            break 
+        redis_client_instance = create_redis_client()
 
         await FastAPILimiter.init(redis_client_instance, prefix="limit:")
         print("FastAPILimiter initialized successfully.")
 
+        from app.core.warmup import run_warmup
+        app.state.warmup_task = asyncio.create_task(run_warmup())
+
+        from app.services.database.partition_database_services import maintain_message_partitions
+        app.state.partition_task = asyncio.create_task(maintain_message_partitions())
+
     except Exception as e:
         print(f"Failed to startup: {e}")
         raise
+
+
+async def _cancel(task: asyncio.Task):
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def shutdown_event(app: FastAPI):
+    """
+    Stops the background tasks started by startup_event and lets streams still
+    being produced finish, then writes rows still buffered by the batch writers
+    before the worker exits.
+    """
+    from app.services.database.counsellor_database_services import counsellor_message_writer
+    from app.services.database.tarot_database_services import tarot_history_writer
+    from app.services.streaming.resumable import drain
+
+    await asyncio.gather(
+        _cancel(getattr(app.state, "warmup_task", None)),
+        _cancel(getattr(app.state, "partition_task", None)),
+        drain(settings.STREAM_SHUTDOWN_DRAIN_SECONDS),
+    )
+    await asyncio.gather(tarot_history_writer.close(), counsellor_message_writer.close())
@@ -0,0 +1,157 @@
+# app/core/tracing.py
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import AsyncGenerator, AsyncIterator, Dict, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+
+from app.core.config import settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry is optional
+    otel_trace = None
+
+_tracer = otel_trace.get_tracer("website-backend-api") if otel_trace and settings.OTEL_ENABLED else None
+
+# The route currently being served, e.g. "tarot" or "counsellor". Set by traced_stream.
+current_route: ContextVar[str] = ContextVar("current_route", default="unknown")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    "app_stage_duration_seconds",
+    "Time spent in each stage of a request (prompt_build, retrieval, embedding, persistence, ...).",
+    ["route", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_CHUNK = Histogram(
+    "app_time_to_first_chunk_seconds",
+    "Time from the request reaching the route to the first streamed chunk.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+STREAM_DURATION = Histogram(
+    "app_stream_duration_seconds",
+    "Total time from the request reaching the route to the end of the stream, including post-stream work.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "app_llm_time_to_first_token_seconds",
+    "Time from sending a prompt upstream to receiving the first chunk back.",
+    ["route", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "app_llm_tokens_per_second",
+    "Upstream generation throughput after the first chunk.",
+    ["route", "model"],
+    buckets=(5, 10, 25, 50, 100, 200, 400, 800, 1600),
+)
+LLM_STREAMS_CANCELLED = Counter(
+    "app_llm_streams_cancelled_total",
+    "Upstream LLM streams cancelled before finishing, e.g. because the client disconnected.",
+    ["route", "model"],
+)
+LLM_TOKENS_SAVED = Counter(
+    "app_llm_tokens_saved_total",
+    "Estimated output tokens not generated thanks to cancelled streams.",
+    ["route", "model"],
+)
+
+# Moving average of the output tokens of completed streams, by (route, model). Estimates what a cancelled stream would have produced.
+EXPECTED_TOKENS_SMOOTHING = 0.2
+_expected_tokens: Dict[Tuple[str, str], float] = {}
+
+
+@contextmanager
+def span(stage: str, **attributes):
+    """
+    Times a stage of the current request into STAGE_LATENCY, and into an
+    OpenTelemetry span when OTEL_ENABLED is set and opentelemetry is installed.
+    """
+    route = current_route.get()
+    otel_span = _tracer.start_as_current_span(stage, attributes={"route": route, **attributes}) if _tracer else nullcontext()
+    start = time.perf_counter()
+    with otel_span:
+        try:
+            yield
+        finally:
+            STAGE_LATENCY.labels(route, stage).observe(time.perf_counter() - start)
+
+
+class LLMStreamTrace:
+    """Records time to first token, tokens/sec and cancellations for one upstream LLM stream."""
+
+    def __init__(self, model: Optional[str]):
+        self.route = current_route.get()
+        self.model = model or "unknown"
+        self.started = time.perf_counter()
+        self.first_chunk_at = None
+        self.tokens = 0
+
+    def on_chunk(self, tokens: int):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+            LLM_TIME_TO_FIRST_TOKEN.labels(self.route, self.model).observe(self.first_chunk_at - self.started)
+        self.tokens += tokens
+
+    def finish(self):
+        if self.first_chunk_at is None:
+            return
+        key = (self.route, self.model)
+        previous = _expected_tokens.get(key)
+        _expected_tokens[key] = self.tokens if previous is None else previous + EXPECTED_TOKENS_SMOOTHING * (self.tokens - previous)
+        generation_time = time.perf_counter() - self.first_chunk_at
+        if generation_time > 0 and self.tokens:
+            LLM_TOKENS_PER_SECOND.labels(self.route, self.model).observe(self.tokens / generation_time)
+
+    def cancel(self):
+        """Records a stream stopped early, and the tokens it would probably still have produced."""
+        LLM_STREAMS_CANCELLED.labels(self.route, self.model).inc()
+        expected = _expected_tokens.get((self.route, self.model))
+        if expected is not None and expected > self.tokens:
+            LLM_TOKENS_SAVED.labels(self.route, self.model).inc(expected - self.tokens)
+
+
+def traced_stream(route: str, stream: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """
+    Wraps a route's streaming generator: sets `current_route` for everything it
+    runs, and records time to first chunk and total stream time. The clock starts
+    when this is called, i.e. when the route handler builds its response.
+    """
+    received = time.perf_counter()
+
+    async def generator():
+        current_route.set(route)
+        otel_span = _tracer.start_as_current_span(route, attributes={"route": route}) if _tracer else nullcontext()
+        first_chunk = True
+        try:
+            with otel_span:
+                async for chunk in stream:
+                    if first_chunk:
+                        TIME_TO_FIRST_CHUNK.labels(route).observe(time.perf_counter() - received)
+                        first_chunk = False
+                    yield chunk
+        finally:
+            STREAM_DURATION.labels(route).observe(time.perf_counter() - received)
+
+    return generator()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Renders all metrics in the Prometheus text format. Under gunicorn with
+    PROMETHEUS_MULTIPROC_DIR set, the samples of every worker are aggregated.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
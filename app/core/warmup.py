@@ -0,0 +1,141 @@
+# app/core/warmup.py
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.dependencies import create_redis_client
+from app.data.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Stages whose failure keeps the worker out of rotation. The others are best effort.
+CRITICAL_STAGES = ("database", "redis")
+
+warmup_state = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "stages": {},
+}
+
+
+def is_ready() -> bool:
+    return warmup_state["ready"]
+
+
+def _hot_statements():
+    """
+    The statements run on (almost) every request. Executing them once on each
+    warmed connection puts them in asyncpg's per-connection prepared statement cache.
+    """
+    from app.models.database_models.tarot_reading_history import TarotReadingHistory
+    from app.models.database_models.user import User
+    from app.models.database_models.user_plan import UserPlan
+
+    return [
+        select(User).where(User.username == ""),
+        select(UserPlan).filter(UserPlan.user_id == -1, UserPlan.active_plan == True),
+        select(UserPlan).where(UserPlan.user_id == -1, UserPlan.plan_type == "counsellor").order_by(UserPlan.updated_at.desc()),
+        select(TarotReadingHistory).where(TarotReadingHistory.user_id == -1).order_by(TarotReadingHistory.reading_date.desc()),
+    ]
+
+
+async def _warm_embedding_model():
+    """Loads MiniLM and runs a dummy batch so torch's lazy initialisation happens now."""
+    from app.services.database.embedding_database_services import get_embedding_model
+
+    model = await asyncio.to_thread(get_embedding_model)
+    await asyncio.to_thread(model.encode, ["warm-up"] * 8, normalize_embeddings=True)
+
+
+async def _warm_database():
+    """Opens the minimum number of pooled connections and prepares the hot statements on each."""
+    statements = _hot_statements()
+
+    async def warm_connection():
+        async with engine.connect() as connection:
+            session = AsyncSession(bind=connection)
+            try:
+                for statement in statements:
+                    await session.execute(statement)
+            finally:
+                await session.close()
+
+    # Concurrent so each task checks out its own connection; they are returned to the pool afterwards.
+    await asyncio.gather(*(warm_connection() for _ in range(settings.WARMUP_DB_CONNECTIONS)))
+
+
+async def _warm_redis():
+    """Opens the minimum number of connections in the shared Redis pool."""
+    redis_client = create_redis_client()
+    try:
+        await asyncio.gather(*(redis_client.ping() for _ in range(settings.WARMUP_REDIS_CONNECTIONS)))
+    finally:
+        await redis_client.close()
+
+
+async def _warm_llm():
+    """Creates the Gemini client and performs a metadata call to complete the TLS/auth handshake."""
+    from app.core.startup import ONE_SHOT_MODEL, get_llm_client
+
+    client = await asyncio.to_thread(get_llm_client, "gemini")
+    await client.aio.models.get(model=ONE_SHOT_MODEL)
+
+
+async def _warm_tarot_data():
+    from app.data.tarot import get_tarot_cards
+    from app.data.tarot_catalog import load_catalogs
+
+    await asyncio.to_thread(get_tarot_cards)
+    await asyncio.to_thread(load_catalogs)
+
+
+WARMUP_STAGES = {
+    "tarot_data": _warm_tarot_data,
+    "database": _warm_database,
+    "redis": _warm_redis,
+    "embedding_model": _warm_embedding_model,
+    "llm": _warm_llm,
+}
+
+
+async def _run_stage(name: str, stage) -> bool:
+    start = time.perf_counter()
+    try:
+        await stage()
+        warmup_state["stages"][name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3)}
+        logger.info("Warm-up stage %s finished in %.3fs", name, time.perf_counter() - start)
+        return True
+    except Exception as e:
+        # /ready is unauthenticated, so only the exception type is exposed; the message can hold hosts or DSNs.
+        warmup_state["stages"][name] = {"ok": False, "seconds": round(time.perf_counter() - start, 3), "error": type(e).__name__}
+        logger.warning("Warm-up stage %s failed: %s", name, e, exc_info=True)
+        return False
+
+
+async def run_warmup():
+    """
+    Runs every warm-up stage once, then retries the critical ones until they succeed.
+    The worker reports ready (see /ready) only after that.
+    """
+    warmup_state["started_at"] = time.time()
+
+    if not settings.WARMUP_ENABLED:
+        warmup_state["ready"] = True
+        warmup_state["finished_at"] = time.time()
+        return
+
+    results = await asyncio.gather(*(_run_stage(name, stage) for name, stage in WARMUP_STAGES.items()))
+    failed = [name for name, ok in zip(WARMUP_STAGES, results) if not ok and name in CRITICAL_STAGES]
+
+    while failed:
+        await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+        failed = [name for name in failed if not await _run_stage(name, WARMUP_STAGES[name])]
+
+    warmup_state["ready"] = True
+    warmup_state["finished_at"] = time.time()
+    logger.info("Warm-up complete in %.3fs", warmup_state["finished_at"] - warmup_state["started_at"])
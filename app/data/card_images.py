@@ -0,0 +1,38 @@
+# app/data/card_images.py
+import json
+import os
+
+from app.core.config import settings
+
+_manifest = None
+
+
+def get_card_image_manifest() -> dict:
+    """
+    Returns the manifest written by app/scripts/build_card_images.py, loading it
+    on first use. Empty if the images have not been built.
+    """
+    global _manifest
+    if _manifest is None:
+        path = os.path.join(settings.CARD_IMAGE_DIR, "manifest.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {"formats": [], "widths": [], "cards": {}}
+        manifest["files"] = {
+            file_name
+            for entry in manifest["cards"].values()
+            for sizes in entry.values()
+            for variants in sizes.values()
+            for file_name in variants.values()
+        }
+        _manifest = manifest
+    return _manifest
+
+
+def card_image_path(file_name: str):
+    """Path of a built image, or None if `file_name` is not in the manifest (which also rules out path traversal)."""
+    if file_name not in get_card_image_manifest()["files"]:
+        return None
+    return os.path.join(settings.CARD_IMAGE_DIR, file_name)
@@ -1,29 +1,92 @@
 import json
+import os
+from typing import NamedTuple, Tuple
 
+TAROT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "optimized_tarot_translated.json")
+
+# Request language -> suffix of the translated fields in optimized_tarot_translated.json.
+LANGUAGE_SUFFIXES = {"en": "", "zh": "ZhCN", "zh_TW": "ZhTW"}
+DEFAULT_LANGUAGE = "en"
+
+
+class TarotCardRecord(NamedTuple):
+    """
+    One card in one language. `name` is always the English name cards are
+    requested by; `display_name` and the text fields are in `language`, falling
+    back to English where the file has no translation, in which case the
+    records of a card share the same English strings.
+    """
+    name: str
+    language: str
+    display_name: str
+    number: str
+    arcana: str
+    suit: str
+    img: str
+    keywords: Tuple[str, ...]
+    fortune_telling: Tuple[str, ...]
+    light: Tuple[str, ...]
+    shadow: Tuple[str, ...]
+    archetype: str
+    questions_to_ask: Tuple[str, ...]
+    affirmation: str
+
+
+# English name -> English record, in the order of the card file.
 tarot_cards = {}
+# (English name, language) -> record.
+tarot_card_records = {}
+
+def _card_record(card, language, suffix):
+    def field(record, name):
+        value = (record.get(name + suffix) if suffix else None) or record[name]
+        return tuple(value) if isinstance(value, list) else value
+
+    return TarotCardRecord(
+        name=card["name"],
+        language=language,
+        display_name=field(card, "name"),
+        number=card["number"],
+        arcana=card["arcana"],
+        suit=card["suit"],
+        img=card["img"],
+        keywords=field(card, "keywords"),
+        fortune_telling=field(card, "fortune_telling"),
+        light=field(card["meanings"], "light"),
+        shadow=field(card["meanings"], "shadow"),
+        archetype=field(card, "archetype"),
+        questions_to_ask=field(card, "questions_to_ask"),
+        affirmation=card["affirmation"],
+    )
 
 def load_tarot_data(filepath):
     """
-    Load tarot card data from JSON file and split records into English and Chinese versions.
+    Load tarot card data from JSON file in one pass, building a record per card and language.
     """
-    global tarot_cards
+    global tarot_cards, tarot_card_records
     with open(filepath, "r", encoding="utf-8") as f:
         data = json.load(f)
-        
-        for card in data["cards"]:
-            tarot_cards[card["name"]] = {
-                "name": card["name"],
-                "number": card["number"],
-                "arcana": card["arcana"],
-                "suit": card["suit"],
-                "img": card["img"],
-                "fortune_telling": card["fortune_telling"],
-                "keywords": card["keywords"],
-                "meanings": {
-                    "light": card["meanings"]["light"],
-                    "shadow": card["meanings"]["shadow"]
-                },
-                "archetype": card["archetype"],
-                "questions_to_ask": card["questions_to_ask"],
-                "affirmation": card["affirmation"]
-            }
+
+    cards, records = {}, {}
+    for card in data["cards"]:
+        for language, suffix in LANGUAGE_SUFFIXES.items():
+            records[(card["name"], language)] = _card_record(card, language, suffix)
+        cards[card["name"]] = records[(card["name"], DEFAULT_LANGUAGE)]
+    tarot_card_records = records
+    tarot_cards = cards
+
+def get_tarot_cards():
+    """
+    Returns the English card records by name, loading them from disk on first access.
+    """
+    if not tarot_cards:
+        load_tarot_data(TAROT_DATA_PATH)
+    return tarot_cards
+
+def get_card_record(name, language=DEFAULT_LANGUAGE):
+    """
+    Returns the record of a card in a language (English for unsupported
+    languages), or None for an unknown card.
+    """
+    get_tarot_cards()
+    return tarot_card_records.get((name, language)) or tarot_card_records.get((name, DEFAULT_LANGUAGE))
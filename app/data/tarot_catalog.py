@@ -0,0 +1,134 @@
+# app/data/tarot_catalog.py
+import gzip
+import hashlib
+import os
+from typing import NamedTuple, Optional
+
+import orjson
+
+try:
+    import brotli
+except ImportError:  # Without brotli the catalog is served gzip-compressed or uncompressed.
+    brotli = None
+
+from app.data.tarot import DEFAULT_LANGUAGE, LANGUAGE_SUFFIXES, TarotCardRecord, get_card_record, get_tarot_cards
+
+
+class CatalogPayload(NamedTuple):
+    """One JSON document, serialized and compressed once, with its ETag."""
+    body: bytes
+    gzip: bytes
+    br: Optional[bytes]
+    etag: str
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        return {"gzip": self.gzip, "br": self.br}.get(encoding) or self.body
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """Strong ETags differ per content-coding, since the bytes sent differ."""
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+class LanguageCatalog(NamedTuple):
+    catalog: CatalogPayload
+    cards: list
+    index: dict
+
+
+_catalogs = {}
+
+
+def _payload(document, br_quality: int = 11) -> CatalogPayload:
+    body = orjson.dumps(document)
+    return CatalogPayload(
+        body=body,
+        gzip=gzip.compress(body, compresslevel=9, mtime=0),
+        br=brotli.compress(body, quality=br_quality) if brotli else None,
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+    )
+
+
+def card_document(record: TarotCardRecord) -> dict:
+    """The JSON form of a card record."""
+    return {
+        "id": os.path.splitext(record.img)[0],
+        "name": record.name,
+        "display_name": record.display_name,
+        "number": record.number,
+        "arcana": record.arcana,
+        "suit": record.suit,
+        "img": record.img,
+        "meanings": {"light": record.light, "shadow": record.shadow},
+        "affirmation": record.affirmation,
+        "keywords": record.keywords,
+        "fortune_telling": record.fortune_telling,
+        "archetype": record.archetype,
+        "questions_to_ask": record.questions_to_ask,
+    }
+
+
+def _index_keys(card: dict) -> list:
+    """
+    Keys a card can be looked up by: its id (m00, s05), English and
+    translated names, and for the major arcana its bare number. Minor arcana
+    numbers repeat across suits, so they are only reachable by id or name.
+    """
+    keys = [card["id"], card["name"], card["display_name"]]
+    if card["arcana"] == "Major Arcana":
+        keys.append(str(card["number"]))
+    return [key.strip().lower() for key in keys]
+
+
+def load_catalogs() -> dict:
+    """Builds the serialized catalog of every language from the card records of app.data.tarot."""
+    global _catalogs
+    catalogs = {}
+    for language in LANGUAGE_SUFFIXES:
+        cards = [card_document(get_card_record(name, language)) for name in get_tarot_cards()]
+        index = {}
+        for position, card in enumerate(cards):
+            for key in _index_keys(card):
+                index.setdefault(key, position)
+        catalogs[language] = LanguageCatalog(
+            catalog=_payload({"language": language, "cards": cards}),
+            # Single cards are small; top brotli quality costs more at load than it saves.
+            cards=[_payload(card, br_quality=6) for card in cards],
+            index=index,
+        )
+    _catalogs = catalogs
+    return _catalogs
+
+
+def get_catalog(language: str) -> LanguageCatalog:
+    """The catalog of a language (English for unsupported ones), built on first use."""
+    catalogs = _catalogs or load_catalogs()
+    return catalogs.get(language) or catalogs[DEFAULT_LANGUAGE]
+
+
+def get_card_payload(language: str, key: str) -> Optional[CatalogPayload]:
+    """A single card by id, name or major arcana number, or None."""
+    catalog = get_catalog(language)
+    position = catalog.index.get(key.strip().lower())
+    return None if position is None else catalog.cards[position]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The best pre-compressed coding the client accepts: br, then gzip, else None for identity."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    if brotli and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
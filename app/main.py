@@ -12,7 +12,10 @@ from app.api.routes import (
     tarot_routes,
 )
 from app.config import settings
-from app.core.startup import startup_event
+from app.core.logging_config import configure_logging
+from app.core.startup import shutdown_event, startup_event
+
+configure_logging()
 
 app = FastAPI()
 
@@ -51,4 +54,8 @@ app.include_router(bagua_routes.router, prefix="/api/bagua")
 
 @app.on_event("startup")
 async def app_startup():
-    await startup_event(app)
\ No newline at end of file
+    await startup_event(app)
+
+@app.on_event("shutdown")
+async def app_shutdown():
+    await shutdown_event(app)
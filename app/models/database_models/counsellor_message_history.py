@@ -1,5 +1,5 @@
 # app/models/database_models/counsellor_message_history.py
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -9,10 +9,18 @@ from app.data.database import Base
 
 class CounsellorMessageHistory(Base):
     __tablename__ = "counsellor_message_history"
+    __table_args__ = (
+        # Per-session history and retrieval, and retrieval across a user's non-private messages.
+        Index("ix_counsellor_message_history_user_session_updated", "user_id", "session_id", "last_updated_timestamp"),
+        Index("ix_counsellor_message_history_user_private_updated", "user_id", "private_message", "last_updated_timestamp"),
+        # Monthly partitions, created ahead of time by partition_database_services.
+        {"postgresql_partition_by": "RANGE (creation_timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    creation_timestamp = Column(DateTime, server_default=func.now())
+    # The partition key, so part of the primary key.
+    creation_timestamp = Column(DateTime, primary_key=True, server_default=func.now())
     last_updated_timestamp = Column(DateTime, server_default=func.now(), onupdate=func.now())
     user_message = Column(Text, nullable=True)
     counsellor_response = Column(Text, nullable=True)
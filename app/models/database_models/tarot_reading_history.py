@@ -1,5 +1,5 @@
 # app/models/database_models/tarot_reading_history.py
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship
 
 from app.data.database import Base
@@ -7,6 +7,10 @@ from app.data.database import Base
 
 class TarotReadingHistory(Base):
     __tablename__ = "tarot_reading_history"
+    __table_args__ = (
+        # Serves the keyset-paginated history list, newest first.
+        Index("ix_tarot_reading_history_user_date_id", "user_id", "reading_date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
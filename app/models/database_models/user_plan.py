@@ -1,5 +1,5 @@
 # app/models/database_models/user_plan.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -8,6 +8,11 @@ from app.data.database import Base
 
 class UserPlan(Base):
     __tablename__ = "user_plans"
+    __table_args__ = (
+        # Latest plan of a type, and the (at most one) active plan of a user.
+        Index("ix_user_plans_user_type_updated", "user_id", "plan_type", "updated_at"),
+        Index("ix_user_plans_user_active", "user_id", postgresql_where=text("active_plan")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -1,5 +1,5 @@
 # app/models/database_models/user_reflection.pyfrom sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -10,6 +10,10 @@ from app.data.database import Base
 
 class UserReflection(Base):
     __tablename__ = "user_reflections"
+    __table_args__ = (
+        # Latest reflections of a user.
+        Index("ix_user_reflections_user_updated", "user_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class TarotCard(BaseModel):
     name: str
@@ -10,4 +10,14 @@ class TarotAnalysisRequest(BaseModel):
     spread: str
     tarot_cards: List[TarotCard]
     user_context: str
-    language: str
\ No newline at end of file
+    language: str
+
+class TarotDrawRequest(BaseModel):
+    spread: str
+    # Replays an earlier draw; a new random seed is used if omitted.
+    seed: Optional[str] = None
+
+class TarotBatchDrawRequest(BaseModel):
+    spread: str
+    count: int = Field(1, ge=1, le=100)
+    seeds: Optional[List[str]] = Field(None, max_length=100)
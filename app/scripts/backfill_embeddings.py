@@ -0,0 +1,313 @@
+#%%
+"""
+Fills in missing embeddings and importance scores.
+
+Usage:
+    python app/scripts/backfill_embeddings.py
+    python app/scripts/backfill_embeddings.py --table user_reflections --page-size 2000 --concurrency 8
+    python app/scripts/backfill_embeddings.py --llm-fallback --dry-run
+    python app/scripts/backfill_embeddings.py --rescore-below 2
+    python app/scripts/backfill_embeddings.py --verify 500
+
+counsellor_message_history and user_reflections rows get their embedding and
+importance_score inline when they are written, and keep NULLs when that
+fails. This pages through the rows missing either column in id order
+(keyset, WHERE id > last id, so every page is an index range scan however
+far along the run is), encodes the page's texts in one batch, scores them
+against importance_sample_messages the way calculate_overall_importance does
+and writes the whole page back with a single UPDATE ... FROM unnest(...).
+
+Safe on a live database: each page is its own short transaction, and the
+UPDATE only fills columns that are still NULL, so values written by the
+application in the meantime are never overwritten. --sleep throttles the
+run between pages. Rows for which no importance sample is similar enough
+keep a NULL importance_score unless --llm-fallback is given; rows whose text
+is empty are skipped. A rerun picks up wherever the last one stopped.
+
+Importance scores are on the 1-10 scale of the column, computed by
+score_similar_messages like the inline path. Earlier versions of this script
+wrote the unscaled score, rounded to 0 or 1; --rescore-below 2 treats scores
+below 2 as missing, so those rows are scored again. (Rows the LLM rated 1 are
+rescored too, from the samples.)
+
+--verify N writes nothing: it rescores the N most recent rows that already
+have an embedding and a score, which are normally scored inline, and reports
+how many scores the backfill reproduces. It exits with a non-zero status if
+any stored score is outside 1-10 or any rescore differs.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List, Optional
+
+import asyncpg
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.core.config import settings
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Table -> column holding the text that is embedded and scored.
+TARGETS = {
+    "counsellor_message_history": "user_message",
+    "user_reflections": "reflection_text",
+}
+
+
+def _database_url() -> str:
+    # asyncpg takes a plain postgresql:// URL.
+    return settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def _vector_literal(embedding) -> str:
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+
+def _missing_condition(text_column: str, rescore_below: int = 0) -> str:
+    return (
+        f"(embedding IS NULL OR importance_score IS NULL OR importance_score < {int(rescore_below)}) "
+        f"AND {text_column} IS NOT NULL AND {text_column} <> ''"
+    )
+
+
+async def count_missing(pool: asyncpg.Pool, table: str, rescore_below: int = 0) -> int:
+    return await pool.fetchval(f"SELECT count(*) FROM {table} WHERE {_missing_condition(TARGETS[table], rescore_below)}")
+
+
+async def fetch_page(pool: asyncpg.Pool, table: str, after_id: int, page_size: int, rescore_below: int = 0) -> List[asyncpg.Record]:
+    text_column = TARGETS[table]
+    return await pool.fetch(
+        f"""
+        SELECT id, {text_column} AS text, embedding::text AS embedding, importance_score
+        FROM {table}
+        WHERE id > $1 AND {_missing_condition(text_column, rescore_below)}
+        ORDER BY id
+        LIMIT $2
+        """,
+        after_id,
+        page_size,
+    )
+
+
+async def score_importance(
+    pool: asyncpg.Pool,
+    semaphore: asyncio.Semaphore,
+    text: str,
+    embedding: str,
+    similarity_threshold: float,
+    top_k: int,
+    llm_fallback: bool,
+) -> Optional[int]:
+    """
+    The importance of one row, from its (already computed) embedding. Same query
+    and scoring as calculate_overall_importance, on the column's 1-10 scale.
+    """
+    from app.services.database.importance_database_services import rate_importance_with_llm, score_similar_messages
+
+    async with semaphore:
+        similar_messages = await pool.fetch(
+            """
+            SELECT importance_score, (embedding <-> $1::vector) AS similarity_score
+            FROM importance_sample_messages
+            ORDER BY similarity_score ASC
+            LIMIT $2
+            """,
+            embedding,
+            top_k,
+        )
+        score = score_similar_messages(similar_messages, similarity_threshold)
+        if score is None and llm_fallback:
+            try:
+                score = await rate_importance_with_llm(text)
+            except Exception as e:
+                print(f"LLM rating failed, leaving importance empty: {e}")
+    return score
+
+
+async def write_page(
+    pool: asyncpg.Pool,
+    table: str,
+    ids: List[int],
+    embeddings: List[Optional[str]],
+    scores: List[Optional[int]],
+    rescore_below: int = 0,
+) -> int:
+    """
+    Fills the columns that are still NULL (or, for importance_score, below
+    `rescore_below`) for one page, in one statement. Returns the number of rows updated.
+    """
+    async with pool.acquire() as connection:
+        status = await connection.execute(
+            f"""
+            UPDATE {table} AS t
+            SET embedding = COALESCE(t.embedding, v.embedding::vector),
+                importance_score = CASE
+                    WHEN t.importance_score IS NULL OR t.importance_score < $4 THEN COALESCE(v.importance_score, t.importance_score)
+                    ELSE t.importance_score
+                END
+            FROM unnest($1::int[], $2::text[], $3::int[]) AS v(id, embedding, importance_score)
+            WHERE t.id = v.id
+              AND (t.embedding IS NULL OR t.importance_score IS NULL OR t.importance_score < $4)
+            """,
+            ids,
+            embeddings,
+            scores,
+            rescore_below,
+        )
+    return int(status.split()[-1])
+
+
+def _format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+async def backfill_table(pool: asyncpg.Pool, model, table: str, args) -> dict:
+    total = await count_missing(pool, table, args.rescore_below)
+    print(f"{table}: {total} rows missing an embedding or importance score")
+    totals = {"rows": 0, "embedded": 0, "scored": 0, "updated": 0}
+    if not total:
+        return totals
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    after_id = 0
+    while True:
+        rows = await fetch_page(pool, table, after_id, args.page_size, args.rescore_below)
+        if not rows:
+            break
+        after_id = rows[-1]["id"]
+
+        embeddings = [row["embedding"] for row in rows]
+        to_encode = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if to_encode:
+            # Normalised like the embeddings written by the application.
+            encoded = await asyncio.to_thread(
+                model.encode,
+                [rows[i]["text"] for i in to_encode],
+                batch_size=args.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+            )
+            for i, embedding in zip(to_encode, np.asarray(encoded, dtype=np.float32)):
+                embeddings[i] = _vector_literal(embedding.tolist())
+
+        scores = [row["importance_score"] for row in rows]
+        to_score = [i for i, score in enumerate(scores) if score is None or score < args.rescore_below]
+        computed = await asyncio.gather(*(
+            score_importance(pool, semaphore, rows[i]["text"], embeddings[i], args.similarity_threshold, args.top_k, args.llm_fallback)
+            for i in to_score
+        ))
+        for i, score in zip(to_score, computed):
+            scores[i] = score
+
+        if not args.dry_run:
+            totals["updated"] += await write_page(pool, table, [row["id"] for row in rows], embeddings, scores, args.rescore_below)
+        totals["rows"] += len(rows)
+        totals["embedded"] += len(to_encode)
+        totals["scored"] += sum(score is not None for score in computed)
+
+        elapsed = time.perf_counter() - started
+        rate = totals["rows"] / elapsed
+        remaining = max(total - totals["rows"], 0)
+        print(
+            f"{table}: {totals['rows']}/{total} rows ({100 * totals['rows'] / total:.1f}%), "
+            f"{totals['embedded']} embedded, {totals['scored']} scored, {totals['updated']} updated | "
+            f"{rate:.0f} rows/s, ETA {_format_eta(remaining / rate) if rate else '?'}"
+        )
+        if args.sleep:
+            await asyncio.sleep(args.sleep)
+
+    return totals
+
+
+async def verify_table(pool: asyncpg.Pool, table: str, args) -> int:
+    """Rescores the most recent scored rows as the backfill would and compares. Returns the number of problems."""
+    from app.services.database.importance_database_services import IMPORTANCE_SCALE
+
+    text_column = TARGETS[table]
+    rows = await pool.fetch(
+        f"""
+        SELECT id, {text_column} AS text, embedding::text AS embedding, importance_score
+        FROM {table}
+        WHERE embedding IS NOT NULL AND importance_score IS NOT NULL AND {text_column} <> ''
+        ORDER BY id DESC
+        LIMIT $1
+        """,
+        args.verify,
+    )
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rescored = await asyncio.gather(*(
+        score_importance(pool, semaphore, row["text"], row["embedding"], args.similarity_threshold, args.top_k, llm_fallback=False)
+        for row in rows
+    ))
+
+    out_of_range = [row["id"] for row in rows if not 1 <= row["importance_score"] <= IMPORTANCE_SCALE]
+    # Rows the inline path rated with the LLM have no sample-based score to compare with.
+    compared = [(row, score) for row, score in zip(rows, rescored) if score is not None]
+    differing = [(row["id"], row["importance_score"], score) for row, score in compared if score != row["importance_score"]]
+    print(
+        f"{table}: {len(rows)} rows checked, {len(out_of_range)} stored scores outside 1-{IMPORTANCE_SCALE}, "
+        f"{len(compared) - len(differing)}/{len(compared)} sample-based scores reproduced, "
+        f"{len(rows) - len(compared)} rated by the LLM"
+    )
+    if out_of_range:
+        print(f"  out of range (ids): {out_of_range[:20]}")
+    for row_id, stored, score in differing[:20]:
+        print(f"  id {row_id}: stored {stored}, backfill {score}")
+    return len(out_of_range) + len(differing)
+
+
+async def verify(args) -> int:
+    pool = await asyncpg.create_pool(_database_url(), min_size=1, max_size=args.concurrency + 1)
+    try:
+        return sum([await verify_table(pool, table, args) for table in args.table or list(TARGETS)])
+    finally:
+        await pool.close()
+
+
+async def backfill(args):
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    # One connection per concurrent importance query, plus one for paging and writes.
+    pool = await asyncpg.create_pool(_database_url(), min_size=1, max_size=args.concurrency + 1)
+    started = time.perf_counter()
+    try:
+        for table in args.table or list(TARGETS):
+            totals = await backfill_table(pool, model, table, args)
+            print(f"{table}: done, {totals['rows']} rows processed, {totals['updated']} updated{' (dry run)' if args.dry_run else ''}")
+    finally:
+        await pool.close()
+    print(f"Finished in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", action="append", choices=list(TARGETS), help="Table to backfill (repeatable; default: all)")
+    parser.add_argument("--page-size", type=int, default=1000, help="Rows fetched, encoded and written per transaction")
+    parser.add_argument("--batch-size", type=int, default=256, help="Encoder batch size")
+    parser.add_argument("--concurrency", type=int, default=4, help="Importance queries (and LLM calls) in flight at once")
+    parser.add_argument("--similarity-threshold", type=float, default=0.6)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--llm-fallback", action="store_true", help="Ask the LLM for rows unlike any importance sample")
+    parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between pages")
+    parser.add_argument("--dry-run", action="store_true", help="Compute everything but write nothing")
+    parser.add_argument("--rescore-below", type=int, default=0, help="Also rescore rows whose importance_score is below this")
+    parser.add_argument("--verify", type=int, metavar="N", help="Compare the backfill's scores with the N most recent scored rows; writes nothing")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(1 if asyncio.run(verify(args)) else 0)
+    asyncio.run(backfill(args))
+
+
+if __name__ == "__main__":
+    main()
+
+#%%
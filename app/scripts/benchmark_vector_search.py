@@ -0,0 +1,98 @@
+#%%
+"""
+Compares recall and latency of full-precision, halfvec and binary-quantized vector search.
+
+Usage:
+    python app/scripts/benchmark_vector_search.py [--table importance_sample_messages] [--queries 50] [--top-k 10]
+
+Samples --queries stored embeddings as queries. For each one, the exact top-k
+is computed first, with index scans disabled. The same search then runs in
+every VECTOR_SEARCH_MODE ("full" through the HNSW index, and "halfvec" and
+"binary" through the quantized expression indexes plus rescoring). The report
+gives recall@k against the exact result, median and p95 latency, and the size
+of each index. Run it against a migrated database (migration e8b4f2a6c9d1).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.services.database.embedding_database_services import configure_hnsw_scan, nearest_rows_sql
+
+MODES = ["full", "halfvec", "binary"]
+INDEXES = {
+    "full": "{table}_embedding_idx",
+    "halfvec": "{table}_embedding_halfvec_idx",
+    "binary": "{table}_embedding_binary_idx",
+}
+
+
+async def search(connection, table: str, key_column: str, query: str, top_k: int, mode: str, exact: bool = False):
+    async with connection.begin():
+        if exact:
+            await connection.execute(text("SET LOCAL enable_indexscan = off"))
+        await configure_hnsw_scan(connection, top_k, filtered=False, mode=mode)
+        sql = nearest_rows_sql(key_column, table, "embedding", f"'{query}'::vector", "embedding IS NOT NULL", str(top_k), mode=mode)
+        started = time.perf_counter()
+        rows = (await connection.execute(text(sql))).fetchall()
+        return [row[0] for row in rows], time.perf_counter() - started
+
+
+async def benchmark(table: str, key_column: str, queries: int, top_k: int):
+    from app.data.database import engine
+
+    async with engine.connect() as connection:
+        samples = (await connection.execute(text(
+            f"SELECT embedding::text FROM {table} WHERE embedding IS NOT NULL ORDER BY random() LIMIT :queries"
+        ), {"queries": queries})).scalars().all()
+        await connection.commit()
+        if not samples:
+            print(f"{table} has no embeddings")
+            return
+
+        exact = [(await search(connection, table, key_column, query, top_k, "full", exact=True))[0] for query in samples]
+
+        print(f"{table}: {len(samples)} queries, top {top_k}")
+        print(f"{'mode':<8} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'index size':>12}")
+        for mode in MODES:
+            recalls, latencies = [], []
+            try:
+                for query, truth in zip(samples, exact):
+                    found, seconds = await search(connection, table, key_column, query, top_k, mode)
+                    recalls.append(len(set(found) & set(truth)) / max(len(truth), 1))
+                    latencies.append(seconds * 1000)
+            except Exception as e:
+                print(f"{mode:<8} failed: {e}")
+                continue
+            size = (await connection.execute(text(
+                "SELECT pg_size_pretty(pg_total_relation_size(to_regclass(:name)))"
+            ), {"name": INDEXES[mode].format(table=table)})).scalar()
+            await connection.commit()
+            print(
+                f"{mode:<8} {np.mean(recalls):>9.3f} {np.percentile(latencies, 50):>8.2f} "
+                f"{np.percentile(latencies, 95):>8.2f} {size or 'no index':>12}"
+            )
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="importance_sample_messages", choices=["importance_sample_messages", "user_reflections", "counsellor_message_history"])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    key_column = "sample_message" if args.table == "importance_sample_messages" else "id"
+    asyncio.run(benchmark(args.table, key_column, args.queries, args.top_k))
+
+
+if __name__ == "__main__":
+    main()
+
+#%%
@@ -0,0 +1,124 @@
+#%%
+"""
+Builds the tarot card images served by /api/tarot/card-images.
+
+Usage:
+    python app/scripts/build_card_images.py [--source cards] [--output app/static/cards] [--widths 160 320 640]
+
+For every JPEG in --source, renders upright and reversed (turned upside
+down) variants at each width (never upscaled) in WebP and, if Pillow can encode it,
+AVIF. Each file is named after a hash of its content
+(m00-reversed-320.3f2a9c1d.webp), so the files can be cached forever. A
+manifest.json maps card image -> orientation -> width -> format -> file name,
+and lists under "widths" the widths actually rendered; the API serves only
+files listed in it. Files from earlier builds that are no
+longer in the manifest are removed. The Docker image runs this at build time.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+DEFAULT_WIDTHS = [160, 320, 640]
+SAVE_OPTIONS = {"webp": {"quality": 80, "method": 6}, "avif": {"quality": 60}}
+
+
+def _available_formats() -> list:
+    from PIL import Image
+
+    try:
+        import pillow_avif  # noqa: F401  (registers an AVIF encoder on Pillow builds without one)
+    except ImportError:
+        pass
+    Image.init()
+    if "AVIF" in Image.SAVE:
+        return ["webp", "avif"]
+    print("AVIF encoding not available in this Pillow build; writing WebP only.")
+    return ["webp"]
+
+
+def render_card(source_path: str, output_dir: str, widths: list, formats: list) -> tuple:
+    """Writes every variant of one card and returns (card image name, its manifest entry)."""
+    from PIL import Image
+
+    name = os.path.basename(source_path)
+    stem = os.path.splitext(name)[0]
+    entry = {}
+    with Image.open(source_path) as original:
+        original = original.convert("RGB")
+        for orientation in ("upright", "reversed"):
+            # A reversed card is the card turned upside down.
+            image = original if orientation == "upright" else original.transpose(Image.Transpose.ROTATE_180)
+            sizes = entry.setdefault(orientation, {})
+            for width in sorted({min(width, image.width) for width in widths}):
+                height = round(image.height * width / image.width)
+                resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+                variants = sizes.setdefault(str(width), {})
+                for image_format in formats:
+                    buffer = io.BytesIO()
+                    resized.save(buffer, format=image_format.upper(), **SAVE_OPTIONS[image_format])
+                    data = buffer.getvalue()
+                    file_name = f"{stem}-{orientation}-{width}.{hashlib.sha256(data).hexdigest()[:8]}.{image_format}"
+                    path = os.path.join(output_dir, file_name)
+                    if not os.path.exists(path):
+                        with open(path + ".tmp", "wb") as f:
+                            f.write(data)
+                        os.replace(path + ".tmp", path)
+                    variants[image_format] = file_name
+    return name, entry
+
+
+def build(source_dir: str, output_dir: str, widths: list, workers: int):
+    os.makedirs(output_dir, exist_ok=True)
+    formats = _available_formats()
+    sources = sorted(
+        os.path.join(source_dir, name) for name in os.listdir(source_dir) if name.lower().endswith((".jpg", ".jpeg"))
+    )
+    if not sources:
+        raise SystemExit(f"No card images found in {source_dir}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        manifest = dict(executor.map(render_card, sources, [output_dir] * len(sources), [widths] * len(sources), [formats] * len(sources)))
+
+    # The widths actually rendered: requested widths above a card's source width are capped to it.
+    rendered_widths = sorted({int(width) for entry in manifest.values() for sizes in entry.values() for width in sizes})
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"formats": formats, "widths": rendered_widths, "cards": manifest}, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    current = {
+        file_name
+        for entry in manifest.values()
+        for sizes in entry.values()
+        for variants in sizes.values()
+        for file_name in variants.values()
+    }
+    stale = [name for name in os.listdir(output_dir) if name != "manifest.json" and name not in current]
+    for name in stale:
+        os.remove(os.path.join(output_dir, name))
+
+    total = sum(os.path.getsize(os.path.join(output_dir, name)) for name in current)
+    print(f"Built {len(current)} images for {len(manifest)} cards ({total / 1e6:.1f} MB), removed {len(stale)} stale files.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=os.path.join(PROJECT_ROOT, "cards"))
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "app", "static", "cards"))
+    parser.add_argument("--widths", type=int, nargs="+", default=DEFAULT_WIDTHS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    build(args.source, args.output, args.widths, args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+#%%
@@ -0,0 +1,92 @@
+#%%
+"""
+Checks and times the tarot draw engine (app/services/tarot_draw_services.py).
+
+Usage:
+    python app/scripts/check_tarot_draws.py [--draws 20000] [--batch 1000]
+
+For every spread it checks that:
+  - no draw repeats a card,
+  - replaying a seed gives the same draw, and a batch draw matches drawing its seeds one by one,
+  - cards and orientations are uniform over --draws random draws (chi-square,
+    failing only far beyond chance).
+It then reports how long one draw and a batch of --batch draws take.
+Exits with a non-zero status if any check fails.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.services.tarot_draw_services import SPREADS, draw_batch, draw_spread, get_deck, new_seed
+
+
+def chi_square_ok(counts: list, label: str) -> bool:
+    """Chi-square against the uniform distribution, failing beyond six standard deviations of its mean."""
+    total = sum(counts)
+    expected = total / len(counts)
+    statistic = sum((count - expected) ** 2 / expected for count in counts)
+    df = len(counts) - 1
+    limit = df + 6 * (2 * df) ** 0.5
+    ok = statistic <= limit
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}: chi-square {statistic:.1f} (df {df}, limit {limit:.1f})")
+    return ok
+
+
+def check_spread(spread: str, draws: int) -> int:
+    failures = 0
+    deck = list(get_deck())
+    print(spread)
+
+    seeds = [new_seed() for _ in range(draws)]
+    results = draw_batch(seeds, spread)
+    repeated = sum(len({card["name"] for card in draw["cards"]}) != len(draw["cards"]) for draw in results)
+    print(f"  {'ok  ' if not repeated else 'FAIL'} {repeated} of {draws} draws repeat a card")
+    failures += bool(repeated)
+
+    replay_mismatches = sum(draw_spread(spread, draw["seed"]) != draw for draw in results[:200])
+    print(f"  {'ok  ' if not replay_mismatches else 'FAIL'} {replay_mismatches} of 200 replays differ from the batch draw")
+    failures += bool(replay_mismatches)
+
+    cards = Counter(card["name"] for draw in results for card in draw["cards"])
+    first = Counter(draw["cards"][0]["name"] for draw in results)
+    orientations = Counter(card["orientation"] for draw in results for card in draw["cards"])
+    failures += not chi_square_ok([cards[name] for name in deck], "card frequency")
+    failures += not chi_square_ok([first[name] for name in deck], "first position")
+    failures += not chi_square_ok([orientations["upright"], orientations["reversed"]], "orientation")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--draws", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    failures = sum(check_spread(spread, args.draws) for spread in SPREADS)
+
+    print(f"{'spread':<14} {'single draw':>12} {'batch':>12} {'per draw':>10}")
+    for spread in SPREADS:
+        started = time.perf_counter()
+        for _ in range(200):
+            draw_spread(spread)
+        single = (time.perf_counter() - started) / 200
+        seeds = [new_seed() for _ in range(args.batch)]
+        started = time.perf_counter()
+        draw_batch(seeds, spread)
+        batch = time.perf_counter() - started
+        print(f"{spread:<14} {single * 1e6:>10.1f}us {batch * 1e3:>10.1f}ms {batch * 1e6 / args.batch:>8.1f}us")
+
+    if failures:
+        print(f"{failures} checks failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+#%%
@@ -1,80 +1,263 @@
 #%%
+"""
+Loads labelled importance samples into importance_sample_messages.
+
+Usage:
+    python app/scripts/few_shot_importance_encoding.py app/data/synthetic_importance_data.json
+    python app/scripts/few_shot_importance_encoding.py samples.jsonl --batch-size 512 --method executemany
+
+Input is either a JSON array or JSON Lines of {"text": ..., "label": ...}
+objects. Both are read incrementally, so the file never has to fit in memory.
+Samples are encoded in batches and bulk-loaded with COPY into a temporary
+staging table followed by INSERT ... ON CONFLICT (sample_message) DO NOTHING
+(or with executemany and the same ON CONFLICT clause). Encoding of the next
+batch overlaps with the database write of the previous one.
+
+After every committed batch, the number of input records processed is written
+to a checkpoint file (<input>.checkpoint by default). A rerun skips those
+records without encoding them again; --restart ignores the checkpoint.
+"""
+import argparse
+import asyncio
 import json
-from sentence_transformers import SentenceTransformer
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import IntegrityError
-from dotenv import load_dotenv
 import os
 import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import asyncpg
+import numpy as np
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from data.database import Base
-from core.config import settings
+from app.core.config import settings
 
-load_dotenv()
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+READ_SIZE = 1 << 20
 
-db_url = settings.DATABASE_URL
+Sample = Tuple[str, int]
 
-def load_few_shot_data(filepath: str) -> list:
-    """Load sample data from a JSON file."""
-    with open(filepath, 'r', encoding="utf-8") as f:
-        return json.load(f)
 
-def create_embeddings_and_store(filepath: str, db_url: str):
-    """Loads data, creates embeddings, and stores them in the database while avoiding duplicates."""
+def _iter_json_array(f) -> Iterator[dict]:
+    """Yields the elements of a top-level JSON array one at a time, reading the file in blocks."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace, the opening bracket and separating commas.
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] == "," or (not started and buffer[position] == "[")):
+            started = started or buffer[position] == "["
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                position = end
+                yield item
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        if eof:
+            return
+        block = f.read(READ_SIZE)
+        eof = not block
+        buffer = buffer[position:] + block
+        position = 0
 
-    examples = load_few_shot_data(filepath)
 
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+def iter_records(path: str) -> Iterator[dict]:
+    """Yields the records of a JSON array or JSON Lines file lazily."""
+    with open(path, "r", encoding="utf-8") as f:
+        first = ""
+        while True:
+            character = f.read(1)
+            if not character or not character.isspace():
+                first = character
+                break
+        f.seek(0)
+        if first == "[":
+            yield from _iter_json_array(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
 
-    engine = create_engine(db_url)
-    Base.metadata.create_all(engine)
+def to_sample(record: dict) -> Optional[Sample]:
+    text = record.get("text")
+    label = record.get("label")
+    if not isinstance(text, str) or not text.strip() or label is None:
+        return None
+    try:
+        return text, int(label)
+    except (TypeError, ValueError):
+        return None
 
-    session = Session(engine)
 
+def read_checkpoint(path: str) -> int:
     try:
-        values_to_insert = []
-        for ex in examples:
-            text_content = ex["text"]
-            label = ex["label"]
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f)["records_done"])
+    except FileNotFoundError:
+        return 0
+
 
-            embedding = model.encode(text_content, convert_to_tensor=False).tolist()
+def write_checkpoint(path: str, records_done: int):
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump({"records_done": records_done}, f)
+    os.replace(temporary, path)
 
-            values_to_insert.append({
-                "sample_message": text_content,
-                "importance_score": label,
-                "embedding": embedding
-            })
 
-        if values_to_insert:
-            insert_query = text("""
+def _database_url() -> str:
+    # asyncpg takes a plain postgresql:// URL.
+    return settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def _prepare_connection(connection: asyncpg.Connection):
+    from pgvector.asyncpg import register_vector
+
+    await register_vector(connection)
+    await connection.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS importance_sample_staging (
+            sample_message TEXT,
+            importance_score INTEGER,
+            embedding vector(384)
+        ) ON COMMIT DELETE ROWS
+        """
+    )
+
+
+async def write_batch(connection: asyncpg.Connection, samples: List[Sample], embeddings: np.ndarray, method: str) -> Optional[int]:
+    """Inserts one batch in a transaction and returns the number of new rows (None with executemany, which does not report it)."""
+    records = [(text, label, embedding) for (text, label), embedding in zip(samples, embeddings)]
+    async with connection.transaction():
+        if method == "copy":
+            await connection.copy_records_to_table(
+                "importance_sample_staging",
+                records=records,
+                columns=["sample_message", "importance_score", "embedding"],
+            )
+            status = await connection.execute(
+                """
                 INSERT INTO importance_sample_messages (sample_message, importance_score, embedding)
-                VALUES (:sample_message, :importance_score, :embedding)
-                ON CONFLICT (sample_message) DO NOTHING;
-            """)
+                SELECT DISTINCT ON (sample_message) sample_message, importance_score, embedding
+                FROM importance_sample_staging
+                ON CONFLICT (sample_message) DO NOTHING
+                """
+            )
+            return int(status.split()[-1])
+
+        await connection.executemany(
+            """
+            INSERT INTO importance_sample_messages (sample_message, importance_score, embedding)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (sample_message) DO NOTHING
+            """,
+            records,
+        )
+        return None
 
-            for entry in values_to_insert:
-                session.execute(insert_query, entry)
 
-            session.commit()
-            print(f"Successfully stored {len(values_to_insert)} new embeddings in the database.")
+def iter_batches(path: str, skip: int, batch_size: int) -> Iterator[Tuple[int, List[Sample], int]]:
+    """Yields (records consumed up to the end of the batch, valid samples, invalid count)."""
+    consumed = 0
+    batch: List[Sample] = []
+    invalid = 0
+    for record in iter_records(path):
+        consumed += 1
+        if consumed <= skip:
+            continue
+        sample = to_sample(record)
+        if sample is None:
+            invalid += 1
         else:
-            print("No new embeddings to store.")
-
-    except IntegrityError as ie:
-        session.rollback()
-        print(f"Integrity Error: {ie}")
-    except Exception as e:
-        session.rollback()
-        print(f"Unexpected error: {e}")
+            batch.append(sample)
+        if len(batch) >= batch_size:
+            yield consumed, batch, invalid
+            batch, invalid = [], 0
+    if batch or invalid:
+        yield consumed, batch, invalid
+
+
+async def ingest(path: str, batch_size: int, method: str, checkpoint_path: str, restart: bool):
+    from sentence_transformers import SentenceTransformer
+
+    skip = 0 if restart else read_checkpoint(checkpoint_path)
+    if skip:
+        print(f"Resuming after {skip} records (checkpoint {checkpoint_path})")
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    connection = await asyncpg.connect(_database_url())
+    await _prepare_connection(connection)
+
+    totals = {"samples": 0, "inserted": 0, "invalid": 0}
+    encode_seconds = 0.0
+    write_seconds = 0.0
+    started = time.perf_counter()
+
+    async def write(consumed: int, samples: List[Sample], embeddings: np.ndarray):
+        nonlocal write_seconds
+        write_started = time.perf_counter()
+        if samples:
+            inserted = await write_batch(connection, samples, embeddings, method)
+            if inserted is None:
+                totals["inserted"] = None
+            elif totals["inserted"] is not None:
+                totals["inserted"] += inserted
+        write_seconds += time.perf_counter() - write_started
+        write_checkpoint(checkpoint_path, consumed)
+
+        elapsed = time.perf_counter() - started
+        print(
+            f"{consumed} records read, {totals['samples']} encoded, {totals['inserted']} inserted, "
+            f"{totals['invalid']} invalid | {totals['samples'] / elapsed:.0f} samples/s "
+            f"(encode {encode_seconds:.1f}s, database {write_seconds:.1f}s)"
+        )
+
+    try:
+        pending = None
+        for consumed, samples, invalid in iter_batches(path, skip, batch_size):
+            encode_started = time.perf_counter()
+            texts = [text for text, _ in samples]
+            # Normalised like the embeddings written by the application, which are compared by cosine distance.
+            embeddings = await asyncio.to_thread(model.encode, texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True) if texts else np.empty((0, 384), dtype=np.float32)
+            encode_seconds += time.perf_counter() - encode_started
+            totals["samples"] += len(samples)
+            totals["invalid"] += invalid
+
+            # The previous batch was being written while this one was encoded.
+            if pending is not None:
+                await pending
+            pending = asyncio.create_task(write(consumed, samples, embeddings))
+        if pending is not None:
+            await pending
     finally:
-        session.close()
+        await connection.close()
+
+    elapsed = time.perf_counter() - started
+    inserted = f"{totals['inserted']} new samples" if totals["inserted"] is not None else "new samples not counted with executemany"
+    print(f"Done in {elapsed:.1f}s: {totals['samples']} samples loaded ({inserted}), {totals['invalid']} invalid records skipped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "data", "synthetic_importance_data.json"))
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--method", choices=["copy", "executemany"], default="copy")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <path>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    asyncio.run(ingest(args.path, args.batch_size, args.method, args.checkpoint or args.path + ".checkpoint", args.restart))
 
 
 if __name__ == "__main__":
-    filepath = r"d:\OtherCodingProjects\website-backend-api\app\data\synthetic_importance_data.json"
-    create_embeddings_and_store(filepath, db_url)
+    main()
 
-#%%
\ No newline at end of file
+#%%
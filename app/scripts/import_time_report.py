@@ -0,0 +1,91 @@
+#%%
+"""
+Summarises `python -X importtime` output for the application entry point.
+
+Usage:
+    python app/scripts/import_time_report.py [--module app.main] [--top 20] [--max-seconds 1.0]
+
+Exits with a non-zero status if importing the module takes longer than
+--max-seconds, or if any of the --forbid modules (torch, sentence_transformers
+by default) are imported eagerly. CI runs this to track worker startup time.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+DEFAULT_FORBIDDEN = ["torch", "sentence_transformers", "transformers"]
+
+
+def run_importtime(module: str) -> tuple[float, list[tuple[int, int, int, str]]]:
+    """Imports `module` in a fresh interpreter and returns (wall seconds, parsed importtime rows)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        raise RuntimeError(f"Importing {module} failed with exit code {result.returncode}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return wall, rows
+
+
+def summarise(rows: list[tuple[int, int, int, str]], top: int) -> list[tuple[str, int]]:
+    """Returns the `top` packages by total self import time (microseconds) of all their modules."""
+    packages = {}
+    for self_us, cumulative_us, depth, name in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN)
+    args = parser.parse_args()
+
+    wall, rows = run_importtime(args.module)
+    total_us = sum(row[1] for row in rows if row[2] == 0)
+
+    print(f"Import of {args.module}: {total_us / 1e6:.3f}s in imports, {wall:.3f}s wall (incl. interpreter start)")
+    print(f"{'package':<40} {'self time':>12}")
+    for package, cumulative_us in summarise(rows, args.top):
+        print(f"{package:<40} {cumulative_us / 1e3:>10.1f}ms")
+
+    imported = {row[3] for row in rows}
+    eager = [module for module in args.forbid if module in imported]
+
+    status = 0
+    if eager:
+        print(f"FAIL: modules that should be lazily imported were imported eagerly: {', '.join(eager)}")
+        status = 1
+    if args.max_seconds is not None and total_us / 1e6 > args.max_seconds:
+        print(f"FAIL: import time {total_us / 1e6:.3f}s exceeds budget of {args.max_seconds:.3f}s")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+#%%
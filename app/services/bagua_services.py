@@ -6,12 +6,12 @@ from fastapi import HTTPException
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.logging_config import log_payload
 from app.models.database_models.user import User
 from app.models.llm_models import ChatRequest
 
 from app.services.llm.llm_services import chat_logic
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
@@ -20,7 +20,7 @@ async def analyze_bagua_request(request: ChatRequest, db: AsyncSession, redis_cl
     Analyzes a Bagua request, generates an LLM response, and streams it.
     """
     logger.info("Starting Bagua service")
-    logger.debug(f"Full Request: {request.__dict__}")
+    log_payload(logger, "Bagua request", request.__dict__)
 
     if not request.message or not request.message.strip():
         logger.warning("Invalid input: Message cannot be empty")
@@ -77,7 +77,7 @@ async def analyze_bagua_request(request: ChatRequest, db: AsyncSession, redis_cl
             f"{prompt_data['analyze_general']}"
         )
     
-    logger.info(prompt)
+    log_payload(logger, "Bagua prompt", prompt)
     llm_request = ChatRequest(session_id = session_id, prompt=prompt, language=language, system_instruction=system_instruction)
 
 
@@ -87,7 +87,7 @@ async def analyze_bagua_request(request: ChatRequest, db: AsyncSession, redis_cl
             response_chunks.append(chunk)
             yield chunk
     except Exception as e:
-        logger.exception(f"Error during LLM processing: {e}")
+        logger.exception("Error during LLM processing: %s", e)
         error_message = f"{prompt_data['error_llm']}{e}"
         yield error_message
         raise HTTPException(status_code=500, detail=error_message)
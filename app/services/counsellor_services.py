@@ -1,12 +1,15 @@
 # app/services/counsellor_services.py
+import asyncio
 import logging
-import time
 from typing import AsyncGenerator
 
 from fastapi import HTTPException
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
+from app.core.logging_config import log_payload
+from app.core.tracing import span
 from app.models.database_models.user import User
 from app.models.counsellor_models import CounsellorChatRequest
 from app.models.llm_models import ChatRequest
@@ -20,10 +23,24 @@ from app.services.database.user_database_services import (
     get_active_user_plan
 )
 from app.services.llm.llm_services import chat_logic, generate_reflection
+from app.services.llm.llm_utils import PARTIAL_RESULT_SUFFIX, select_model
+from app.services.llm.prompt_budget import budget_counsellor_context
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+COUNSELLOR_PROMPT_TEMPLATE = (
+    "{custom_prompt}\n\n"
+    "Recent Message History (Last 10):\n{history_redis}\n\n"
+    "Relevant Message History (From Database):\n{history_db}\n\n"
+    "User: {message}"
+)
+
+def validate_counsellor_request(request: CounsellorChatRequest):
+    """Raises a 400 for an empty message. Called by the route before the stream starts."""
+    if not request.message or not request.message.strip():
+        logger.warning("Invalid input: Message cannot be empty")
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+
 async def analyse_counsellor_request(request: CounsellorChatRequest, db: AsyncSession, redis_client: Redis, user: User) -> AsyncGenerator[str, None]:
     """
     Analyzes user input, generates LLM response, manages caching,
@@ -31,15 +48,14 @@ async def analyse_counsellor_request(request: CounsellorChatRequest, db: AsyncSe
     is triggered based on a cumulative importance score, and uses the Redis-cached
     conversation history.
     """
-    request_received_time = time.time()
-    logging.debug("Starting analyse_counsellor_request")
+    logger.debug("Starting analyse_counsellor_request")
 
-    if not request.message or not request.message.strip():
-        logging.warning("Invalid input: Message cannot be empty")
-        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    validate_counsellor_request(request)
 
     language = request.language if request.language else "en"
     session_id = request.session_id if request.session_id else "default"
+    # Chosen up front so the prompt is budgeted for the model that answers it.
+    model = select_model(session_id)
 
     system_messages = {
         "en": "You are a helpful and empathetic counselor. Provide concise, supportive advice, and respond in English.\n",
@@ -54,70 +70,101 @@ async def analyse_counsellor_request(request: CounsellorChatRequest, db: AsyncSe
         if user_plan:
             system_instruction = system_messages.get(language, system_messages["en"]) + user_plan.plan_text
         
-    logging.debug(f"System instruction: {system_instruction}")
+    log_payload(logger, "Counsellor system instruction", system_instruction)
 
     async def build_counsellor_prompt(request: CounsellorChatRequest, user: User, db: AsyncSession, redis_client: Redis) -> str:
         """Builds the complete prompt, using embedding-based retrieval and Redis."""
         try:
-            logging.debug(f"Building counsellor prompt for user: {user.username}, session: {request.session_id}")
+            logger.debug("Building counsellor prompt for user: %s, session: %s", user.username, request.session_id)
 
             if not request.private_session:
                 custom_prompt_obj = await get_latest_counsellor_prompt(db, user.id)
-                custom_prompt = custom_prompt_obj.prompt_text if custom_prompt_obj else ""
+                custom_prompt = custom_prompt_obj.plan_text if custom_prompt_obj else ""
             else:
                 custom_prompt = ""
 
-            relevant_messages = await get_similar_importance_recent_counsellor_responses(
-                db=db,
-                user_id=user.id,
-                user_message=request.message,
-                top_n=5,
-                private_session=request.private_session,
-                session_id=request.session_id)
-            logging.debug(f"Number of relevant messages found: {len(relevant_messages)}")
-
-            history_string_db = "\n".join(
-                [f"User: {msg['user_message']}\nCounsellor: {msg['counsellor_response']}"
-                 for msg in relevant_messages]
-            )
+            with span("retrieval"):
+                relevant_messages = await get_similar_importance_recent_counsellor_responses(
+                    db=db,
+                    user_id=user.id,
+                    user_message=request.message,
+                    top_n=5,
+                    private_session=request.private_session,
+                    session_id=request.session_id)
+            logger.debug("Number of relevant messages found: %s", len(relevant_messages))
+
+            retrieved_turns = [
+                f"User: {msg['user_message']}\nCounsellor: {msg['counsellor_response']}"
+                for msg in relevant_messages
+            ]
 
             cache_key = f"counsellor_history:{user.id}:{session_id}"
             history_list = await redis_client.lrange(cache_key, 0, 9)
-            history_string_redis = "\n".join(history_list)
 
-            logging.debug(f"Number of messages retrieved from Redis: {len(history_list)}")
+            logger.debug("Number of messages retrieved from Redis: %s", len(history_list))
 
-            final_prompt = f"{custom_prompt}\n\nRecent Message History (Last 10):\n{history_string_redis}\n\nRelevant Message History (From Database):\n{history_string_db}\n\nUser: {new_message}"
-            logging.debug(f"Final Prompt Length: {len(final_prompt)}")
+            # Deduplicates turns present in both Redis and the DB and trims the lowest-value ones to the model's budget.
+            context = budget_counsellor_context(
+                custom_prompt=custom_prompt,
+                recent_turns=history_list,
+                retrieved_turns=retrieved_turns,
+                user_message=request.message,
+                overhead=COUNSELLOR_PROMPT_TEMPLATE.format(custom_prompt="", history_redis="", history_db="", message=""),
+                model=model,
+            )
+            history_string_redis = "\n".join(context["recent_turns"])
+            history_string_db = "\n".join(context["retrieved_turns"])
+
+            final_prompt = COUNSELLOR_PROMPT_TEMPLATE.format(
+                custom_prompt=context["custom_prompt"],
+                history_redis=history_string_redis,
+                history_db=history_string_db,
+                message=request.message,
+            )
+            logger.debug(
+                "Final prompt: ~%s of %s tokens, %s/%s recent and %s/%s retrieved turns kept",
+                context["tokens"], context["budget"],
+                len(context["recent_turns"]), len(history_list),
+                len(context["retrieved_turns"]), len(retrieved_turns),
+            )
 
             return final_prompt
 
         except Exception as e:
-            logging.error(f"Error in build_counsellor_prompt: {e}", exc_info=True)
+            logger.error("Error in build_counsellor_prompt: %s", e, exc_info=True)
             raise
 
     try:
-        prompt = await build_counsellor_prompt(request, user, db, redis_client)
+        with span("prompt_build"):
+            prompt = await build_counsellor_prompt(request, user, db, redis_client)
     except Exception as e:
-        logging.error(f"❌ build_counsellor_prompt failed: {e}", exc_info=True)
+        logger.error("❌ build_counsellor_prompt failed: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-    llm_request = ChatRequest(session_id=session_id, prompt=prompt, language=language, system_instruction=system_instruction)
+    llm_request = ChatRequest(session_id=session_id, prompt=prompt, model=model, language=language, system_instruction=system_instruction)
 
     response_chunks = []
     try:
-        logging.debug("Sending request to LLM service.")
+        logger.debug("Sending request to LLM service.")
         async for chunk in chat_logic(llm_request, db, redis_client, user.id):
             response_chunks.append(chunk)
-            if len(response_chunks) == 1:
-                first_chunk_time = time.time()
-                time_to_first_chunk = first_chunk_time - request_received_time
-                logger.info(f"Time to first chunk (counsellor): {time_to_first_chunk:.4f} seconds")
             yield chunk
-        logging.debug("Received full response from LLM service.")
-
+        logger.debug("Received full response from LLM service.")
+
+    except asyncio.CancelledError:
+        # The client went away: no importance update or reflection for a reply nobody read.
+        logger.info("Counsellor reply cancelled after %d chunks", len(response_chunks))
+        if response_chunks and settings.PERSIST_PARTIAL_RESULTS:
+            partial_response = "".join(response_chunks) + PARTIAL_RESULT_SUFFIX
+            try:
+                with span("persistence"):
+                    # Queued without waiting for the commit: this task is being cancelled, and the writer commits it on its own.
+                    await _record_turn(db, redis_client, user.id, session_id, request.message, partial_response, wait=False)
+            except Exception as e:
+                logger.exception("Error storing partial counsellor reply: %s", e)
+        raise
     except Exception as e:
-        logging.exception(f"Error during LLM processing: {e}")
+        logger.exception("Error during LLM processing: %s", e)
         error_message = f"LLM Error: {str(e)}" if language == "en" else f"LLM错误: {str(e)}"
         yield error_message
         raise HTTPException(status_code=500, detail=error_message)
@@ -126,23 +173,21 @@ async def analyse_counsellor_request(request: CounsellorChatRequest, db: AsyncSe
 
     # --- Database and Redis Updates (with Importance) ---
     try:
-        new_message = await create_counsellor_message(db, user.id, session_id, request.message, full_response)
-        importance_score = new_message.importance_score
-
-        cache_key = f"counsellor_history:{user.id}:{session_id}"
-        await redis_client.lpush(cache_key, f"User: {request.message}\nCounsellor: {full_response}")
-        await redis_client.ltrim(cache_key, 0, 9)
-        logging.debug(f"Cache updated: {cache_key}")
-
+        with span("persistence"):
+            new_message = await _record_turn(
+                db, redis_client, user.id, session_id, request.message, full_response,
+                wait=not settings.COUNSELLOR_MESSAGE_WRITE_BEHIND,
+            )
+            importance_score = new_message.importance_score
 
-        importance_key = f"counsellor_importance:{user.id}:{session_id}"
-        if importance_score is not None:
-            await redis_client.incrbyfloat(importance_key, importance_score)
-        current_importance_total = float(await redis_client.get(importance_key) or 0)
-        logging.debug(f"Current importance total: {current_importance_total}")
+            importance_key = f"counsellor_importance:{user.id}:{session_id}"
+            if importance_score is not None:
+                await redis_client.incrbyfloat(importance_key, importance_score)
+            current_importance_total = float(await redis_client.get(importance_key) or 0)
+            logger.debug("Current importance total: %s", current_importance_total)
 
     except Exception as e:
-        logging.exception(f"Error during database operation or importance calculation: {e}")
+        logger.exception("Error during database operation or importance calculation: %s", e)
         error_message = f"Database/Importance Error: {str(e)}" if language == "en" else f"数据库/重要性错误: {str(e)}"
         if not response_chunks:
             raise HTTPException(status_code=500, detail=error_message)
@@ -152,7 +197,7 @@ async def analyse_counsellor_request(request: CounsellorChatRequest, db: AsyncSe
         # --- Reflection Trigger Logic ---
         REFLECTION_THRESHOLD = 10.0
         if current_importance_total >= REFLECTION_THRESHOLD:
-            logging.debug("Generating reflection (threshold reached).")
+            logger.debug("Generating reflection (threshold reached).")
 
             cache_key = f"counsellor_history:{user.id}:{session_id}"
             history_list = await redis_client.lrange(cache_key, 0, -1)
@@ -160,22 +205,36 @@ async def analyse_counsellor_request(request: CounsellorChatRequest, db: AsyncSe
 
             from app.models.llm_models import ReflectionRequest
             reflection_request = ReflectionRequest(conversation_history=conversation_history, user_id=user.id, model="gemini-2.0-flash-lite")
-            reflection = await generate_reflection(reflection_request)
+            with span("reflection"):
+                reflection = await generate_reflection(reflection_request)
 
             if reflection:
                 await create_or_update_user_reflection(db, user.id, reflection)
-                logging.debug("Reflection generated and stored successfully.")
+                logger.debug("Reflection generated and stored successfully.")
 
                 await redis_client.set(importance_key, 0)
-                logging.debug("Importance score reset.")
+                logger.debug("Importance score reset.")
             else:
-                logging.error("Reflection generation returned None.")
+                logger.error("Reflection generation returned None.")
 
         else:
-            logging.debug("Reflection not generated (threshold not reached).")
+            logger.debug("Reflection not generated (threshold not reached).")
 
     except Exception as e:
-        logging.exception(f"Error during reflection generation or storage: {e}")
+        logger.exception("Error during reflection generation or storage: %s", e)
+
+
+async def _record_turn(db: AsyncSession, redis_client: Redis, user_id: int, session_id: str, message: str, response: str, wait: bool):
+    """
+    Writes a turn to the database (with `wait`, until it is committed;
+    otherwise until it is queued) and then adds it to the Redis history that
+    the next prompt reads, so a turn the database never accepted is never in
+    the history.
+    """
+    new_message = await create_counsellor_message(db, user_id, session_id, message, response, wait=wait)
 
-    end_time = time.time()
-    logger.info(f"Total counsellor service time: {end_time - request_received_time:.4f} seconds")
+    cache_key = f"counsellor_history:{user_id}:{session_id}"
+    await redis_client.lpush(cache_key, f"User: {message}\nCounsellor: {response}")
+    await redis_client.ltrim(cache_key, 0, 9)
+    logger.debug("Cache updated: %s", cache_key)
+    return new_message
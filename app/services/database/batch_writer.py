@@ -0,0 +1,148 @@
+# app/services/database/batch_writer.py
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import insert
+
+from app.data.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+BATCH_WRITER_ROWS = Counter(
+    "app_batch_writer_rows_total",
+    "Rows handed to a batch writer, by table and result (written, failed).",
+    ["table", "result"],
+)
+BATCH_WRITER_BATCH_ROWS = Histogram(
+    "app_batch_writer_batch_rows",
+    "Rows per multi-row INSERT.",
+    ["table"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+BATCH_WRITER_FLUSH_SECONDS = Histogram(
+    "app_batch_writer_flush_seconds",
+    "Time to insert and commit one batch.",
+    ["table"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+BATCH_WRITER_ACK_SECONDS = Histogram(
+    "app_batch_writer_ack_seconds",
+    "Time from a row being submitted to its batch being committed (the durable write acknowledgment).",
+    ["table"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+def _mark_retrieved(future: asyncio.Future):
+    # Rows submitted without waiting would otherwise log "exception was never retrieved";
+    # failures are logged by the writer.
+    if not future.cancelled():
+        future.exception()
+
+
+class BatchWriter:
+    """
+    Buffers inserts into one table and writes them as multi-row INSERTs in a
+    single transaction, when `max_rows` rows are waiting or `flush_ms` after the
+    first of them arrived, whichever comes first.
+
+    submit() returns a future that resolves to the new row's primary key once
+    its batch has committed, or raises if the batch failed; await it for a
+    durable acknowledgment, or drop it to write behind. close() writes
+    whatever is still buffered and is called on shutdown.
+    """
+
+    def __init__(self, model, max_rows: int = 100, flush_ms: float = 200, retries: int = 1):
+        self.model = model
+        self.table = model.__tablename__
+        self.max_rows = max_rows
+        self.flush_ms = flush_ms
+        self.retries = retries
+        self._pending: List[Tuple[dict, asyncio.Future, float]] = []
+        self._has_rows = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def submit(self, row: dict) -> asyncio.Future:
+        """Buffers one row (column name -> value) for the next batch."""
+        if self._closed:
+            # Rows arriving after shutdown began are lost; count them with the batches that failed.
+            BATCH_WRITER_ROWS.labels(self.table, "failed").inc()
+            raise RuntimeError(f"Batch writer for {self.table} is closed")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_mark_retrieved)
+        self._pending.append((row, future, time.perf_counter()))
+        self._has_rows.set()
+        if len(self._pending) >= self.max_rows:
+            self._full.set()
+        return future
+
+    async def write(self, row: dict):
+        """Submits a row and waits until it is committed. Returns its primary key."""
+        return await self.submit(row)
+
+    async def _run(self):
+        while not self._closed:
+            await self._has_rows.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        """Writes every buffered row now, in batches of at most max_rows."""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, []
+            self._has_rows.clear()
+            self._full.clear()
+            for start in range(0, len(pending), self.max_rows):
+                await self._write_batch(pending[start:start + self.max_rows])
+
+    async def _write_batch(self, batch: List[Tuple[dict, asyncio.Future, float]]):
+        rows = [row for row, _, _ in batch]
+        statement = insert(self.model).returning(*self.model.__table__.primary_key.columns, sort_by_parameter_order=True)
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(statement, rows)
+                    keys = [row[0] if len(row) == 1 else tuple(row) for row in result.all()]
+                    await db.commit()
+                break
+            except Exception as e:
+                if attempt < self.retries:
+                    logger.warning("Writing %d rows to %s failed, retrying: %s", len(batch), self.table, e)
+                    await asyncio.sleep(self.flush_ms / 1000)
+                    continue
+                logger.exception("Writing %d rows to %s failed: %s", len(batch), self.table, e)
+                BATCH_WRITER_ROWS.labels(self.table, "failed").inc(len(batch))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        committed = time.perf_counter()
+        BATCH_WRITER_ROWS.labels(self.table, "written").inc(len(batch))
+        BATCH_WRITER_BATCH_ROWS.labels(self.table).observe(len(batch))
+        BATCH_WRITER_FLUSH_SECONDS.labels(self.table).observe(committed - started)
+        for (_, future, submitted), key in zip(batch, keys):
+            BATCH_WRITER_ACK_SECONDS.labels(self.table).observe(committed - submitted)
+            if not future.done():
+                future.set_result(key)
+
+    async def close(self):
+        """Stops accepting rows, lets the flush loop finish and writes any rows still buffered."""
+        self._closed = True
+        self._has_rows.set()
+        self._full.set()
+        if self._task is not None:
+            await self._task
+        await self.flush()
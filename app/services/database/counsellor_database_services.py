@@ -7,10 +7,12 @@ from sqlalchemy import asc, desc, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.models.database_models.counsellor_message_history import (
     CounsellorMessageHistory,
 )
 from app.models.database_models.user_plan import UserPlan
+from app.services.database.batch_writer import BatchWriter
 from app.services.database.embedding_database_services import (
     generate_embedding,
     retrieve_similar_importance_recent_messages,
@@ -26,6 +28,13 @@ from app.services.database.importance_database_services import (
 # # If you've already configured logging at the top level, you can omit this:
 # logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+# New messages are inserted in batches, across requests; see create_counsellor_message.
+counsellor_message_writer = BatchWriter(
+    CounsellorMessageHistory,
+    max_rows=settings.COUNSELLOR_MESSAGE_BATCH_ROWS,
+    flush_ms=settings.COUNSELLOR_MESSAGE_FLUSH_MS,
+)
+
 async def get_counsellor_messages(
     db: AsyncSession, user_id: int, session_id: Optional[str] = None, limit: int = 10, order_by: str = "desc"
 ) -> List[CounsellorMessageHistory]:
@@ -48,9 +57,9 @@ async def get_counsellor_messages(
         query = query.where(CounsellorMessageHistory.session_id == session_id)
 
     if order_by == "asc":
-        query = query.order_by(asc(CounsellorMessageHistory.timestamp))
+        query = query.order_by(asc(CounsellorMessageHistory.last_updated_timestamp))
     else:
-        query = query.order_by(desc(CounsellorMessageHistory.timestamp))
+        query = query.order_by(desc(CounsellorMessageHistory.last_updated_timestamp))
 
     result = await db.execute(query.limit(limit))
     return result.scalars().all()
@@ -64,9 +73,14 @@ async def create_counsellor_message(
     similarity_threshold: float = 0.6,
     top_k: int = 10,
     placeholder_value: float = 0.0,
+    wait: bool = True,
 ) -> CounsellorMessageHistory:
     """
     Creates a new counsellor message record, calculating and storing importance.
+
+    The record is inserted by counsellor_message_writer in a batch with other
+    requests' messages. With `wait`, returns once it is committed, with its id
+    set; otherwise returns as soon as it is queued, unsaved and without an id.
     """
     if user_message is None and counsellor_response is None:
         raise ValueError("At least one of user_message or counsellor_response must be provided.")
@@ -78,20 +92,20 @@ async def create_counsellor_message(
             if user_message else None
         )
         
-        new_message = CounsellorMessageHistory(
-            user_id=user_id,
-            session_id=session_id,
-            user_message=user_message,
-            counsellor_response=counsellor_response,
-            embedding=np.array(embedding) if embedding is not None else None,
-            importance_score=importance_score,
-        )
-        
-        db.add(new_message)
-        await db.flush()
-        await db.commit()
-        await db.refresh(new_message)
-        
+        row = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "user_message": user_message,
+            "counsellor_response": counsellor_response,
+            "embedding": np.array(embedding) if embedding is not None else None,
+            "importance_score": importance_score,
+        }
+        new_message = CounsellorMessageHistory(**row)
+
+        written = counsellor_message_writer.submit(row)
+        if wait:
+            new_message.id, new_message.creation_timestamp = await written
+
         return new_message
     
     except SQLAlchemyError:
@@ -138,10 +152,9 @@ async def get_similar_importance_recent_counsellor_responses(db: AsyncSession, u
             embedding_column_name=embedding_column,
             return_column_names=return_columns,
             top_k=top_n, 
-            similarity_weight=0.3,
-            importance_weight=0.5,
-            recency_weight=0.2,
-            additional_filters={"session_id": session_id}
+            additional_filters={"session_id": session_id},
+            max_age_days=settings.COUNSELLOR_RETRIEVAL_MAX_AGE_DAYS,
+            scoring_profile="private_session",
         )
         
     else:
@@ -153,10 +166,9 @@ async def get_similar_importance_recent_counsellor_responses(db: AsyncSession, u
             embedding_column_name=embedding_column,
             return_column_names=return_columns,
             top_k=top_n, 
-            similarity_weight=0.3,
-            importance_weight=0.5,
-            recency_weight=0.2,
-            additional_filters={"private_message": False}
+            additional_filters={"private_message": False},
+            max_age_days=settings.COUNSELLOR_RETRIEVAL_MAX_AGE_DAYS,
+            scoring_profile="counsellor",
         )
 
     return similar_messages
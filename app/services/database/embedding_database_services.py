@@ -1,18 +1,113 @@
 # app/services/database_services/embedding_database_services.py
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from sqlalchemy import MetaData, Table, and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 from pgvector.sqlalchemy import Vector
 
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+from app.core.config import settings
+from app.core.tracing import span
+from app.services.database.reranking import mmr_select, rerank, resolve_profile
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIMENSIONS = 384
+
+# ORDER BY expressions of the quantized representations, matching the expression indexes added
+# by migration e8b4f2a6c9d1. {column} is the embedding column, {query} the query vector literal.
+QUANTIZED_DISTANCES = {
+    "halfvec": "({column}::halfvec(384) <-> {query}::halfvec(384))",
+    "binary": "(binary_quantize({column})::bit(384) <~> binary_quantize({query}))",
+}
+
+_embedding_model = None
+
+def get_embedding_model():
+    """
+    Returns the sentence-transformers model, loading it on first use.
+    sentence_transformers (and torch) are imported here so that routes which
+    never embed anything do not pay for them at worker boot.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
 
 async def generate_embedding(text: str):
     """Generate a 384-dimensional embedding for a given text message."""
-    return np.array(embedding_model.encode(text, normalize_embeddings=True), dtype=np.float32)
+    with span("embedding"):
+        return np.array(get_embedding_model().encode(text, normalize_embeddings=True), dtype=np.float32)
+
+def nearest_rows_sql(
+    select_list: str,
+    table_name: str,
+    embedding_column_name: str,
+    embedding_str: str,
+    where_clause: str = "TRUE",
+    limit: str = ":top_k",
+    distance_alias: str = "_distance",
+    mode: Optional[str] = None,
+) -> str:
+    """
+    SQL for the `limit` rows nearest to `embedding_str`, ordered by their full
+    precision L2 distance (selected as `distance_alias`).
+
+    In "halfvec" or "binary" mode (VECTOR_SEARCH_MODE by default), the index
+    scan runs on the quantized representation and fetches
+    VECTOR_RESCORE_FACTOR times as many rows, which are then rescored against
+    the full vectors. The quantized indexes are about half (halfvec) or a
+    thirty-second (binary) the size of the full-precision one.
+
+    Run configure_hnsw_scan first in the same transaction, or the index scan
+    stops at hnsw.ef_search rows (40 by default) whatever the LIMIT.
+    """
+    mode = mode or settings.VECTOR_SEARCH_MODE
+    distance = f"({embedding_column_name} <-> {embedding_str})"
+    if mode == "full":
+        return f"""
+            SELECT {select_list}, {distance} AS {distance_alias}
+            FROM {table_name}
+            WHERE {where_clause}
+            ORDER BY {distance_alias}
+            LIMIT {limit}
+        """
+    approximate = QUANTIZED_DISTANCES[mode].format(column=embedding_column_name, query=embedding_str)
+    return f"""
+        SELECT * FROM (
+            SELECT {select_list}, {distance} AS {distance_alias}
+            FROM {table_name}
+            WHERE {where_clause}
+            ORDER BY {approximate}
+            LIMIT {limit} * {int(settings.VECTOR_RESCORE_FACTOR)}
+        ) AS approximate
+        ORDER BY {distance_alias}
+        LIMIT {limit}
+    """
+
+
+def ef_search_for(rows: int, mode: Optional[str] = None) -> int:
+    """hnsw.ef_search needed for an index scan to return `rows` rows (before rescoring)."""
+    if (mode or settings.VECTOR_SEARCH_MODE) != "full":
+        rows *= settings.VECTOR_RESCORE_FACTOR
+    return min(max(rows, 40), 1000)
+
+
+async def configure_hnsw_scan(db, rows: int, filtered: bool, mode: Optional[str] = None):
+    """
+    Sets, for the current transaction, how far a nearest_rows_sql index scan
+    goes: hnsw.ef_search for `rows` rows (times VECTOR_RESCORE_FACTOR on a
+    quantized index). The WHERE clause of a `filtered` query is applied only
+    to the rows the index returns, so with RETRIEVAL_HNSW_ITERATIVE_SCAN
+    (pgvector 0.8+) the scan also keeps going until enough rows pass it.
+    """
+    await db.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search_for(rows, mode)}"))
+    if filtered and settings.RETRIEVAL_HNSW_ITERATIVE_SCAN:
+        # relaxed_order may return rows slightly out of distance order. The quantized queries re-sort
+        # by full distance, and filtered callers re-rank the candidates anyway.
+        await db.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+
 
 async def retrieve_similar_messages(
     db: AsyncSession,
@@ -24,21 +119,19 @@ async def retrieve_similar_messages(
 ):
     """Retrieve similar messages using direct SQL query, NOT filtering by user_id."""
     try:
-        query_embedding = np.array(embedding_model.encode(query_text, normalize_embeddings=True), dtype=np.float32).tolist()
+        with span("embedding"):
+            query_embedding = np.array(get_embedding_model().encode(query_text, normalize_embeddings=True), dtype=np.float32).tolist()
 
         embedding_str = f"'[{','.join(map(str, query_embedding))}]'::vector"
 
-        sql_query = text(f"""
-            SELECT 
-                {', '.join(return_column_names)},
-                ({embedding_column_name} <-> {embedding_str}) AS similarity_score
-            FROM {table_name}
-            ORDER BY similarity_score ASC
-            LIMIT :top_k;
-        """)
-        # sql_query = text(f"SELECT 1 FROM importance_sample_messages LIMIT 1;")
+        sql_query = text(nearest_rows_sql(
+            ', '.join(return_column_names), table_name, embedding_column_name, embedding_str,
+            distance_alias="similarity_score",
+        ))
 
-        results = await db.execute(sql_query, {"top_k": top_k})
+        with span("vector_search"):
+            await configure_hnsw_scan(db, top_k, filtered=False)
+            results = await db.execute(sql_query, {"top_k": top_k})
         all_results = results.fetchall()
         return [dict(row._mapping) for row in all_results]
 
@@ -60,6 +153,9 @@ async def retrieve_similar_importance_recent_messages(
     importance_weight: float = 0.4,
     recency_weight: float = 0.2,
     additional_filters: Optional[Dict[str, Any]] = None,
+    max_age_days: Optional[int] = None,
+    created_column_name: str = "creation_timestamp",
+    scoring_profile: Optional[Union[str, dict]] = None,
 ):
     """
     Retrieve messages using a direct SQL query, filtering by user_id and
@@ -80,16 +176,37 @@ async def retrieve_similar_importance_recent_messages(
         additional_filters: A dictionary of additional filters to apply.
             Keys are column names, and values are the values to filter by.
             Example:  {'reflection_type': 'counsellor'}
+        max_age_days: If set, only rows whose `created_column_name` is within
+            this many days are considered. On a table partitioned by that
+            column, older partitions are not scanned at all.
+        created_column_name: The creation time column `max_age_days` applies to.
+        scoring_profile: A profile name from reranking.SCORING_PROFILES (or a
+            dict of overrides) whose weights, recency_days and timestamp column
+            replace the arguments above. With RETRIEVAL_RERANK_IN_NUMPY, the
+            nearest RETRIEVAL_CANDIDATES rows are fetched with their raw
+            distance, importance and age, and scored in NumPy instead of
+            scoring every row in SQL. Either way, a profile with mmr_lambda
+            picks the results from the best RETRIEVAL_CANDIDATES by MMR.
 
     Returns:
         A list of dictionaries, each representing a row from the query result.
     """
     try:
-        query_embedding = np.array(
-            embedding_model.encode(query_text, normalize_embeddings=True), dtype=np.float32
-        ).tolist()
+        with span("embedding"):
+            query_embedding = np.array(
+                get_embedding_model().encode(query_text, normalize_embeddings=True), dtype=np.float32
+            ).tolist()
         embedding_str = f"'[{','.join(map(str, query_embedding))}]'::vector"
 
+        timestamp_column_name = "last_updated_timestamp"
+        if scoring_profile is not None:
+            profile = resolve_profile(scoring_profile)
+            similarity_weight = profile["similarity_weight"]
+            importance_weight = profile["importance_weight"]
+            recency_weight = profile["recency_weight"]
+            recency_days = profile["recency_days"]
+            timestamp_column_name = profile["timestamp_column"]
+
         where_clauses = ["user_id = :user_id"]
         params = {"user_id": user_id, "top_k": top_k, "recency_days": recency_days}
 
@@ -98,15 +215,34 @@ async def retrieve_similar_importance_recent_messages(
                 where_clauses.append(f"{column} = :{column}")
                 params[column] = value
 
+        if max_age_days:
+            # now() is stable, so the partitions outside the window are pruned when the query starts.
+            where_clauses.append(f"{created_column_name} >= now() - make_interval(days => :max_age_days)")
+            params["max_age_days"] = max_age_days
+
         where_clause = " AND ".join(where_clauses)
 
+        if scoring_profile is not None and settings.RETRIEVAL_RERANK_IN_NUMPY:
+            return await _retrieve_and_rerank(
+                db, table_name, embedding_column_name, embedding_str, return_column_names,
+                timestamp_column_name, where_clause, params, profile, top_k,
+            )
+
+        diversify = scoring_profile is not None and profile.get("mmr_lambda") is not None
+        select_list = ', '.join(return_column_names)
+        if diversify:
+            # MMR needs the embeddings of a wider pool than the top_k it returns.
+            select_list += f", {embedding_column_name} AS _embedding"
+            where_clause += f" AND {embedding_column_name} IS NOT NULL"
+            params["top_k"] = max(settings.RETRIEVAL_CANDIDATES, top_k)
+
         sql_query = text(
             f"""
             SELECT 
-                {', '.join(return_column_names)},
+                {select_list},
                 {similarity_weight} * (1 - ({embedding_column_name} <-> {embedding_str})) + 
                 {importance_weight} * (importance_score / 10) +
-                {recency_weight} * EXP(-EXTRACT(EPOCH FROM (NOW() - last_updated_timestamp)) / (86400 * :recency_days))
+                {recency_weight} * EXP(-EXTRACT(EPOCH FROM (NOW() - {timestamp_column_name})) / (86400 * :recency_days))
                 AS combined_score
             FROM {table_name}
             WHERE {where_clause}
@@ -114,11 +250,95 @@ async def retrieve_similar_importance_recent_messages(
             LIMIT :top_k;
         """
         )
+        if diversify:
+            sql_query = sql_query.columns(_embedding=Vector(384))
 
-        results = await db.execute(sql_query, params)
+        with span("vector_search"):
+            results = await db.execute(sql_query, params)
         all_results = results.fetchall()
+        if diversify:
+            return _diversify(all_results, return_column_names, profile, top_k)
         return [dict(row._mapping) for row in all_results]
 
     except Exception as e:
         print(f"An error occurred: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+async def _retrieve_and_rerank(
+    db: AsyncSession,
+    table_name: str,
+    embedding_column_name: str,
+    embedding_str: str,
+    return_column_names: List[str],
+    timestamp_column_name: str,
+    where_clause: str,
+    params: Dict[str, Any],
+    profile: dict,
+    top_k: int,
+):
+    """
+    The NumPy path of retrieve_similar_importance_recent_messages: the nearest
+    candidates by distance alone (which the vector index serves), re-ranked
+    with the profile's combined score.
+    """
+    candidates = max(settings.RETRIEVAL_CANDIDATES, top_k)
+    with_embeddings = profile.get("mmr_lambda") is not None
+    select_list = (
+        f"{', '.join(return_column_names)}, importance_score AS _importance, "
+        f"EXTRACT(EPOCH FROM (NOW() - {timestamp_column_name})) AS _age_seconds"
+    )
+    if with_embeddings:
+        select_list += f", {embedding_column_name} AS _embedding"
+    sql_query = text(nearest_rows_sql(
+        select_list, table_name, embedding_column_name, embedding_str,
+        where_clause=f"{where_clause} AND {embedding_column_name} IS NOT NULL",
+        limit=":candidates",
+    ))
+    if with_embeddings:
+        sql_query = sql_query.columns(_embedding=Vector(384))
+    params = {key: value for key, value in params.items() if key not in ("top_k", "recency_days")}
+    params["candidates"] = candidates
+
+    with span("vector_search"):
+        await configure_hnsw_scan(db, candidates, filtered=True)
+        rows = (await db.execute(sql_query, params)).fetchall()
+    if not rows:
+        return []
+
+    with span("rerank"):
+        distances = np.array([row._distance for row in rows], dtype=np.float64)
+        importance = np.array([np.nan if row._importance is None else row._importance for row in rows], dtype=np.float64)
+        age_seconds = np.array([row._age_seconds or 0.0 for row in rows], dtype=np.float64)
+        embeddings = np.stack([row._embedding for row in rows]) if with_embeddings else None
+        ranked = rerank(distances, importance, age_seconds, profile, top_k, embeddings)
+
+    results = []
+    for index, score in ranked:
+        row = rows[index]._mapping
+        result = {column: row[column] for column in return_column_names}
+        result["combined_score"] = score
+        results.append(result)
+    return results
+
+
+def _diversify(rows, return_column_names: List[str], profile: dict, top_k: int):
+    """
+    MMR selection of `top_k` of the rows scored in SQL, which carry their
+    combined_score and _embedding. A NULL score (no importance_score yet)
+    counts as 0.
+    """
+    if not rows:
+        return []
+    with span("rerank"):
+        relevance = np.array([row.combined_score or 0.0 for row in rows], dtype=np.float64)
+        embeddings = np.stack([row._embedding for row in rows])
+        order = mmr_select(embeddings, relevance, top_k, profile["mmr_lambda"], profile.get("duplicate_similarity"))
+
+    results = []
+    for index in order:
+        row = rows[index]._mapping
+        result = {column: row[column] for column in return_column_names}
+        result["combined_score"] = row["combined_score"]
+        results.append(result)
+    return results
@@ -1,6 +1,7 @@
 # app/services/database_services/importance_database_services.py
 import logging
 import re
+from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -8,9 +9,12 @@ from app.models.llm_models import ChatRequest
 from app.services.database.embedding_database_services import retrieve_similar_messages
 from app.services.llm.llm_utils import _llm_query_helper
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# importance_score columns hold ratings from 1 (mundane) to 10 (extremely important): the scale of the
+# LLM rating and of the importance_sample_messages labels. Retrieval divides them by 10.
+IMPORTANCE_SCALE = 10
+
 
 def extract_first_rating(llm_response):
     """Extracts the first number between 1 and 10 from a string."""
@@ -24,12 +28,56 @@ def extract_first_rating(llm_response):
             rating = int(match.group(1))
             return rating
         except ValueError:
-            logger.warning(f"Could not convert LLM response to integer: {llm_response}")
+            logger.warning("Could not convert LLM response to integer: %s", llm_response)
             return None
-    logger.warning(f"No rating found in LLM response: {llm_response}")
+    logger.warning("No rating found in LLM response: %s", llm_response)
     return None
 
 
+def score_similar_messages(similar_messages, similarity_threshold: float = 0.6) -> Optional[int]:
+    """
+    Combines the importance samples most similar to a message into one score,
+    scaled to the 1-10 range of the importance_score columns. Returns None if
+    none of them reach `similarity_threshold`.
+    """
+    scores_above_threshold = []
+    for message_data in similar_messages:
+        similarity_score = message_data["similarity_score"]
+        original_importance = message_data["importance_score"]
+
+        if similarity_score >= similarity_threshold:
+            individual_score = (
+                0.7 * similarity_score + 0.3 * original_importance / 100
+            )
+            scores_above_threshold.append(individual_score)
+
+    if not scores_above_threshold:
+        return None
+    # Nominally between 0 and 1, but clamped: similarity_score is an L2 distance, which can exceed 1.
+    combined = sum(scores_above_threshold) / len(scores_above_threshold)
+    return min(max(round(combined * IMPORTANCE_SCALE), 1), IMPORTANCE_SCALE)
+
+
+async def rate_importance_with_llm(user_message: str):
+    """Asks the LLM for a 1-10 importance rating, for messages unlike any importance sample."""
+    prompt = f"""On the scale of 1 to 10, where 1 is purely mundane and 10 is extremely important, rate these messages. Output ONLY the numerical rating.
+
+            Message: I'm feeling good today.
+            Rating: 1
+
+            Message: I'm in immediate danger.
+            Rating: 10
+
+            Message: I think I might need to go to the hospital.
+            Rating: 8
+
+            Message: {user_message}
+            Rating:"""
+
+    llm_response = await _llm_query_helper(prompt, model="gemini-2.0-flash-lite")
+    return extract_first_rating(llm_response)
+
+
 async def calculate_overall_importance(
     db: AsyncSession,
     user_message: str,
@@ -48,8 +96,8 @@ async def calculate_overall_importance(
         placeholder_value: The value to return if no messages meet the threshold.
 
     Returns:
-        A single float representing the calculated overall importance score,
-        or the placeholder_value if no sufficiently similar messages are found.
+        The importance score, from 1 to 10, from the similar samples or else
+        from the LLM, or the placeholder_value if scoring fails.
     """
     try:
         similar_messages = await retrieve_similar_messages(
@@ -61,43 +109,17 @@ async def calculate_overall_importance(
             top_k=top_k,
         )
 
+        overall_score = score_similar_messages(similar_messages, similarity_threshold)
 
-        scores_above_threshold = []
-        for message_data in similar_messages:
-            similarity_score = message_data["similarity_score"]
-            original_importance = message_data["importance_score"]
-
-            if similarity_score >= similarity_threshold:
-                individual_score = (
-                    0.7 * similarity_score + 0.3 * original_importance / 100
-                )
-                scores_above_threshold.append(individual_score)
-
-        if not scores_above_threshold:
-            logger.info(f"No messages above similarity threshold for: '{user_message}'.  Using LLM fallback.")
-            prompt = f"""On the scale of 1 to 10, where 1 is purely mundane and 10 is extremely important, rate these messages. Output ONLY the numerical rating.
-
-            Message: I'm feeling good today.
-            Rating: 1
-
-            Message: I'm in immediate danger.
-            Rating: 10
-
-            Message: I think I might need to go to the hospital.
-            Rating: 8
-
-            Message: {user_message}
-            Rating:"""
-
-            llm_response = await _llm_query_helper(prompt, model="gemini-2.0-flash-lite")
-            llm_rating = extract_first_rating(llm_response)
-            logger.info(f"LLM-based importance rating for '{user_message}': {llm_rating}")
+        if overall_score is None:
+            logger.info("No messages above similarity threshold for: '%s'.  Using LLM fallback.", user_message)
+            llm_rating = await rate_importance_with_llm(user_message)
+            logger.info("LLM-based importance rating for '%s': %s", user_message, llm_rating)
             return llm_rating
 
-        overall_score = sum(scores_above_threshold) / len(scores_above_threshold)
-        logger.info(f"Calculated overall importance score for '{user_message}': {overall_score}")
+        logger.info("Calculated overall importance score for '%s': %s", user_message, overall_score)
         return overall_score
 
     except Exception as e:
-        logger.error(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
         return placeholder_value
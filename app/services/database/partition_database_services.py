@@ -0,0 +1,59 @@
+# app/services/database/partition_database_services.py
+import asyncio
+import logging
+
+from prometheus_client import Counter
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.data.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_PARTITION_RUNS = Counter(
+    "app_message_partition_runs_total",
+    "Runs of create_counsellor_message_partitions, by result (ok, failed).",
+    ["result"],
+)
+MESSAGE_PARTITIONS_CREATED = Counter(
+    "app_message_partitions_created_total",
+    "counsellor_message_history partitions created by this worker.",
+)
+
+
+async def ensure_message_partitions(months_ahead: int = None) -> int:
+    """
+    Creates any missing monthly partitions of counsellor_message_history from
+    this month to `months_ahead` months from now, and returns how many were
+    created. Safe to call from several workers at once.
+    """
+    if months_ahead is None:
+        months_ahead = settings.MESSAGE_PARTITION_MONTHS_AHEAD
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text(
+                "SELECT create_counsellor_message_partitions("
+                "now()::timestamp, (now() + make_interval(months => :months_ahead))::timestamp)"
+            ),
+            {"months_ahead": months_ahead},
+        )
+        created = result.scalar() or 0
+        await db.commit()
+    if created:
+        logger.info("Created %s counsellor_message_history partitions", created)
+    return created
+
+
+async def maintain_message_partitions():
+    """Runs ensure_message_partitions() now and then every MESSAGE_PARTITION_CHECK_HOURS, for the life of the worker."""
+    while True:
+        try:
+            created = await ensure_message_partitions()
+        except Exception as e:
+            # Rows still land in the default partition; the next check retries.
+            MESSAGE_PARTITION_RUNS.labels("failed").inc()
+            logger.error("Creating counsellor_message_history partitions failed: %s", e, exc_info=True)
+        else:
+            MESSAGE_PARTITION_RUNS.labels("ok").inc()
+            MESSAGE_PARTITIONS_CREATED.inc(created)
+        await asyncio.sleep(settings.MESSAGE_PARTITION_CHECK_HOURS * 3600)
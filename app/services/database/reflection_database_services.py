@@ -14,6 +14,7 @@ from app.services.database.embedding_database_services import (
 from app.services.database.importance_database_services import (
     calculate_overall_importance,
 )
+from app.services.database.reranking import SCORING_PROFILES
 
 async def create_or_update_user_reflection(db: AsyncSession, user_id: int, reflection_text: str, reflection_type: str = "Counsellor", similarity_threshold: float = 0.6, top_k: int = 10, placeholder_value:float=0.0) -> UserReflection:  
     """Creates or updates a user reflection, calculating and storing importance."""
@@ -67,10 +68,13 @@ async def get_similar_importance_recent_reflections(db: AsyncSession, user_id: i
         embedding_column_name=embedding_column,
         return_column_names=return_columns,
         top_k=top_n,
-        similarity_weight=similarity_weight,
-        importance_weight=importance_weight,
-        recency_weight=recency_weight,
         additional_filters={"reflection_type": "Counsellor"},
+        scoring_profile={
+            **SCORING_PROFILES["reflections"],
+            "similarity_weight": similarity_weight,
+            "importance_weight": importance_weight,
+            "recency_weight": recency_weight,
+        },
     )
 
     return similar_reflections
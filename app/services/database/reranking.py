@@ -0,0 +1,140 @@
+# app/services/database/reranking.py
+from typing import List, Optional, Union
+
+import numpy as np
+
+from app.core.config import settings
+
+# Weights of the combined retrieval score:
+#   similarity_weight * (1 - distance)
+# + importance_weight * importance_score / importance_scale
+# + recency_weight    * exp(-age / recency_days)
+# `timestamp_column` is the column the age is measured from. With `mmr_lambda` set, the
+# top results are picked by maximal marginal relevance instead of by score alone, and
+# candidates at least `duplicate_similarity` cosine-similar to a picked one are dropped
+# (see mmr_select).
+SCORING_PROFILES = {
+    "counsellor": {
+        "similarity_weight": 0.3,
+        "importance_weight": 0.5,
+        "recency_weight": 0.2,
+        "importance_scale": 10.0,
+        "recency_days": 90,
+        "timestamp_column": "last_updated_timestamp",
+        "mmr_lambda": settings.COUNSELLOR_MMR_LAMBDA,
+        "duplicate_similarity": settings.COUNSELLOR_DUPLICATE_SIMILARITY,
+    },
+    "private_session": {
+        "similarity_weight": 0.3,
+        "importance_weight": 0.5,
+        "recency_weight": 0.2,
+        "importance_scale": 10.0,
+        "recency_days": 90,
+        "timestamp_column": "last_updated_timestamp",
+        "mmr_lambda": settings.COUNSELLOR_MMR_LAMBDA,
+        "duplicate_similarity": settings.COUNSELLOR_DUPLICATE_SIMILARITY,
+    },
+    "reflections": {
+        "similarity_weight": 0.4,
+        "importance_weight": 0.4,
+        "recency_weight": 0.2,
+        "importance_scale": 10.0,
+        "recency_days": 90,
+        "timestamp_column": "updated_at",
+        "mmr_lambda": None,
+        "duplicate_similarity": None,
+    },
+}
+
+
+def resolve_profile(profile: Union[str, dict]) -> dict:
+    """A profile by name, or a dict of overrides on top of the "counsellor" profile."""
+    if isinstance(profile, str):
+        return SCORING_PROFILES[profile]
+    return {**SCORING_PROFILES["counsellor"], **profile}
+
+
+def combined_scores(distances, importance, age_seconds, profile: dict) -> np.ndarray:
+    """
+    The combined score of every candidate at once. Missing importance scores
+    count as 0 (in SQL they made the whole score NULL).
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    importance = np.nan_to_num(np.asarray(importance, dtype=np.float64))
+    age_days = np.asarray(age_seconds, dtype=np.float64) / 86400.0
+    return (
+        profile["similarity_weight"] * (1.0 - distances)
+        + profile["importance_weight"] * importance / profile["importance_scale"]
+        + profile["recency_weight"] * np.exp(-age_days / profile["recency_days"])
+    )
+
+
+def mmr_select(
+    embeddings: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    mmr_lambda: float = 0.7,
+    duplicate_similarity: Optional[float] = None,
+) -> List[int]:
+    """
+    Greedy maximal marginal relevance: picks up to `k` indices, each maximising
+    mmr_lambda * relevance - (1 - mmr_lambda) * (highest cosine similarity to
+    an already picked candidate). Embeddings are expected L2-normalised.
+
+    Candidates whose similarity to a picked one reaches `duplicate_similarity`
+    are dropped outright as near-duplicates, so fewer than `k` may be returned.
+
+    Only the similarities to picked candidates are needed, so each pick costs
+    one matrix-vector product over the candidates (O(k * n * d) in all)
+    rather than building the full n x n similarity matrix.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    relevance = np.asarray(relevance, dtype=np.float64)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    selected: List[int] = []
+    available = np.ones(n, dtype=bool)
+    max_similarity = np.full(n, -np.inf)
+    for _ in range(min(k, n)):
+        if selected:
+            scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, embeddings @ embeddings[best], out=max_similarity)
+        if duplicate_similarity is not None:
+            available &= max_similarity < duplicate_similarity
+        if not available.any():
+            break
+    return selected
+
+
+def rerank(
+    distances,
+    importance,
+    age_seconds,
+    profile: Union[str, dict],
+    top_k: int,
+    embeddings: Optional[np.ndarray] = None,
+) -> List[tuple]:
+    """
+    Orders candidates for a profile and returns [(index, combined score)] of
+    the top `top_k`, by score or, if the profile sets mmr_lambda and
+    embeddings are given, by maximal marginal relevance.
+    """
+    profile = resolve_profile(profile)
+    scores = combined_scores(distances, importance, age_seconds, profile)
+    if profile.get("mmr_lambda") is not None and embeddings is not None and len(scores):
+        order = mmr_select(embeddings, scores, top_k, profile["mmr_lambda"], profile.get("duplicate_similarity"))
+    else:
+        # argpartition first, so only the top_k are fully sorted.
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        order = top[np.argsort(-scores[top], kind="stable")].tolist()
+    return [(index, float(scores[index])) for index in order]
@@ -1,66 +1,132 @@
 # app/services/database/tarot_database_services.py
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.data.database import get_db
-
+from app.core.config import settings
 from app.models.database_models.tarot_reading_history import TarotReadingHistory
-from app.models.tarot_models import TarotAnalysisRequest
+from app.services.database.batch_writer import BatchWriter
+
+# New readings are inserted in batches, across requests; see save_tarot_reading.
+tarot_history_writer = BatchWriter(
+    TarotReadingHistory,
+    max_rows=settings.TAROT_HISTORY_BATCH_ROWS,
+    flush_ms=settings.TAROT_HISTORY_FLUSH_MS,
+)
+
+# Length of the user_context preview included in history summaries.
+CONTEXT_PREVIEW_LENGTH = 120
+
+# Columns of a history summary. The interpretation is left out; it is fetched per reading.
+_SUMMARY_COLUMNS = (
+    TarotReadingHistory.id,
+    TarotReadingHistory.reading_date,
+    TarotReadingHistory.spread,
+    TarotReadingHistory.cards_drawn,
+    func.left(TarotReadingHistory.user_context, CONTEXT_PREVIEW_LENGTH).label("user_context_preview"),
+)
+
+
+def encode_cursor(reading_date: datetime, reading_id: int) -> str:
+    """Opaque cursor for the position just after (reading_date, id) in newest-first order."""
+    raw = f"{reading_date.isoformat()}|{reading_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
-from app.services.auth_services import get_current_user_from_cookie
-from app.services.tarot_services import analyze_tarot_logic
 
-router = APIRouter()
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        reading_date, _, reading_id = raw.rpartition("|")
+        return datetime.fromisoformat(reading_date), int(reading_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def parse_cards(cards_drawn: Optional[str]) -> list:
+    """cards_drawn is stored as a JSON string; older rows may hold plain text."""
+    if not cards_drawn:
+        return []
+    try:
+        cards = json.loads(cards_drawn)
+    except ValueError:
+        return [cards_drawn]
+    return cards if isinstance(cards, list) else [cards]
+
 
-@router.post("/analyze")
-async def analyze_tarot(
-    request: TarotAnalysisRequest,
-    user: str | None = Depends(get_current_user_from_cookie),
-    db: AsyncSession = Depends(get_db)
-):
+async def get_tarot_reading_page(
+    db: AsyncSession, user_id: int, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
     """
-    Analyze the tarot draw results in the context of the user's query.
+    Returns one page of a user's reading summaries, newest first, and the cursor
+    of the next page (None on the last page).
+
+    Pages are keyset-paginated on (reading_date, id), which the
+    (user_id, reading_date, id) index serves directly, so a page costs the same
+    however deep into the history it is. Readings without a reading_date are
+    not listed.
     """
-    try:
-        print(request)
-        return StreamingResponse(analyze_tarot_logic(request, db=db, user=user), media_type="text/event-stream")
-
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Internal Server Error")
-
-@router.get("/history")
-async def get_tarot_history(user_id: str = Depends(get_current_user_from_cookie), db: AsyncSession = Depends(get_db)):
-    """Fetch a user's tarot reading history."""
-    result = await db.execute(select(TarotReadingHistory).where(TarotReadingHistory.user_id == user_id).order_by(TarotReadingHistory.date.desc()))
-    readings = result.scalars().all()
-
-    return [
+    query = (
+        select(*_SUMMARY_COLUMNS)
+        .where(TarotReadingHistory.user_id == user_id, TarotReadingHistory.reading_date.isnot(None))
+        .order_by(TarotReadingHistory.reading_date.desc(), TarotReadingHistory.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        reading_date, reading_id = decode_cursor(cursor)
+        # A row comparison, which Postgres turns into a single index range condition.
+        query = query.where(tuple_(TarotReadingHistory.reading_date, TarotReadingHistory.id) < tuple_(reading_date, reading_id))
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].reading_date, rows[-1].id)
+
+    summaries = [
         {
-            "id": reading.id,
-            "date": reading.date.strftime("%Y-%m-%d %H:%M"),
-            "spread": reading.spread,
-            "cards": reading.cards,
-            "user_context": reading.user_context,
-            "analysis": reading.analysis
+            "id": row.id,
+            "date": row.reading_date,
+            "spread": row.spread,
+            "cards": parse_cards(row.cards_drawn),
+            "user_context_preview": row.user_context_preview,
         }
-        for reading in readings
+        for row in rows
     ]
+    return summaries, next_cursor
+
+
+async def get_tarot_reading(db: AsyncSession, user_id: int, reading_id: int) -> Optional[TarotReadingHistory]:
+    result = await db.execute(
+        select(TarotReadingHistory).where(TarotReadingHistory.id == reading_id, TarotReadingHistory.user_id == user_id)
+    )
+    return result.scalars().first()
 
-@router.delete("/history/{reading_id}")
-async def delete_tarot_reading(reading_id: int, user_id: str = Depends(get_current_user_from_cookie), db: AsyncSession = Depends(get_db)):
-    """Delete a specific tarot reading."""
-    result = await db.execute(select(TarotReadingHistory).where(TarotReadingHistory.id == reading_id, TarotReadingHistory.user_id == user_id))
-    reading = result.scalars().first()
-
-    if not reading:
-        raise HTTPException(status_code=404, detail="Reading not found")
-    await db.delete(reading)
-    await db.commit()
-    
-    return {"message": "Reading deleted successfully"}
\ No newline at end of file
+
+def compute_etag(payload) -> str:
+    """Strong ETag for a JSON-serialisable payload."""
+    body = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+async def save_tarot_reading(user_id: int, spread: str, cards: list, user_context: str, interpretation: str, wait: bool = True):
+    """
+    Queues a reading for the tarot history batch writer. With `wait`, returns
+    the new reading's id once it is committed; otherwise returns at once and
+    failures are only logged.
+    """
+    written = tarot_history_writer.submit({
+        "user_id": user_id,
+        "reading_date": datetime.utcnow(),
+        "cards_drawn": json.dumps(cards),
+        "interpretation": interpretation,
+        "spread": spread,
+        "user_context": user_context,
+    })
+    return await written if wait else None
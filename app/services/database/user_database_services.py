@@ -16,6 +16,7 @@ from app.services.database.embedding_database_services import (
 from app.services.database.importance_database_services import (
     calculate_overall_importance,
 )
+from app.services.database.reranking import SCORING_PROFILES
 
 async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
     result = await db.execute(select(User).filter(User.id == user_id))
@@ -169,10 +170,13 @@ async def get_similar_importance_recent_reflections(db: AsyncSession, user_id: i
         embedding_column_name=embedding_column,
         return_column_names=return_columns,
         top_k=top_n,
-        similarity_weight=similarity_weight,
-        importance_weight=importance_weight,
-        recency_weight=recency_weight,
         additional_filters={"reflection_type": "Counsellor"},
+        scoring_profile={
+            **SCORING_PROFILES["reflections"],
+            "similarity_weight": similarity_weight,
+            "importance_weight": importance_weight,
+            "recency_weight": recency_weight,
+        },
     )
 
     return similar_reflections
@@ -0,0 +1,141 @@
+# app/services/llm/chat_summary.py
+import asyncio
+import logging
+from typing import List
+
+from app.core.config import settings
+from app.core.sessions import chat_sessions
+from app.core.startup import get_llm_client
+from app.core.tracing import span
+from app.services.llm.llm_utils import GEMINI_MODELS, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of our conversation so far:\n"
+SUMMARY_ACKNOWLEDGEMENT = "Understood. I will continue the conversation with this in mind."
+
+
+def _content_text(content) -> str:
+    return "".join(part.text or "" for part in (content.parts or []))
+
+
+def _split_turns(history: list) -> List[list]:
+    """Groups a chat history into turns: a user Content followed by the model Contents answering it."""
+    turns = []
+    for content in history:
+        if content.role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _turns_to_text(turns: List[list]) -> str:
+    lines = []
+    for turn in turns:
+        user_text = _content_text(turn[0])
+        model_text = "".join(_content_text(content) for content in turn[1:])
+        lines.append(f"User: {user_text}\nAssistant: {model_text}")
+    return "\n\n".join(lines)
+
+
+def history_tokens(chat_session) -> int:
+    """Estimated number of tokens the chat history adds to every request sent through `chat_session`."""
+    return sum(estimate_tokens(_content_text(content)) for content in chat_session.get_history(curated=True))
+
+
+def record_turn(session_id: str):
+    """
+    Updates the turn and token counts of a session after a message has been
+    answered, applies a summary that finished while the turn was streaming, and
+    starts a background summarisation once the history passes
+    CHAT_SUMMARY_TRIGGER_TOKENS.
+    """
+    session_data = chat_sessions.get(session_id)
+    if session_data is None:
+        return
+
+    session_data["turns"] = session_data.get("turns", 0) + 1
+    session_data["history_tokens"] = history_tokens(session_data["chat_session"])
+    _apply_pending_summary(session_data)
+
+    if session_data["history_tokens"] > settings.CHAT_SUMMARY_TRIGGER_TOKENS and session_data.get("summary_task") is None:
+        session_data["summary_task"] = asyncio.create_task(summarise_session(session_id))
+
+
+async def _generate_summary(conversation: str) -> str:
+    model = settings.CHAT_SUMMARY_MODEL
+    client = get_llm_client(GEMINI_MODELS[model]["type"])
+    prompt = f"""Summarise the following conversation between a user and an AI assistant so that the assistant can continue it without the full transcript.
+Keep the user's situation, feelings, goals and any facts, names or decisions mentioned, and what the assistant has already suggested. Write in the language of the conversation, in at most {settings.CHAT_SUMMARY_MAX_TOKENS} tokens.
+
+Conversation:
+{conversation}
+
+Summary:"""
+    response = await client.aio.models.generate_content(model=model, contents=prompt)
+    return response.text or ""
+
+
+async def summarise_session(session_id: str):
+    """
+    Compresses all but the last CHAT_SUMMARY_KEEP_TURNS turns of a session into
+    a summary. An earlier summary is part of the compressed turns, so summaries
+    roll forward instead of piling up.
+    """
+    session_data = chat_sessions.get(session_id)
+    if session_data is None:
+        return
+
+    try:
+        turns = _split_turns(session_data["chat_session"].get_history(curated=True))
+        older = turns[:-settings.CHAT_SUMMARY_KEEP_TURNS] if settings.CHAT_SUMMARY_KEEP_TURNS > 0 else turns
+        if not older:
+            return
+
+        with span("summarization"):
+            summary = await _generate_summary(_turns_to_text(older))
+        if not summary:
+            logger.warning("Summarisation of session %s returned no text", session_id)
+            return
+
+        session_data["pending_summary"] = (summary, sum(len(turn) for turn in older))
+        _apply_pending_summary(session_data)
+    except Exception as e:
+        logger.warning("Summarising session %s failed: %s", session_id, e)
+    finally:
+        session_data["summary_task"] = None
+
+
+def _apply_pending_summary(session_data: dict):
+    """
+    Rebuilds the chat session with the pending summary in place of the turns it
+    covers. Skipped while a message is streaming, since the old chat object
+    records that turn when the stream ends; record_turn() retries afterwards.
+    """
+    pending = session_data.get("pending_summary")
+    if pending is None or session_data.get("streaming", 0) > 0:
+        return
+
+    from google.genai import types
+
+    summary, summarised_count = pending
+    chat_session = session_data["chat_session"]
+    # Turns completed while the summary was being generated are kept verbatim.
+    recent = chat_session.get_history(curated=True)[summarised_count:]
+    history = [
+        types.Content(role="user", parts=[types.Part(text=SUMMARY_PREFIX + summary)]),
+        types.Content(role="model", parts=[types.Part(text=SUMMARY_ACKNOWLEDGEMENT)]),
+        *recent,
+    ]
+
+    client = get_llm_client(GEMINI_MODELS[session_data["model"]]["type"])
+    session_data["chat_session"] = client.aio.chats.create(model=session_data["model"], config=session_data.get("config"), history=history)
+    session_data["pending_summary"] = None
+
+    previous_tokens = session_data.get("history_tokens", 0)
+    session_data["history_tokens"] = history_tokens(session_data["chat_session"])
+    session_data["summaries"] = session_data.get("summaries", 0) + 1
+    logger.debug(
+        "Session history compressed from ~%s to ~%s tokens (%s turns kept)",
+        previous_tokens, session_data["history_tokens"], len(_split_turns(recent)),
+    )
@@ -0,0 +1,150 @@
+# app/services/llm/context_cache.py
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import Counter
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_CACHE_LOOKUPS = Counter(
+    "app_llm_context_cache_lookups_total",
+    "Context cache lookups for system instructions, by result (hit, created, skipped, failed).",
+    ["result"],
+)
+
+# Handles are dropped locally this long before the provider expires them, so a request never uses an expiring cache.
+EXPIRY_MARGIN_SECONDS = 60
+
+
+def _default_client_factory(model: str):
+    from app.core.startup import get_llm_client
+    from app.services.llm.llm_utils import GEMINI_MODELS
+
+    return get_llm_client(GEMINI_MODELS[model]["type"])
+
+
+class ContextCache:
+    """
+    Registers stable system instructions (per-language tarot, bagua and counsellor
+    instructions, and per-user plans) with the provider's cached-content API and
+    reuses the returned handles until their TTL expires.
+
+    Instructions below the provider's minimum cacheable size, and instructions
+    whose cache could not be created, are sent inline as before. Failures are
+    remembered for CONTEXT_CACHE_FAILURE_TTL_SECONDS so they are not retried on
+    every request.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[str], object] = _default_client_factory,
+        ttl_seconds: Optional[int] = None,
+        min_tokens: Optional[int] = None,
+        failure_ttl_seconds: Optional[int] = None,
+    ):
+        self.client_factory = client_factory
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.CONTEXT_CACHE_TTL_SECONDS
+        self.min_tokens = min_tokens if min_tokens is not None else settings.CONTEXT_CACHE_MIN_TOKENS
+        self.failure_ttl_seconds = failure_ttl_seconds if failure_ttl_seconds is not None else settings.CONTEXT_CACHE_FAILURE_TTL_SECONDS
+        self._handles: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._failures: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    @staticmethod
+    def _key(model: str, system_instruction: str) -> Tuple[str, str]:
+        return model, hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+
+    def _prune(self, now: float):
+        for key in [key for key, (_, expires_at) in self._handles.items() if expires_at <= now]:
+            del self._handles[key]
+            self._locks.pop(key, None)
+        for key in [key for key, retry_at in self._failures.items() if retry_at <= now]:
+            del self._failures[key]
+
+    async def get(self, model: str, system_instruction: Optional[str]) -> Optional[str]:
+        """
+        Returns the cached-content name for `system_instruction` on `model`, creating
+        it if needed, or None if the instruction should be sent inline.
+        """
+        from app.services.llm.llm_utils import estimate_tokens
+
+        if not settings.CONTEXT_CACHE_ENABLED or not model or not system_instruction:
+            return None
+        if estimate_tokens(system_instruction) < self.min_tokens:
+            CONTEXT_CACHE_LOOKUPS.labels("skipped").inc()
+            return None
+
+        key = self._key(model, system_instruction)
+        handle = self._valid_handle(key)
+        if handle:
+            CONTEXT_CACHE_LOOKUPS.labels("hit").inc()
+            return handle
+        if self._failures.get(key, 0) > time.monotonic():
+            CONTEXT_CACHE_LOOKUPS.labels("skipped").inc()
+            return None
+
+        # One creation per instruction, however many requests arrive while it is in flight.
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            handle = self._valid_handle(key)
+            if handle:
+                CONTEXT_CACHE_LOOKUPS.labels("hit").inc()
+                return handle
+            return await self._create(key, model, system_instruction)
+
+    def _valid_handle(self, key: Tuple[str, str]) -> Optional[str]:
+        entry = self._handles.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    async def _create(self, key: Tuple[str, str], model: str, system_instruction: str) -> Optional[str]:
+        from google.genai import types
+
+        try:
+            client = self.client_factory(model)
+            cached = await client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    ttl=f"{self.ttl_seconds}s",
+                    display_name=f"system-instruction-{key[1][:16]}",
+                ),
+            )
+        except Exception as e:
+            # Typically the instruction is below the model's minimum token count, or the model does not support caching.
+            self._failures[key] = time.monotonic() + self.failure_ttl_seconds
+            CONTEXT_CACHE_LOOKUPS.labels("failed").inc()
+            logger.info("Context cache creation failed for model %s, sending the instruction inline: %s", model, e)
+            return None
+
+        now = time.monotonic()
+        self._prune(now)
+        self._handles[key] = (cached.name, now + max(self.ttl_seconds - EXPIRY_MARGIN_SECONDS, 0))
+        CONTEXT_CACHE_LOOKUPS.labels("created").inc()
+        logger.debug("Created context cache %s for model %s", cached.name, model)
+        return cached.name
+
+    def invalidate(self, model: str, system_instruction: str):
+        """Forgets the handle for an instruction, e.g. after the provider rejected it as expired."""
+        self._handles.pop(self._key(model, system_instruction), None)
+
+
+context_cache = ContextCache()
+
+
+async def build_generation_config(model: str, system_instruction: Optional[str]):
+    """
+    The GenerateContentConfig for a request: references the cached system
+    instruction if there is one, otherwise carries it inline.
+    """
+    from google.genai import types
+
+    cached_content = await context_cache.get(model, system_instruction)
+    if cached_content:
+        return types.GenerateContentConfig(cached_content=cached_content)
+    return types.GenerateContentConfig(system_instruction=system_instruction)
@@ -1,18 +1,17 @@
 # app/services/llm/llm_service.py
 import logging
 from datetime import datetime
-from typing import AsyncGenerator
-
-from google import genai
-from google.genai import types
+from typing import TYPE_CHECKING, AsyncGenerator
 
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.logging_config import log_payload
 from app.core.sessions import chat_sessions
-from app.core.startup import llm_clients
+from app.core.startup import get_llm_client
 
 from app.models.llm_models import ChatRequest, PlanRequest, ReflectionRequest
+from app.services.llm.chat_summary import record_turn
 from app.services.database.user_database_services import (
     create_user_plan,
     create_or_update_user_reflection,
@@ -26,7 +25,9 @@ from app.services.llm.llm_utils import (
     query_genai_api,
 )
 
-logging.basicConfig(level=logging.DEBUG)
+if TYPE_CHECKING:
+    from google import genai
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,7 +43,7 @@ async def chat_logic(request: ChatRequest, db: AsyncSession, redis_client: Redis
     if request.model:
         if request.model in GEMINI_MODELS:
             try:
-                async for chunk in _query_with_session(request, user_id, db):
+                async for chunk in _query_with_session(request, db, redis_client, user_id):
                     yield chunk
                 return
             except Exception as e:
@@ -80,14 +81,20 @@ async def _query_with_session(request: ChatRequest, db: AsyncSession, redis_clie
             chat_session = session_data["chat_session"]
             if datetime.now() - session_data["last_used"] > SESSION_EXPIRY_TIME:
                 await close_session(request.session_id, db, redis_client)
-                chat_session = await start_new_chat_session(request, llm_clients[model_type], db, user_id)
+                chat_session = await start_new_chat_session(request, get_llm_client(model_type), db, user_id)
         else:
-            chat_session = await start_new_chat_session(request, llm_clients[model_type], db, user_id)
+            chat_session = await start_new_chat_session(request, get_llm_client(model_type), db, user_id)
 
-        chat_sessions[request.session_id]["last_used"] = datetime.now()
+        session_data = chat_sessions[request.session_id]
+        session_data["last_used"] = datetime.now()
 
-        async for chunk in query_genai_api(request):
-            yield chunk
+        session_data["streaming"] = session_data.get("streaming", 0) + 1
+        try:
+            async for chunk in query_genai_api(request):
+                yield chunk
+        finally:
+            session_data["streaming"] -= 1
+        record_turn(request.session_id)
 
     except Exception as e:
         print(f"Error in _query_with_session: {e}")
@@ -125,17 +132,25 @@ async def generate_plan(request: PlanRequest, db, user_id) -> str:
     return await _llm_query_helper(prompt, request.model)
 
 
-async def start_new_chat_session(request: ChatRequest, client: genai.Client, db: AsyncSession, user_id: str):
+async def start_new_chat_session(request: ChatRequest, client: "genai.Client", db: AsyncSession, user_id: str):
     """Starts a new chat session."""
+    from google.genai import types
+
     try:
-        logger.debug(f"Starting new chat session for user {user_id}, with model {request.model}")
+        logger.debug("Starting new chat session for user %s, with model %s", user_id, request.model)
         plan = await get_active_user_plan(db, user_id)
-        logger.debug(f"Plan for new chat session: {plan}")
-        chat_session = client.chats.create(model=request.model, config=types.GenerateContentConfig(system_instruction=plan))
+        log_payload(logger, "Plan for new chat session", plan)
+        config = types.GenerateContentConfig(system_instruction=plan)
+        chat_session = client.aio.chats.create(model=request.model, config=config)
         chat_sessions[request.session_id] = {
             "chat_session": chat_session,
             "last_used": datetime.now(),
-            "user_id": user_id
+            "user_id": user_id,
+            # Kept so the session can be rebuilt around a summary (see chat_summary.py).
+            "model": request.model,
+            "config": config,
+            "turns": 0,
+            "history_tokens": 0,
         }
         return chat_session
     except Exception as e:
@@ -148,7 +163,10 @@ async def close_session(session_id: str, db: AsyncSession, redis_client: Redis):
     if session_id in chat_sessions:
         session_data = chat_sessions[session_id]
         user_id = session_data['user_id']
-        logger.debug(f"Closing session {session_id} for user {user_id}")
+        logger.debug("Closing session %s for user %s", session_id, user_id)
+
+        if session_data.get("summary_task"):
+            session_data["summary_task"].cancel()
 
         cache_key = f"counsellor_history:{user_id}:{session_id}"
         history_list = await redis_client.lrange(cache_key, 0, -1)
@@ -162,18 +180,18 @@ async def close_session(session_id: str, db: AsyncSession, redis_client: Redis):
                     model="gemini-2.0-flash-lite"
                 )
                 reflection = await generate_reflection(reflection_request)
-                logger.debug(f"Generated reflection for session {session_id}")
+                logger.debug("Generated reflection for session %s", session_id)
 
                 if reflection:
                    await create_or_update_user_reflection(db, user_id, reflection)
-                   logger.debug(f"Reflection for session {session_id} saved to database.")
+                   logger.debug("Reflection for session %s saved to database.", session_id)
                 else:
-                    logger.warning(f"Reflection generation returned None for session {session_id}")
+                    logger.warning("Reflection generation returned None for session %s", session_id)
 
             except Exception as e:
-                logger.exception(f"Error generating or saving reflection for session {session_id}: {e}")
+                logger.exception("Error generating or saving reflection for session %s: %s", session_id, e)
         else:
-            logger.info(f"No conversation history found for session {session_id}, skipping reflection.")
+            logger.info("No conversation history found for session %s, skipping reflection.", session_id)
         
         recent_reflections = await get_user_reflections(db, user_id, limit=5)
         combined_reflections = "\n\n".join(
@@ -183,7 +201,7 @@ async def close_session(session_id: str, db: AsyncSession, redis_client: Redis):
         plan_request = PlanRequest(reflection=combined_reflections, model="gemini-2.0-flash-lite")  # Choose model.  Could be a user preference.
         plan_text = await generate_plan(plan_request, db, user_id)
 
-        logger.debug(f"Generated plan is: {plan_text}")
+        log_payload(logger, "Generated plan", plan_text)
 
         if not plan_text:
             return None
@@ -191,10 +209,10 @@ async def close_session(session_id: str, db: AsyncSession, redis_client: Redis):
         await create_user_plan(db, user_id, plan_text, plan_type="Session End")
 
         del chat_sessions[session_id]
-        logger.debug(f"Session {session_id} closed.")
+        logger.debug("Session %s closed.", session_id)
         return
     else:
-        logger.warning(f"Attempted to close non-existent session: {session_id}")
+        logger.warning("Attempted to close non-existent session: %s", session_id)
 
 
 async def cleanup_expired_sessions(db: AsyncSession, redis_client: Redis):
@@ -1,47 +1,106 @@
 # app/services/llm/llm_utils.py
 import asyncio
+import inspect
+import logging
+import math
+import re
 from datetime import datetime, timedelta
 from typing import AsyncGenerator, Optional
 
-from google import genai
 from google.api_core.exceptions import (
     GoogleAPIError,
     InternalServerError,
     ResourceExhausted,
     ServiceUnavailable,
 )
-from google.genai import types
 
 from app.core.sessions import chat_sessions
-from app.core.startup import llm_clients
+from app.core.tracing import LLMStreamTrace
+from app.core.startup import ONE_SHOT_MODEL, get_llm_client
 from app.models.llm_models import ChatRequest
+from app.services.llm.context_cache import build_generation_config, context_cache
 
+# prompt_budget: the most tokens an assembled prompt (excluding the system instruction) should use.
+# Well below the context windows; it bounds latency and cost rather than what the model accepts.
 GEMINI_MODELS = {
     # Vertex AI Models
-    "gemini-2.0-flash-exp": {"rpm": 10, "type": "vertex"},
+    "gemini-2.0-flash-exp": {"rpm": 10, "type": "vertex", "prompt_budget": 4000},
     # "gemini-2.5-pro-exp-03-25": {"rpm": 10, "type": "vertex"},
     # Gemini API Models
-    "gemini-2.5-pro-exp-03-25": {"rpm": 2, "type": "gemini"},
-    "gemini-1.5-pro-latest": {"rpm": 2, "type": "gemini"},
-    "gemini-1.5-flash-latest": {"rpm": 15, "type": "gemini"},
-    "gemini-1.5-flash-8b-latest": {"rpm": 15, "type": "gemini"},
-    "gemini-2.0-flash": {"rpm": 15, "type": "gemini"},
-    "gemini-2.0-flash-lite": {"rpm": 30, "type": "gemini"},
-    "gemini-2.0-pro-exp": {"rpm": 2, "type": "gemini"},
-    "gemini-2.5-pro-exp-03-25": {"rpm": 2, "type": "gemini"},
+    "gemini-2.5-pro-exp-03-25": {"rpm": 2, "type": "gemini", "prompt_budget": 8000},
+    "gemini-1.5-pro-latest": {"rpm": 2, "type": "gemini", "prompt_budget": 8000},
+    "gemini-1.5-flash-latest": {"rpm": 15, "type": "gemini", "prompt_budget": 4000},
+    "gemini-1.5-flash-8b-latest": {"rpm": 15, "type": "gemini", "prompt_budget": 3000},
+    "gemini-2.0-flash": {"rpm": 15, "type": "gemini", "prompt_budget": 4000},
+    "gemini-2.0-flash-lite": {"rpm": 30, "type": "gemini", "prompt_budget": 3000},
+    "gemini-2.0-pro-exp": {"rpm": 2, "type": "gemini", "prompt_budget": 8000},
+    "gemini-2.5-pro-exp-03-25": {"rpm": 2, "type": "gemini", "prompt_budget": 8000},
 }
 
 SESSION_EXPIRY_TIME = timedelta(hours=1)
 
+logger = logging.getLogger(__name__)
+
 last_request_times = {}
 request_counts = {}
 
-async def query_genai_api(request: ChatRequest) -> AsyncGenerator[str, None]:
+# CJK ideographs, kana, hangul and full-width forms: roughly one token per character.
+_WIDE_CHARACTERS = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+# Appended to responses that were stored although the stream was cancelled (see PERSIST_PARTIAL_RESULTS).
+PARTIAL_RESULT_SUFFIX = " …"
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Cheap local approximation of the Gemini token count of `text`: about four
+    characters per token for Latin text, one token per CJK character.
+    """
+    if not text:
+        return 0
+    wide = len(_WIDE_CHARACTERS.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+def select_model(session_id: Optional[str] = None) -> str:
+    """
+    The model chat_logic will answer with when no model is requested: the model
+    of the session's live chat, else the first model in GEMINI_MODELS (its
+    fallback order) that has not reached its rate limit.
+    """
+    session_model = chat_sessions.get(session_id, {}).get("model") if session_id else None
+    if session_model in GEMINI_MODELS:
+        return session_model
+    now = datetime.now()
+    for model, config in GEMINI_MODELS.items():
+        last_request = last_request_times.get(model)
+        if last_request is None or (now - last_request).total_seconds() >= 60 or request_counts.get(model, 0) < config["rpm"]:
+            return model
+    return next(iter(GEMINI_MODELS))
+
+async def _start_stream(open_stream, config):
+    """
+    Opens the stream with `open_stream(config)` and waits for the first chunk, so
+    errors in the request itself are raised here rather than in the middle of the stream.
+    Returns the first chunk (None for an empty stream) and the rest of the stream.
+    """
+    responses = open_stream(config)
+    # google-genai 1.4 returns an awaitable resolving to the stream; later versions return the stream itself.
+    if inspect.isawaitable(responses):
+        responses = await responses
+    try:
+        first_chunk = await anext(responses, None)
+    except BaseException:
+        await responses.aclose()
+        raise
+    return first_chunk, responses
+
+async def query_genai_api(request: ChatRequest, one_shot: bool = False) -> AsyncGenerator[str, None]:
     """
     Queries the Gemini API (or Vertex AI), handling rate limiting.
 
     Args:
         request: The ChatRequest object.
+        one_shot: Send the prompt on its own instead of through the request's chat
+            session, so nothing is added to any chat history.
     """
     now = datetime.now()
     if request.model in last_request_times:
@@ -58,14 +117,45 @@ async def query_genai_api(request: ChatRequest) -> AsyncGenerator[str, None]:
     if request.model not in last_request_times:
         last_request_times[request.model] = now
 
+    # Imported here: google.genai takes ~0.5s to import and is not needed to serve other routes.
+    from google.genai import types
+
     try:
         request_counts[request.model] += 1
         last_request_times[request.model] = now
-        responses = chat_sessions[request.session_id]["chat_session"].send_message_stream(request.prompt, config=types.GenerateContentConfig(system_instruction=request.system_instruction))
-
-        for chunk in responses:
-            await asyncio.sleep(0)
-            yield chunk.text
+        trace = LLMStreamTrace(request.model)
+        if one_shot:
+            client = get_llm_client(GEMINI_MODELS[request.model]["type"])
+            open_stream = lambda config: client.aio.models.generate_content_stream(model=request.model, contents=request.prompt, config=config)
+        else:
+            chat_session = chat_sessions[request.session_id]["chat_session"]
+            open_stream = lambda config: chat_session.send_message_stream(request.prompt, config=config)
+        config = await build_generation_config(request.model, request.system_instruction)
+        try:
+            first_chunk, responses = await _start_stream(open_stream, config)
+        except Exception as e:
+            if not config.cached_content:
+                raise
+            # The cache may have been evicted by the provider; drop the handle and send the instruction inline.
+            logger.info("Request with context cache %s failed, retrying without it: %s", config.cached_content, e)
+            context_cache.invalidate(request.model, request.system_instruction)
+            first_chunk, responses = await _start_stream(open_stream, types.GenerateContentConfig(system_instruction=request.system_instruction))
+
+        try:
+            chunk = first_chunk
+            while chunk is not None:
+                if chunk.text:
+                    trace.on_chunk(estimate_tokens(chunk.text))
+                    yield chunk.text
+                chunk = await anext(responses, None)
+            trace.finish()
+        except (asyncio.CancelledError, GeneratorExit):
+            # Cancelled by the caller (the client disconnected): stop here without yielding anything else.
+            trace.cancel()
+            raise
+        finally:
+            # Closes the upstream HTTP stream right away when the consumer stops early or is cancelled.
+            await responses.aclose()
 
     except ResourceExhausted:
         yield "Rate limit exceeded by underlying API. Please wait and try again."
@@ -80,10 +170,12 @@ async def query_genai_api(request: ChatRequest) -> AsyncGenerator[str, None]:
 
 
 async def _llm_query_helper(prompt: str, model: Optional[str] = None) -> str:
-    """Helper function to query LLMs, reusing chat_logic's model selection."""
-
-    request = ChatRequest(session_id="dummy_session", prompt=prompt, model=model)
-    response_generator = query_genai_api(request=request)
+    """
+    Helper function for one-off LLM queries (reflections, plans, importance ratings).
+    Each query is sent on its own, with no chat history, so they do not accumulate anywhere.
+    """
+    request = ChatRequest(session_id="one_shot", prompt=prompt, model=model or ONE_SHOT_MODEL)
+    response_generator = query_genai_api(request=request, one_shot=True)
 
     full_response = ""
     async for chunk in response_generator:
@@ -0,0 +1,130 @@
+# app/services/llm/prompt_budget.py
+import re
+from typing import Dict, List, Optional
+
+from app.services.llm.llm_utils import GEMINI_MODELS, estimate_tokens
+
+# Used when no model has been chosen yet: chat_logic may fall back to any model, so take the smallest budget.
+DEFAULT_PROMPT_BUDGET = min(config["prompt_budget"] for config in GEMINI_MODELS.values())
+
+# Share of the history budget reserved for recent (Redis) turns; the rest goes to retrieved (DB) turns.
+# Whatever one side does not use is handed to the other.
+RECENT_HISTORY_SHARE = 0.6
+
+# The custom prompt (the user's plan) may use at most this share of the whole budget.
+CUSTOM_PROMPT_MAX_SHARE = 0.25
+
+# A turn is truncated to fit the remaining budget only if at least this many tokens are left; otherwise it is dropped.
+MIN_TRUNCATED_TURN_TOKENS = 48
+
+TRUNCATION_MARKER = " …"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def get_prompt_budget(model: Optional[str]) -> int:
+    """Returns the prompt token budget for `model`, or the smallest budget if the model is not known yet."""
+    config = GEMINI_MODELS.get(model) if model else None
+    return config["prompt_budget"] if config else DEFAULT_PROMPT_BUDGET
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Shortens `text` so that estimate_tokens() of the result is at most `max_tokens`."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    marker_tokens = estimate_tokens(TRUNCATION_MARKER)
+    # The estimate is close to linear in length, so start proportionally and shrink until it fits.
+    length = int(len(text) * (max_tokens - marker_tokens) / estimate_tokens(text))
+    while length > 0 and estimate_tokens(text[:length]) + marker_tokens > max_tokens:
+        length = int(length * 0.9)
+    return text[:length].rstrip() + TRUNCATION_MARKER if length > 0 else ""
+
+
+def _normalise(turn: str) -> str:
+    return _WHITESPACE.sub(" ", turn).strip().lower()
+
+
+def deduplicate_turns(recent_turns: List[str], retrieved_turns: List[str]) -> List[str]:
+    """Drops retrieved (DB) turns that are already present in the recent (Redis) turns, or repeated."""
+    seen = {_normalise(turn) for turn in recent_turns}
+    unique = []
+    for turn in retrieved_turns:
+        key = _normalise(turn)
+        if key not in seen:
+            seen.add(key)
+            unique.append(turn)
+    return unique
+
+
+def _fill(turns: List[str], budget: int) -> tuple[List[str], int]:
+    """
+    Takes turns in order (most valuable first) while they fit in `budget`. The first
+    turn that does not fit is truncated if enough room is left; the rest are dropped.
+    Returns the kept turns and the tokens they use.
+    """
+    kept = []
+    used = 0
+    for turn in turns:
+        tokens = estimate_tokens(turn)
+        if used + tokens <= budget:
+            kept.append(turn)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_TRUNCATED_TURN_TOKENS:
+            truncated = truncate_to_tokens(turn, remaining)
+            kept.append(truncated)
+            used += estimate_tokens(truncated)
+        break
+    return kept, used
+
+
+def budget_counsellor_context(
+    custom_prompt: str,
+    recent_turns: List[str],
+    retrieved_turns: List[str],
+    user_message: str,
+    model: Optional[str] = None,
+    overhead: str = "",
+) -> Dict[str, object]:
+    """
+    Fits the counsellor prompt segments into the token budget of `model`.
+
+    Args:
+        custom_prompt: The user's counsellor plan text.
+        recent_turns: Turns from the Redis cache, newest first.
+        retrieved_turns: Turns retrieved from the database, highest score first.
+        user_message: The new message. Always kept in full.
+        model: The model the prompt is for; None uses the smallest budget.
+        overhead: The fixed template text around the segments, counted against the budget.
+
+    Returns:
+        A dict with the kept "custom_prompt", "recent_turns" and "retrieved_turns",
+        plus "budget" and "tokens" (the estimated total) for logging.
+    """
+    budget = get_prompt_budget(model)
+    retrieved_turns = deduplicate_turns(recent_turns, retrieved_turns)
+
+    remaining = budget - estimate_tokens(user_message) - estimate_tokens(overhead)
+    custom_prompt = truncate_to_tokens(custom_prompt, min(max(remaining, 0), int(budget * CUSTOM_PROMPT_MAX_SHARE)))
+    remaining -= estimate_tokens(custom_prompt)
+    remaining = max(remaining, 0)
+
+    recent_share = int(remaining * RECENT_HISTORY_SHARE)
+    kept_recent, recent_used = _fill(recent_turns, recent_share)
+    kept_retrieved, retrieved_used = _fill(retrieved_turns, remaining - recent_used)
+
+    # Hand budget the retrieved turns did not use back to the older recent turns.
+    if len(kept_recent) < len(recent_turns):
+        kept_recent, recent_used = _fill(recent_turns, remaining - retrieved_used)
+
+    return {
+        "custom_prompt": custom_prompt,
+        "recent_turns": kept_recent,
+        "retrieved_turns": kept_retrieved,
+        "budget": budget,
+        "tokens": budget - remaining + recent_used + retrieved_used,
+    }
@@ -0,0 +1,120 @@
+# app/services/streaming/broadcaster.py
+import asyncio
+from typing import AsyncGenerator, Callable, List, Optional, Tuple
+
+
+class Broadcaster:
+    """
+    Fans one stream of chunks out to any number of subscribers in this worker.
+
+    Every chunk published so far is kept, so a subscriber that joins late
+    receives the whole stream from the start. Each subscriber reads at its
+    own pace; a slow one never holds up the producer or the others.
+
+    `stream_id` identifies the stream in Redis (see resumable.py) and is set
+    before the first chunk is published. `offset` is the sequence number of
+    the first chunk held, for broadcasters that resume a stream part way.
+    `on_abandoned` is called when the last subscriber leaves before the end.
+    `user_id` and `route` are those of the request that started the stream;
+    only the same user on the same route may resume it.
+    """
+
+    def __init__(self, stream_id: Optional[str] = None, offset: int = 0, user_id=None, route: Optional[str] = None):
+        self.stream_id = stream_id
+        self.offset = offset
+        self.user_id = user_id
+        self.route = route
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.on_abandoned: Optional[Callable[[], None]] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event, and give later waiters a fresh one.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        if self.done:
+            raise RuntimeError("Cannot publish to a closed broadcaster")
+        self.chunks.append(chunk)
+        self._notify()
+
+    def close(self, error: Optional[BaseException] = None):
+        if self.done:
+            return
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self, start: Optional[int] = None) -> AsyncGenerator[str, None]:
+        """Yields every chunk from sequence number `start` on, until the producer closes the broadcaster."""
+        index = start - self.offset if start is not None else 0
+        if index < 0:
+            raise ValueError(f"Chunk {start} is before the first chunk held ({self.offset})")
+        self.subscribers += 1
+        try:
+            while True:
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                if self.done:
+                    return
+                await self._changed.wait()
+        finally:
+            self._unsubscribe()
+
+    async def subscribe_coalesced(
+        self,
+        start: Optional[int] = None,
+        max_delay: float = 0.02,
+        max_bytes: int = 512,
+    ) -> AsyncGenerator[Tuple[int, str], None]:
+        """
+        Like subscribe(), but joins chunks into fewer, larger writes. Yields
+        (sequence number of the last chunk joined, text).
+
+        The first chunk is sent as soon as it arrives. After that, a batch is
+        sent once it holds `max_bytes`, or `max_delay` seconds after its first
+        chunk. Chunks that piled up while the consumer was busy writing (a slow
+        client) are sent together right away, so the batch size follows the
+        client's pace.
+        """
+        index = start - self.offset if start is not None else 0
+        if index < 0:
+            raise ValueError(f"Chunk {start} is before the first chunk held ({self.offset})")
+        loop = asyncio.get_running_loop()
+        first = True
+        self.subscribers += 1
+        try:
+            while True:
+                if index >= len(self.chunks):
+                    if self.done:
+                        return
+                    await self._changed.wait()
+                    continue
+
+                if not first:
+                    deadline = loop.time() + max_delay
+                    while not self.done and sum(len(chunk.encode("utf-8")) for chunk in self.chunks[index:]) < max_bytes:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            break
+                        try:
+                            await asyncio.wait_for(self._changed.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            break
+
+                batch = self.chunks[index:]
+                index += len(batch)
+                first = False
+                yield self.offset + index - 1, "".join(batch)
+        finally:
+            self._unsubscribe()
+
+    def _unsubscribe(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done and self.on_abandoned:
+            self.on_abandoned()
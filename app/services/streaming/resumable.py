@@ -0,0 +1,363 @@
+# app/services/streaming/resumable.py
+import asyncio
+import logging
+import re
+import time
+import uuid
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.dependencies import create_redis_client
+from app.core.tracing import current_route
+from app.data.database import AsyncSessionLocal
+from app.services.streaming.broadcaster import Broadcaster
+
+logger = logging.getLogger(__name__)
+
+# Streams being produced by this worker, by stream id. Resumes in this worker subscribe to them directly.
+streams: Dict[str, Broadcaster] = {}
+_background_tasks = set()
+
+# Builds the upstream stream. Called with a database session and Redis client owned by the
+# producer, since the request that started the stream may disconnect before the stream ends.
+StreamFactory = Callable[[AsyncSession, Redis], AsyncIterator[str]]
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+def new_stream_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _buffer_key(stream_id: str) -> str:
+    return f"stream:{stream_id}"
+
+
+def _entry_id(seq: int) -> str:
+    # Explicit Redis stream ids, so that a resume can XREAD from a sequence number directly. "0-0" is reserved.
+    return f"0-{seq + 1}"
+
+
+def _relays_key(stream_id: str) -> str:
+    return f"stream:{stream_id}:relays"
+
+
+def _owner_key(stream_id: str) -> str:
+    return f"stream:{stream_id}:owner"
+
+
+def _owner(user_id, route: str) -> Dict[str, str]:
+    # Anonymous streams are owned by "": only anonymous requests can resume them.
+    return {"user": "" if user_id is None else str(user_id), "route": route}
+
+
+def spawn(coroutine) -> asyncio.Task:
+    """Runs `coroutine` detached from the request, keeping a reference so it is not garbage collected."""
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def drain(timeout: float):
+    """
+    Waits up to `timeout` seconds for this worker's producers and relays to
+    finish, then cancels the rest and waits for them to stop. Called on
+    shutdown before the batch writers close, so the results they save are
+    still accepted.
+    """
+    if not _background_tasks:
+        return
+    _, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    if pending:
+        logger.warning("Cancelling %d streams still running after %ss of shutdown", len(pending), timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def cancel_when_abandoned(broadcaster: Broadcaster, task: asyncio.Task, grace_seconds: Optional[float] = None):
+    """
+    Cancels `task` (and with it the upstream LLM call) once the broadcaster has
+    had no subscribers for `grace_seconds` (STREAM_ABANDON_GRACE_SECONDS by
+    default). The grace period leaves time for a dropped client to reconnect
+    with Last-Event-ID; streams that cannot be resumed pass 0. Relays in other
+    workers count as subscribers.
+
+    The cancellation is cooperative: CancelledError is raised at the producer's
+    current await, unwinds the service generator (which may store a partial
+    result, see PERSIST_PARTIAL_RESULTS) and closes the upstream stream.
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.STREAM_ABANDON_GRACE_SECONDS
+
+    async def check():
+        delay = grace_seconds
+        while True:
+            await asyncio.sleep(delay)
+            # While relays keep the stream alive, re-check at most once a second.
+            delay = max(grace_seconds, 1.0)
+            if broadcaster.done or broadcaster.subscribers:
+                return
+            redis_client = create_redis_client()
+            try:
+                relays = int(await redis_client.get(_relays_key(broadcaster.stream_id)) or 0) if broadcaster.stream_id else 0
+            except RedisError:
+                relays = 0
+            finally:
+                await redis_client.close()
+            if not relays:
+                logger.info("Cancelling stream %s: every client has disconnected", broadcaster.stream_id)
+                task.cancel()
+                return
+
+    broadcaster.on_abandoned = lambda: spawn(check())
+
+
+def start_stream(factory: StreamFactory, route: str, user_id, grace_seconds: Optional[float] = None) -> Broadcaster:
+    """
+    Starts producing a new resumable stream in the background and returns its
+    Broadcaster. `route` labels the producer's metrics and spans; it and
+    `user_id` are also the only route and user the stream can be resumed by.
+    """
+    broadcaster = Broadcaster(stream_id=new_stream_id(), user_id=user_id, route=route)
+
+    async def run():
+        current_route.set(route)
+        redis_client = create_redis_client()
+        try:
+            await produce(broadcaster, factory, redis_client)
+        except asyncio.CancelledError as e:
+            broadcaster.close(e)
+            raise
+        except Exception as e:
+            logger.exception("Stream %s failed: %s", broadcaster.stream_id, e)
+            broadcaster.close(e)
+        finally:
+            broadcaster.close()
+            await redis_client.close()
+
+    cancel_when_abandoned(broadcaster, spawn(run()), grace_seconds)
+    return broadcaster
+
+
+async def _append(redis_client: Redis, stream_id: str, seq: int, fields: Dict[str, str], keep_alive: Sequence[str] = ()):
+    """Appends a chunk ({"chunk": ...}) or the end marker ({"end": ...}) to the stream's Redis buffer."""
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.xadd(_buffer_key(stream_id), fields, id=_entry_id(seq))
+    pipeline.expire(_buffer_key(stream_id), settings.STREAM_BUFFER_TTL_SECONDS)
+    pipeline.expire(_owner_key(stream_id), settings.STREAM_BUFFER_TTL_SECONDS)
+    for key in keep_alive:
+        pipeline.expire(key, settings.SINGLE_FLIGHT_LOCK_TTL_SECONDS)
+    await pipeline.execute()
+
+
+async def produce(
+    broadcaster: Broadcaster,
+    factory: StreamFactory,
+    redis_client: Redis,
+    remote: bool = True,
+    keep_alive: Sequence[str] = (),
+):
+    """
+    Runs the upstream stream with its own database session, publishing every
+    chunk to `broadcaster` and, unless `remote` is False, to the stream's Redis
+    buffer. `keep_alive` keys have their TTL refreshed with every chunk.
+    """
+    stream_id = broadcaster.stream_id
+    streams[stream_id] = broadcaster
+    seq = 0
+    outcome = "complete"
+    if remote:
+        try:
+            # Written before the first chunk, so the buffer is never resumable without an owner to check.
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.hset(_owner_key(stream_id), mapping=_owner(broadcaster.user_id, broadcaster.route))
+            pipeline.expire(_owner_key(stream_id), settings.STREAM_BUFFER_TTL_SECONDS)
+            await pipeline.execute()
+        except RedisError as e:
+            logger.warning("Buffering stream %s in Redis failed: %s", stream_id, e)
+            remote = False
+    try:
+        async with AsyncSessionLocal() as db:
+            async for chunk in factory(db, redis_client):
+                broadcaster.publish(chunk)
+                if remote:
+                    try:
+                        await _append(redis_client, stream_id, seq, {"chunk": chunk}, keep_alive)
+                    except RedisError as e:
+                        # Local subscribers are unaffected; the stream just cannot be relayed or resumed elsewhere.
+                        logger.warning("Buffering stream %s in Redis failed: %s", stream_id, e)
+                        remote = False
+                seq += 1
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except Exception:
+        outcome = "failed"
+        raise
+    finally:
+        if streams.get(stream_id) is broadcaster:
+            del streams[stream_id]
+        if remote:
+            try:
+                # Relays and resumes end their streams with an error unless the outcome is "complete".
+                await _append(redis_client, stream_id, seq, {"end": outcome})
+            except RedisError as e:
+                logger.warning("Finishing stream %s in Redis failed: %s", stream_id, e)
+
+
+async def relay(broadcaster: Broadcaster, redis_client: Redis):
+    """
+    Copies a stream produced elsewhere from its Redis buffer into `broadcaster`,
+    starting at `broadcaster.offset`. Closes the broadcaster with an error if
+    nothing arrives for STREAM_IDLE_TIMEOUT_SECONDS before the end marker.
+    """
+    key = _buffer_key(broadcaster.stream_id)
+    last_id = _entry_id(broadcaster.offset - 1)
+    last_entry_at = time.monotonic()
+
+    # Registers this relay with the producer, which keeps generating while any relay is reading.
+    relays_key = _relays_key(broadcaster.stream_id)
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.incr(relays_key)
+    pipeline.expire(relays_key, settings.STREAM_BUFFER_TTL_SECONDS)
+    await pipeline.execute()
+    try:
+        while True:
+            response = await redis_client.xread({key: last_id}, count=100, block=1000)
+            if not response:
+                if time.monotonic() - last_entry_at > settings.STREAM_IDLE_TIMEOUT_SECONDS:
+                    logger.warning("Producer of stream %s went away before finishing", broadcaster.stream_id)
+                    broadcaster.close(TimeoutError(f"Stream {broadcaster.stream_id} stalled"))
+                    return
+                continue
+
+            last_entry_at = time.monotonic()
+            for entry_id, fields in response[0][1]:
+                last_id = entry_id
+                if "end" in fields:
+                    if fields["end"] != "complete":
+                        broadcaster.close(RuntimeError(f"Stream {broadcaster.stream_id} ended early: {fields['end']}"))
+                    return
+                broadcaster.publish(fields["chunk"])
+    finally:
+        try:
+            await redis_client.decr(relays_key)
+        except RedisError as e:
+            logger.warning("Unregistering relay of stream %s failed: %s", broadcaster.stream_id, e)
+
+
+def parse_last_event_id(last_event_id: str) -> Optional[Tuple[str, int]]:
+    """Splits a "{stream_id}:{seq}" event id. Returns None if it is not one of ours."""
+    stream_id, _, seq = last_event_id.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+async def resume_stream(last_event_id: str, user_id, route: str) -> Optional[Tuple[Broadcaster, int]]:
+    """
+    Returns a Broadcaster carrying the stream after `last_event_id`, and the
+    sequence number of the last chunk the client has, or None if the stream is
+    unknown, its buffer has expired, or it was started by another user or on
+    another route. The last case is reported like an unknown stream, so stream
+    ids cannot be probed. No upstream call is made.
+    """
+    parsed = parse_last_event_id(last_event_id)
+    if parsed is None:
+        return None
+    stream_id, last_seq = parsed
+    owner = _owner(user_id, route)
+
+    broadcaster = streams.get(stream_id)
+    if broadcaster is not None:
+        if _owner(broadcaster.user_id, broadcaster.route) != owner:
+            logger.warning("Refusing to resume stream %s for another user or route", stream_id)
+            return None
+        return broadcaster, last_seq
+
+    redis_client = create_redis_client()
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.exists(_buffer_key(stream_id))
+        pipeline.hgetall(_owner_key(stream_id))
+        exists, stream_owner = await pipeline.execute()
+    except RedisError as e:
+        logger.warning("Cannot resume stream %s: %s", stream_id, e)
+        exists, stream_owner = False, None
+    if exists and stream_owner != owner:
+        logger.warning("Refusing to resume stream %s for another user or route", stream_id)
+        exists = False
+    if not exists:
+        await redis_client.close()
+        return None
+
+    broadcaster = Broadcaster(stream_id=stream_id, offset=last_seq + 1, user_id=user_id, route=route)
+
+    async def run():
+        try:
+            await relay(broadcaster, redis_client)
+        except asyncio.CancelledError as e:
+            broadcaster.close(e)
+            raise
+        except Exception as e:
+            logger.exception("Resuming stream %s failed: %s", stream_id, e)
+            broadcaster.close(e)
+        finally:
+            broadcaster.close()
+            await redis_client.close()
+
+    cancel_when_abandoned(broadcaster, spawn(run()))
+    return broadcaster, last_seq
+
+
+def format_sse_event(data: str, event_id: str, event: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"]
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in _LINE_BREAK.split(data))
+    return "\n".join(lines) + "\n\n"
+
+
+def _coalesced(broadcaster: Broadcaster, start: Optional[int] = None):
+    return broadcaster.subscribe_coalesced(
+        start,
+        max_delay=settings.STREAM_COALESCE_MS / 1000,
+        max_bytes=settings.STREAM_COALESCE_BYTES,
+    )
+
+
+def _error_detail(error: BaseException) -> str:
+    # Client errors carry a message meant for the client; anything else stays in the logs.
+    if isinstance(error, HTTPException) and error.status_code < 500:
+        return str(error.detail)
+    return "Internal Server Error"
+
+
+async def sse_events(broadcaster: Broadcaster, last_seq: int = -1) -> AsyncGenerator[str, None]:
+    """
+    Frames the chunks after `last_seq` as SSE events, coalescing chunks that
+    arrive close together into one event. Each event's id is
+    "{stream_id}:{seq}" with the sequence number of its last chunk. An "end"
+    event follows once the stream has finished cleanly, or an "error" event
+    if the producer failed, so the client knows not to reconnect either way.
+    """
+    seq = last_seq
+    async for seq, text in _coalesced(broadcaster, last_seq + 1):
+        yield format_sse_event(text, f"{broadcaster.stream_id}:{seq}")
+    if broadcaster.error is None:
+        yield format_sse_event("", f"{broadcaster.stream_id}:{seq + 1}", event="end")
+    else:
+        yield format_sse_event(_error_detail(broadcaster.error), f"{broadcaster.stream_id}:{seq + 1}", event="error")
+
+
+async def text_stream(broadcaster: Broadcaster) -> AsyncGenerator[str, None]:
+    """The stream as plain text, coalesced like sse_events() but without framing."""
+    async for _, text in _coalesced(broadcaster):
+        yield text
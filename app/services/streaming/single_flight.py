@@ -0,0 +1,127 @@
+# app/services/streaming/single_flight.py
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.dependencies import create_redis_client
+from app.core.tracing import current_route
+from app.services.streaming.broadcaster import Broadcaster
+from app.services.streaming.resumable import (
+    StreamFactory,
+    cancel_when_abandoned,
+    new_stream_id,
+    produce,
+    relay,
+    spawn,
+    start_stream,
+)
+
+logger = logging.getLogger(__name__)
+
+# Streams in flight in this worker, by single-flight key: produced here, or relayed from the worker that produces them.
+in_flight: Dict[str, Broadcaster] = {}
+
+
+def _normalise(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {key: _normalise(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(item) for item in value]
+    return value
+
+
+def single_flight_key(route: str, user_id, body: BaseModel) -> str:
+    """Hash of (route, user, body), with whitespace in the body's strings collapsed."""
+    payload = json.dumps(
+        {"route": route, "user": user_id, "body": _normalise(body.model_dump())},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _lock_key(key: str) -> str:
+    return f"single_flight:{key}:lock"
+
+
+def join_single_flight(key: str, factory: StreamFactory, route: str, user_id, grace_seconds: Optional[float] = None) -> Broadcaster:
+    """
+    Returns the Broadcaster carrying the response for `key`, starting the
+    upstream call only if no identical request is already in flight in any worker.
+
+    The first request for a key takes a Redis lock holding a new stream id and
+    produces the stream in the background (see resumable.produce), buffering
+    it in Redis under that id. Duplicates in the same worker share its
+    Broadcaster; duplicates in other workers read the stream id from the lock
+    and relay the buffer into a Broadcaster of their own. `user_id` must be
+    the user in `key`; with `route` it is the only user and route that can
+    resume the stream.
+    """
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return start_stream(factory, route, user_id, grace_seconds)
+
+    broadcaster = in_flight.get(key)
+    if broadcaster is not None:
+        logger.info("Joining in-flight stream %s", broadcaster.stream_id or key[:12])
+        return broadcaster
+
+    # Registered before any await, so duplicates arriving meanwhile in this worker share it.
+    broadcaster = Broadcaster(user_id=user_id, route=route)
+    in_flight[key] = broadcaster
+    cancel_when_abandoned(broadcaster, spawn(_lead_or_follow(key, factory, broadcaster, route)), grace_seconds)
+    return broadcaster
+
+
+async def _lead_or_follow(key: str, factory: StreamFactory, broadcaster: Broadcaster, route: str):
+    current_route.set(route)
+    redis_client = create_redis_client()
+    stream_id = new_stream_id()
+    owner = None
+    try:
+        try:
+            # Retried because the owner may finish and release the lock between SET and GET.
+            for _ in range(3):
+                if await redis_client.set(_lock_key(key), stream_id, nx=True, ex=settings.SINGLE_FLIGHT_LOCK_TTL_SECONDS):
+                    owner = stream_id
+                    break
+                owner = await redis_client.get(_lock_key(key))
+                if owner:
+                    break
+        except RedisError as e:
+            logger.warning("Single-flight lock unavailable, deduplicating within this worker only: %s", e)
+
+        if owner is None:
+            broadcaster.stream_id = stream_id
+            await produce(broadcaster, factory, redis_client, remote=False)
+        elif owner == stream_id:
+            broadcaster.stream_id = stream_id
+            # The lock's TTL is refreshed with every chunk, so it lapses soon after a crashed producer stops.
+            await produce(broadcaster, factory, redis_client, keep_alive=[_lock_key(key)])
+        else:
+            logger.info("Relaying stream %s from another worker", owner)
+            broadcaster.stream_id = owner
+            await relay(broadcaster, redis_client)
+    except asyncio.CancelledError as e:
+        broadcaster.close(e)
+        raise
+    except Exception as e:
+        logger.exception("Single-flight stream %s failed: %s", key[:12], e)
+        broadcaster.close(e)
+    finally:
+        broadcaster.close()
+        if in_flight.get(key) is broadcaster:
+            del in_flight[key]
+        if owner == stream_id:
+            try:
+                if await redis_client.get(_lock_key(key)) == stream_id:
+                    await redis_client.delete(_lock_key(key))
+            except RedisError as e:
+                logger.warning("Releasing single-flight lock %s failed: %s", key[:12], e)
+        await redis_client.close()
@@ -0,0 +1,111 @@
+# app/services/tarot_draw_services.py
+import hashlib
+import secrets
+from typing import List, Optional
+
+import numpy as np
+
+from app.data.tarot import get_tarot_cards
+
+SEED_BYTES = 32
+DRAW_VERSION = "tarot-draw/v1"
+
+# Spread key -> the spread name /analyze expects and the position of each card.
+SPREADS = {
+    "three_card": {
+        "name": "Three-Card Spread (Past, Present, Future)",
+        "positions": ["Past", "Present", "Future"],
+    },
+    "celtic_cross": {
+        "name": "Celtic Cross",
+        "positions": [
+            "Present Situation", "Challenge", "Subconscious", "Past Influence",
+            "Conscious Goal", "Near Future", "Self", "Environment", "Hopes and Fears", "Outcome",
+        ],
+    },
+    "custom_5": {
+        "name": "Custom (5 cards)",
+        "positions": ["Card 1", "Card 2", "Card 3", "Card 4", "Card 5"],
+    },
+}
+
+_deck = None
+
+
+def get_deck() -> np.ndarray:
+    """English card names in the order of the card file. Draws index into this order."""
+    global _deck
+    if _deck is None:
+        _deck = np.array(list(get_tarot_cards()), dtype=object)
+    return _deck
+
+
+def new_seed() -> str:
+    return secrets.token_hex(SEED_BYTES)
+
+
+def parse_seed(seed: str) -> bytes:
+    try:
+        raw = bytes.fromhex(seed)
+    except ValueError:
+        raise ValueError("Seed must be hex encoded")
+    if len(raw) != SEED_BYTES:
+        raise ValueError(f"Seed must be {SEED_BYTES} bytes")
+    return raw
+
+
+def _keystream(seed: bytes, spread: str, deck_size: int, card_count: int) -> bytes:
+    """
+    Deterministic random bytes for one draw: SHAKE-256 of the version, spread
+    and seed. With a secret random seed the output is unpredictable; with the
+    same seed it is the same, which makes a draw replayable.
+    """
+    message = f"{DRAW_VERSION}|{spread}|".encode() + seed
+    return hashlib.shake_256(message).digest(deck_size * 8 + card_count)
+
+
+def draw_batch(seeds: List[str], spread: str) -> List[dict]:
+    """
+    Draws one spread per seed. Every card of the deck gets a 64-bit random key
+    from the seed's keystream; the cards with the smallest keys, in key order,
+    are the draw (a uniformly random permutation prefix, so no card is drawn
+    twice), and one more keystream byte per card picks its orientation. All
+    seeds are handled together as one (seeds x deck) key matrix.
+    """
+    if spread not in SPREADS:
+        raise ValueError(f"Unsupported spread: {spread}")
+    positions = SPREADS[spread]["positions"]
+    deck = get_deck()
+    card_count = len(positions)
+    key_bytes = len(deck) * 8
+
+    streams = np.frombuffer(
+        b"".join(_keystream(parse_seed(seed), spread, len(deck), card_count) for seed in seeds),
+        dtype=np.uint8,
+    ).reshape(len(seeds), key_bytes + card_count)
+    keys = streams[:, :key_bytes].copy().view("<u8")
+    picked = np.argsort(keys, axis=1, kind="stable")[:, :card_count]
+    reversed_ = (streams[:, key_bytes:] & 1).astype(bool)
+
+    names = deck[picked]
+    return [
+        {
+            "seed": seed,
+            "spread": spread,
+            "spread_name": SPREADS[spread]["name"],
+            "cards": [
+                {
+                    "position": position,
+                    "name": name,
+                    "orientation": "reversed" if is_reversed else "upright",
+                }
+                for position, name, is_reversed in zip(positions, names[row], reversed_[row])
+            ],
+        }
+        for row, seed in enumerate(seeds)
+    ]
+
+
+def draw_spread(spread: str, seed: Optional[str] = None) -> dict:
+    """Draws a spread with a new random seed, or replays the draw of `seed`."""
+    return draw_batch([seed or new_seed()], spread)[0]
@@ -1,36 +1,53 @@
 # app/services/tarot_service.py
-import json
+import asyncio
 import logging
-import time
-from datetime import datetime
 from typing import AsyncGenerator
 
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
 
-from app.data.tarot import tarot_cards
-from app.models.database_models.tarot_reading_history import TarotReadingHistory
+from app.core.config import settings
+from app.core.logging_config import log_payload
+from app.core.tracing import span
+from app.data.tarot import get_card_record, get_tarot_cards
 from app.models.database_models.user import User
 from app.models.llm_models import ChatRequest
+from app.services.database.tarot_database_services import save_tarot_reading
 from app.services.llm.llm_services import chat_logic
+from app.services.llm.llm_utils import PARTIAL_RESULT_SUFFIX
 
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-async def analyze_tarot_logic(request, db: AsyncSession, redis_client: Redis, user: User) -> AsyncGenerator[str, None]:
+# Spread names as the client sends them, in each language.
+THREE_CARD_SPREADS = ["Three-Card Spread (Past, Present, Future)", "过去、现在、未来", "過去、現在、未來"]
+CELTIC_CROSS_SPREADS = ["Celtic Cross", "凯尔特十字牌阵", "凱爾特十字牌陣"]
+CUSTOM_SPREADS = ["Custom (5 cards)", "自定义（5张牌）", "自定義（5張牌）"]
+
+
+def validate_tarot_request(request):
     """
-    Analyze tarot cards, stream LLM response, measure time to first chunk,
-    and delay each chunk by 0.05 seconds.
+    Raises ValueError for an unknown card or spread. Called by the route before
+    the stream starts, so that a bad request is answered with a 400 rather than
+    an SSE stream that fails.
     """
-    request_received_time = time.time()
-    logger.info("Starting tarot service")
-    logger.debug(f"Full Request: {request.__dict__}")
-
+    tarot_cards = get_tarot_cards()
     for card in request.tarot_cards:
         if card.name not in tarot_cards:
             raise ValueError(f"Invalid card: {card.name}")
+    if request.spread not in THREE_CARD_SPREADS + CELTIC_CROSS_SPREADS + CUSTOM_SPREADS:
+        raise ValueError(f"Unsupported spread type: {request.spread}")
+
+async def analyze_tarot_logic(request, db: AsyncSession, redis_client: Redis, user: User) -> AsyncGenerator[str, None]:
+    """
+    Analyze tarot cards and stream the LLM response. Stage timings are
+    recorded through app.core.tracing.
+    """
+    logger.info("Starting tarot service")
+    log_payload(logger, "Tarot request", request.__dict__)
+
+    validate_tarot_request(request)
 
     language = request.language if hasattr(request, 'language') else "en"
 
@@ -49,6 +66,8 @@ async def analyze_tarot_logic(request, db: AsyncSession, redis_client: Redis, us
             "past_label": "Past",
             "present_label": "Present",
             "future_label": "Future",
+            "upright_label": "Upright",
+            "reversed_label": "Reversed",
             "message_success": "Analysis generated successfully",
             "error_llm": "Error during LLM processing: ",
             "system_instruction": "You are a highly insightful and experienced tarot reader. Summarize and synthesize the card meanings and respond in English, focusing on key insights. Briefly connect the interpretations to the user's life and question (if provided). Provide concise, actionable advice where relevant, considering both light and shadow aspects. If no specific question is given, provide a brief general fortune telling."
@@ -66,6 +85,8 @@ async def analyze_tarot_logic(request, db: AsyncSession, redis_client: Redis, us
             "past_label": "过去",
             "present_label": "现在",
             "future_label": "未来",
+            "upright_label": "正位",
+            "reversed_label": "逆位",
             "message_success": "分析生成成功",
             "error_llm": "LLM 处理时出错：",
             "system_instruction": "你是一位非常有洞察力和经验丰富的塔罗牌解读师。请总结并综合塔罗牌的含义，并用中文回答，重点关注关键的解读。简要地将解读与用户的生活和问题（如果有提供）联系起来。在相关情况下，提供简洁、可行的建议，同时考虑光明和阴影两方面。如果用户没有提出具体问题，请提供简短的运势预测。"
@@ -83,6 +104,8 @@ async def analyze_tarot_logic(request, db: AsyncSession, redis_client: Redis, us
             "past_label": "過去",
             "present_label": "現在",
             "future_label": "未來",
+            "upright_label": "正位",
+            "reversed_label": "逆位",
             "message_success": "分析生成成功",
             "error_llm": "LLM 處理時出錯：",
             "system_instruction": "你是一位非常有洞察力和經驗豐富的塔羅牌解讀師。請總結並綜合塔羅牌的含義，並用繁體中文回答，重點關注關鍵的解讀。扼要地將解讀與使用者的生活和問題（如果有提供）聯繫起來。在相關情況下，提供簡潔、可行的建議，同時考慮光明和陰影兩方面。如果使用者沒有提出具體問題，請提供簡短的運勢預測。"
@@ -93,101 +116,100 @@ async def analyze_tarot_logic(request, db: AsyncSession, redis_client: Redis, us
     prompt_data = language_prompts.get(language, language_prompts["en"])
     system_instruction = prompt_data["system_instruction"]
 
-    prompt_build_start = time.time()
-
-    if request.spread in ["Three-Card Spread (Past, Present, Future)", "过去、现在、未来", "過去、現在、未來"]:
-        card_positions = [
-            prompt_data["past_label"],
-            prompt_data["present_label"],
-            prompt_data["future_label"]
-        ]
-
-        prompt = (
-            f"{prompt_data['question']}\n"
-            f"\"{request.user_context}\"\n\n"
-            f"{prompt_data['cards_drawn']}\n\n"
-        )
-
-        for index, card in enumerate(request.tarot_cards):
-            card_data = tarot_cards[card.name]
-            prompt += (
-                f"{card_positions[index]}: {card_data['name']} ({card.orientation.capitalize()})\n"
-                f"  {prompt_data['keywords_label']}: {', '.join(card_data['keywords'])}\n"
-                f"  {prompt_data['light_meanings_label']}: {', '.join(card_data['meanings']['light'])}\n"
-                f"  {prompt_data['shadow_meanings_label']}: {', '.join(card_data['meanings']['shadow'])}\n"
-            )
-        prompt += f"\n{prompt_data['analyze_three']}"
-    elif request.spread in ["Celtic Cross", "凯尔特十字牌阵", "凱爾特十字牌陣"]:
-        card_positions = {
-            "en": [
-                "Present Situation", "Challenge", "Subconscious", "Past Influence",
-                "Conscious Goal", "Near Future", "Self", "Environment", "Hopes and Fears", "Outcome"
-            ],
-            "zh": [
-                "当前情况", "挑战", "潜意识", "过去的影响",
-                "显意识的目标", "不久的将来", "自我", "环境", "希望与恐惧", "结果"
-            ],
-            "zh_TW": [
-                "目前情況", "挑戰", "潛意識", "過去的影響",
-                "顯意識的目標", "不久的將來", "自我", "環境", "希望與恐懼", "結果"
+    def orientation_label(card):
+        return prompt_data.get(f"{card.orientation.lower()}_label", card.orientation.capitalize())
+
+    with span("prompt_build"):
+        if request.spread in THREE_CARD_SPREADS:
+            card_positions = [
+                prompt_data["past_label"],
+                prompt_data["present_label"],
+                prompt_data["future_label"]
             ]
-        }[language]
-
-        prompt = (
-            f"{prompt_data['question']}\n"
-            f"\"{request.user_context}\"\n\n"
-            f"{prompt_data['cards_drawn']}\n\n"
-        )
-        for index, card in enumerate(request.tarot_cards):
-            if index < len(card_positions):
-                card_data = tarot_cards[card.name]
+
+            prompt = (
+                f"{prompt_data['question']}\n"
+                f"\"{request.user_context}\"\n\n"
+                f"{prompt_data['cards_drawn']}\n\n"
+            )
+
+            for index, card in enumerate(request.tarot_cards):
+                card_data = get_card_record(card.name, language)
                 prompt += (
-                    f"{card_positions[index]}: {card_data['name']} ({card.orientation.capitalize()})\n"
-                    f"  {prompt_data['keywords_label']}: {', '.join(card_data['keywords'])}\n"
-                    f"  {prompt_data['light_meanings_label']}: {', '.join(card_data['meanings']['light'])}\n"
-                    f"  {prompt_data['shadow_meanings_label']}: {', '.join(card_data['meanings']['shadow'])}\n"
+                    f"{card_positions[index]}: {card_data.display_name} ({orientation_label(card)})\n"
+                    f"  {prompt_data['keywords_label']}: {', '.join(card_data.keywords)}\n"
+                    f"  {prompt_data['light_meanings_label']}: {', '.join(card_data.light)}\n"
+                    f"  {prompt_data['shadow_meanings_label']}: {', '.join(card_data.shadow)}\n"
                 )
-        prompt += f"\n{prompt_data['analyze_celtic']}"
-
-    elif request.spread in ["Custom (5 cards)", "自定义（5张牌）", "自定義（5張牌）"]:
-        prompt = (
-            f"{prompt_data['question']}\n"
-            f"\"{request.user_context}\"\n\n"
-            f"{prompt_data['cards_drawn']}\n\n"
-        )
-        for index, card in enumerate(request.tarot_cards):
-            card_data = tarot_cards[card.name]
-            prompt += (
-                f"{prompt_data['card_label']} {index + 1}: {card_data['name']} ({card.orientation.capitalize()})\n"
-                f"  {prompt_data['keywords_label']}: {', '.join(card_data['keywords'])}\n"
-                f"  {prompt_data['light_meanings_label']}: {', '.join(card_data['meanings']['light'])}\n"
-                f"  {prompt_data['shadow_meanings_label']}: {', '.join(card_data['meanings']['shadow'])}\n"
+            prompt += f"\n{prompt_data['analyze_three']}"
+        elif request.spread in CELTIC_CROSS_SPREADS:
+            card_positions = {
+                "en": [
+                    "Present Situation", "Challenge", "Subconscious", "Past Influence",
+                    "Conscious Goal", "Near Future", "Self", "Environment", "Hopes and Fears", "Outcome"
+                ],
+                "zh": [
+                    "当前情况", "挑战", "潜意识", "过去的影响",
+                    "显意识的目标", "不久的将来", "自我", "环境", "希望与恐惧", "结果"
+                ],
+                "zh_TW": [
+                    "目前情況", "挑戰", "潛意識", "過去的影響",
+                    "顯意識的目標", "不久的將來", "自我", "環境", "希望與恐懼", "結果"
+                ]
+            }[language]
+
+            prompt = (
+                f"{prompt_data['question']}\n"
+                f"\"{request.user_context}\"\n\n"
+                f"{prompt_data['cards_drawn']}\n\n"
             )
-        prompt += f"\n{prompt_data['analyze_custom']}"
-    else:
-        raise ValueError(f"Unsupported spread type: {request.spread}")
+            for index, card in enumerate(request.tarot_cards):
+                if index < len(card_positions):
+                    card_data = get_card_record(card.name, language)
+                    prompt += (
+                        f"{card_positions[index]}: {card_data.display_name} ({orientation_label(card)})\n"
+                        f"  {prompt_data['keywords_label']}: {', '.join(card_data.keywords)}\n"
+                        f"  {prompt_data['light_meanings_label']}: {', '.join(card_data.light)}\n"
+                        f"  {prompt_data['shadow_meanings_label']}: {', '.join(card_data.shadow)}\n"
+                    )
+            prompt += f"\n{prompt_data['analyze_celtic']}"
+
+        elif request.spread in CUSTOM_SPREADS:
+            prompt = (
+                f"{prompt_data['question']}\n"
+                f"\"{request.user_context}\"\n\n"
+                f"{prompt_data['cards_drawn']}\n\n"
+            )
+            for index, card in enumerate(request.tarot_cards):
+                card_data = get_card_record(card.name, language)
+                prompt += (
+                    f"{prompt_data['card_label']} {index + 1}: {card_data.display_name} ({orientation_label(card)})\n"
+                    f"  {prompt_data['keywords_label']}: {', '.join(card_data.keywords)}\n"
+                    f"  {prompt_data['light_meanings_label']}: {', '.join(card_data.light)}\n"
+                    f"  {prompt_data['shadow_meanings_label']}: {', '.join(card_data.shadow)}\n"
+                )
+            prompt += f"\n{prompt_data['analyze_custom']}"
+        else:
+            raise ValueError(f"Unsupported spread type: {request.spread}")
 
-    prompt_build_end = time.time()
-    logger.debug(f"Prompt build time: {prompt_build_end - prompt_build_start:.4f} seconds")
-    logger.info(prompt)
+    log_payload(logger, "Tarot prompt", prompt)
 
     llm_request = ChatRequest(session_id=request.session_id, prompt=prompt, system_instruction=system_instruction)
 
     response_chunks = []
-    first_chunk_sent = False
     try:
         async for chunk in chat_logic(llm_request, db, redis_client, user.id):
             response_chunks.append(chunk)
-            if not first_chunk_sent:
-                first_chunk_time = time.time()
-                time_to_first_chunk = first_chunk_time - request_received_time
-                logger.info(f"Time to first chunk (tarot): {time_to_first_chunk:.4f} seconds")
-                first_chunk_sent = True
-
             yield chunk
 
+    except asyncio.CancelledError:
+        logger.info("Tarot reading cancelled after %d chunks", len(response_chunks))
+        if user and response_chunks and settings.PERSIST_PARTIAL_RESULTS:
+            # Queued without waiting for the commit: this task is being cancelled, and the writer commits it on its own.
+            await _save_tarot_reading(user, request, "".join(response_chunks) + PARTIAL_RESULT_SUFFIX, wait=False)
+        raise
     except Exception as e:
-        logger.error(f"Error during LLM processing: {e}", exc_info=True)
+        logger.error("Error during LLM processing: %s", e, exc_info=True)
         error_message = f"{prompt_data['error_llm']}{e}"
         yield error_message
         raise HTTPException(status_code=500, detail=error_message)
@@ -198,23 +220,20 @@ async def analyze_tarot_logic(request, db: AsyncSession, redis_client: Redis, us
     full_response = "".join(response_chunks)
 
     if user:
-        try:
-            user_id_int = user.id
-            cards_drawn_serialized = json.dumps([{"name": card.name, "orientation": card.orientation} for card in request.tarot_cards])
-
-            tarot_reading = TarotReadingHistory(
-                user_id=user_id_int,
-                reading_date=datetime.utcnow(),
-                cards_drawn=cards_drawn_serialized,
-                interpretation=full_response,
-                spread=request.spread,
-                user_context=request.user_context
-            )
+        await _save_tarot_reading(user, request, full_response, wait=settings.TAROT_HISTORY_AWAIT_WRITE)
+
 
-            db.add(tarot_reading)
-            db.commit()
-        except Exception as e:
-            logger.exception(f"Error during database operation: {e}")
+async def _save_tarot_reading(user: User, request, interpretation: str, wait: bool = True):
+    try:
+        with span("persistence"):
+            await save_tarot_reading(
+                user.id,
+                request.spread,
+                [{"name": card.name, "orientation": card.orientation} for card in request.tarot_cards],
+                request.user_context,
+                interpretation,
+                wait=wait,
+            )
+    except Exception as e:
+        logger.exception("Error during database operation: %s", e)
 
-    end_time = time.time()
-    logger.info(f"Total tarot service time: {end_time - request_received_time:.4f} seconds")
@@ -2,3 +2,10 @@
 workers = 9
 worker_class = "uvicorn.workers.UvicornWorker"
 bind = "0.0.0.0:8000"
+
+def child_exit(server, worker):
+    # Drops the exited worker's samples when Prometheus multiprocess mode is enabled.
+    import os
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,171 @@
+# tests/test_context_cache.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.llm import context_cache as context_cache_module
+from app.services.llm import llm_utils
+from app.services.llm.context_cache import EXPIRY_MARGIN_SECONDS, ContextCache
+
+MODEL = "gemini-2.0-flash-lite"
+LONG_INSTRUCTION = "You are a tarot reader. " * 200
+SHORT_INSTRUCTION = "Be brief."
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeCaches:
+    """Stands in for client.aio.caches; create() can be made slow or failing."""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.created = []
+
+    async def create(self, model, config):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("cached content too small")
+        self.created.append((model, config.system_instruction))
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(context_cache_module, "time", clock)
+    return clock
+
+
+def make_cache(caches, **kwargs):
+    client = SimpleNamespace(aio=SimpleNamespace(caches=caches))
+    options = {"ttl_seconds": 3600, "min_tokens": 100, "failure_ttl_seconds": 600, **kwargs}
+    return ContextCache(client_factory=lambda model: client, **options)
+
+
+def test_creates_on_miss_and_reuses_on_hit(clock):
+    caches = FakeCaches()
+    cache = make_cache(caches)
+
+    first = asyncio.run(cache.get(MODEL, LONG_INSTRUCTION))
+    second = asyncio.run(cache.get(MODEL, LONG_INSTRUCTION))
+
+    assert first == second == "cachedContents/1"
+    assert caches.created == [(MODEL, LONG_INSTRUCTION)]
+
+
+def test_skips_instructions_below_min_tokens(clock):
+    caches = FakeCaches()
+    cache = make_cache(caches)
+
+    assert asyncio.run(cache.get(MODEL, SHORT_INSTRUCTION)) is None
+    assert caches.created == []
+
+
+def test_remembers_failures_for_failure_ttl(clock):
+    caches = FakeCaches(fail=True)
+    cache = make_cache(caches)
+
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) is None
+
+    caches.fail = False
+    clock.now += 599
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) is None
+    assert caches.created == []
+
+    clock.now += 2
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) == "cachedContents/1"
+
+
+def test_drops_handles_before_ttl_expiry(clock):
+    caches = FakeCaches()
+    cache = make_cache(caches)
+
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) == "cachedContents/1"
+
+    clock.now += 3600 - EXPIRY_MARGIN_SECONDS - 1
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) == "cachedContents/1"
+
+    # Still inside the provider's TTL, but within the margin: a new cache is created.
+    clock.now += 2
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) == "cachedContents/2"
+
+
+def test_concurrent_gets_create_once(clock):
+    caches = FakeCaches(delay=0.05)
+    cache = make_cache(caches)
+
+    async def get_many():
+        return await asyncio.gather(*(cache.get(MODEL, LONG_INSTRUCTION) for _ in range(10)))
+
+    handles = asyncio.run(get_many())
+
+    assert handles == ["cachedContents/1"] * 10
+    assert len(caches.created) == 1
+
+
+def test_invalidate_forgets_the_handle(clock):
+    caches = FakeCaches()
+    cache = make_cache(caches)
+
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) == "cachedContents/1"
+    cache.invalidate(MODEL, LONG_INSTRUCTION)
+    assert asyncio.run(cache.get(MODEL, LONG_INSTRUCTION)) == "cachedContents/2"
+
+
+class FakeStream:
+    def __init__(self, texts):
+        self._chunks = iter(SimpleNamespace(text=text) for text in texts)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_query_retries_inline_when_cached_request_fails(monkeypatch):
+    from google.genai import types
+
+    sent_configs = []
+
+    class FakeChat:
+        def send_message_stream(self, prompt, config):
+            sent_configs.append(config)
+            if config.cached_content:
+                raise RuntimeError("cached content expired")
+            return FakeStream(["reading"])
+
+    invalidated = []
+
+    async def cached_config(model, system_instruction):
+        return types.GenerateContentConfig(cached_content="cachedContents/1")
+
+    monkeypatch.setattr(llm_utils, "build_generation_config", cached_config)
+    monkeypatch.setattr(llm_utils.context_cache, "invalidate", lambda model, instruction: invalidated.append((model, instruction)))
+    monkeypatch.setitem(llm_utils.chat_sessions, "test-session", {"chat_session": FakeChat()})
+
+    request = llm_utils.ChatRequest(session_id="test-session", prompt="Read my cards", model=MODEL, system_instruction=LONG_INSTRUCTION)
+
+    async def collect():
+        return [chunk async for chunk in llm_utils.query_genai_api(request)]
+
+    assert asyncio.run(collect()) == ["reading"]
+    assert invalidated == [(MODEL, LONG_INSTRUCTION)]
+    assert [config.cached_content for config in sent_configs] == ["cachedContents/1", None]
+    assert sent_configs[1].system_instruction == LONG_INSTRUCTION
@@ -0,0 +1,49 @@
+# tests/test_counsellor_turns.py
+import asyncio
+
+import pytest
+
+from app.services import counsellor_services
+
+
+class FakeRedis:
+    def __init__(self, events):
+        self.events = events
+
+    async def lpush(self, key, value):
+        self.events.append(("redis", value))
+
+    async def ltrim(self, key, start, end):
+        pass
+
+
+def record_turn(monkeypatch, create, events):
+    async def create_counsellor_message(db, user_id, session_id, message, response, wait):
+        return await create(events, wait)
+
+    monkeypatch.setattr(counsellor_services, "create_counsellor_message", create_counsellor_message)
+    coroutine = counsellor_services._record_turn(None, FakeRedis(events), 1, "s", "hello", "hi", wait=True)
+    return asyncio.run(coroutine)
+
+
+def test_turn_reaches_redis_only_after_its_commit(monkeypatch):
+    async def commit(events, wait):
+        events.append(("db", wait))
+        return "row"
+
+    events = []
+    row = record_turn(monkeypatch, commit, events)
+
+    assert row == "row"
+    assert events == [("db", True), ("redis", "User: hello\nCounsellor: hi")]
+
+
+def test_failed_write_leaves_redis_history_alone(monkeypatch):
+    async def fail(events, wait):
+        raise RuntimeError("Batch writer for counsellor_message_history is closed")
+
+    events = []
+    with pytest.raises(RuntimeError):
+        record_turn(monkeypatch, fail, events)
+
+    assert events == []
@@ -0,0 +1,59 @@
+# tests/test_importance_scoring.py
+import asyncio
+
+import pytest
+
+from app.scripts import backfill_embeddings
+from app.services.database import importance_database_services
+from app.services.database.importance_database_services import (
+    IMPORTANCE_SCALE,
+    calculate_overall_importance,
+    score_similar_messages,
+)
+
+# What the importance_sample_messages query returns: labels from 1 to 10 and pgvector distances.
+SAMPLES = [
+    [{"importance_score": 9, "similarity_score": 0.91}, {"importance_score": 7, "similarity_score": 0.84}],
+    [{"importance_score": 2, "similarity_score": 0.62}, {"importance_score": 1, "similarity_score": 0.3}],
+    [{"importance_score": 10, "similarity_score": 1.35}],
+    [{"importance_score": 5, "similarity_score": 0.61}] * 10,
+]
+
+
+class FakePool:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, query, *args):
+        return self.rows
+
+
+def backfill_score(samples):
+    pool = FakePool(samples)
+    return asyncio.run(backfill_embeddings.score_importance(pool, asyncio.Semaphore(1), "text", "[0]", 0.6, 10, False))
+
+
+def inline_score(samples, monkeypatch):
+    async def retrieve(**kwargs):
+        return samples
+
+    monkeypatch.setattr(importance_database_services, "retrieve_similar_messages", retrieve)
+    return asyncio.run(calculate_overall_importance(db=None, user_message="text"))
+
+
+@pytest.mark.parametrize("samples", SAMPLES)
+def test_backfill_scores_like_the_inline_path(samples, monkeypatch):
+    backfilled = backfill_score(samples)
+
+    assert backfilled == inline_score(samples, monkeypatch)
+    assert isinstance(backfilled, int)
+    assert 1 <= backfilled <= IMPORTANCE_SCALE
+
+
+def test_scores_use_the_column_scale():
+    # The unscaled combination of these samples is about 0.64; rounding it directly stored 1.
+    assert score_similar_messages([{"importance_score": 9, "similarity_score": 0.91}, {"importance_score": 7, "similarity_score": 0.84}]) == 6
+
+
+def test_no_similar_sample_leaves_the_backfill_score_empty():
+    assert backfill_score([{"importance_score": 8, "similarity_score": 0.2}]) is None
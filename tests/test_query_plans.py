@@ -0,0 +1,167 @@
+# tests/test_query_plans.py
+"""
+EXPLAIN regression tests for the hot per-user queries.
+
+They need a migrated Postgres (alembic upgrade head) in TEST_DATABASE_URL and
+are skipped without one. Rows for a thousand users are inserted in a
+transaction that is rolled back at the end, the tables are analyzed, and each
+query must then be planned with the index meant for it, under the default
+planner settings.
+"""
+import asyncio
+import json
+import os
+
+import pytest
+from sqlalchemy import desc, select
+from sqlalchemy.dialects import postgresql
+
+from app.models.database_models.counsellor_message_history import CounsellorMessageHistory
+from app.models.database_models.user_plan import UserPlan
+from app.models.database_models.user_reflection import UserReflection
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = [
+    pytest.mark.postgres,
+    pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"),
+]
+
+USERS = 1000
+MESSAGES_PER_USER = 100
+SESSIONS_PER_USER = 10
+PLANS_PER_USER = 20
+REFLECTIONS_PER_USER = 20
+
+SEED = [
+    f"""
+    INSERT INTO users (username, email, hashed_password)
+    SELECT 'query-plan-' || g, 'query-plan-' || g || '@example.com', '\\x00'::bytea
+    FROM generate_series(1, {USERS}) AS g
+    """,
+    f"""
+    INSERT INTO counsellor_message_history (user_id, session_id, private_message, user_message, counsellor_response, last_updated_timestamp)
+    SELECT u.id, 'session-' || (g % {SESSIONS_PER_USER}), g % 4 = 0, 'message', 'response', now() - g * interval '1 minute'
+    FROM users AS u, generate_series(1, {MESSAGES_PER_USER}) AS g
+    WHERE u.username LIKE 'query-plan-%'
+    """,
+    f"""
+    INSERT INTO user_plans (user_id, plan_text, plan_type, active_plan, updated_at)
+    SELECT u.id, 'plan', CASE WHEN g % 2 = 0 THEN 'counsellor' ELSE 'general' END, g = 1, now() - g * interval '1 day'
+    FROM users AS u, generate_series(1, {PLANS_PER_USER}) AS g
+    WHERE u.username LIKE 'query-plan-%'
+    """,
+    f"""
+    INSERT INTO user_reflections (user_id, reflection_text, updated_at)
+    SELECT u.id, 'reflection', now() - g * interval '1 day'
+    FROM users AS u, generate_series(1, {REFLECTIONS_PER_USER}) AS g
+    WHERE u.username LIKE 'query-plan-%'
+    """,
+    "ANALYZE users, counsellor_message_history, user_plans, user_reflections",
+]
+
+INDEX_COLUMNS = """
+    SELECT array_agg(a.attname::text ORDER BY k.ord)
+    FROM pg_index AS i
+    CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_attribute AS a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+    WHERE i.indexrelid = $1::regclass
+"""
+
+
+def hot_queries(user_id: int, session_id: str) -> dict:
+    """
+    The query shapes of counsellor_database_services, user_database_services and
+    reflection_database_services, with the leading index columns each should use.
+    """
+    return {
+        "counsellor messages of a session": (
+            select(CounsellorMessageHistory)
+            .where(CounsellorMessageHistory.user_id == user_id, CounsellorMessageHistory.session_id == session_id)
+            .order_by(desc(CounsellorMessageHistory.last_updated_timestamp))
+            .limit(10),
+            ["user_id", "session_id"],
+        ),
+        "retrieval within a session": (
+            select(CounsellorMessageHistory.id)
+            .where(CounsellorMessageHistory.user_id == user_id, CounsellorMessageHistory.session_id == session_id),
+            ["user_id", "session_id"],
+        ),
+        "retrieval across non-private messages": (
+            select(CounsellorMessageHistory.id)
+            .where(CounsellorMessageHistory.user_id == user_id, CounsellorMessageHistory.private_message == False),
+            ["user_id", "private_message"],
+        ),
+        "active plan": (
+            select(UserPlan).where(UserPlan.user_id == user_id, UserPlan.active_plan == True),
+            ["user_id"],
+        ),
+        "latest counsellor prompt": (
+            select(UserPlan)
+            .where(UserPlan.user_id == user_id, UserPlan.plan_type == "counsellor")
+            .order_by(UserPlan.updated_at.desc()),
+            ["user_id", "plan_type"],
+        ),
+        "latest reflections": (
+            select(UserReflection)
+            .where(UserReflection.user_id == user_id)
+            .order_by(desc(UserReflection.updated_at))
+            .limit(10),
+            ["user_id", "updated_at"],
+        ),
+    }
+
+
+def plan_nodes(plan: dict) -> list:
+    """Every node of an EXPLAIN (FORMAT JSON) plan tree."""
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+async def explain_hot_queries() -> dict:
+    """Seeds, analyzes and EXPLAINs in one transaction that is rolled back. Returns, per query, the scans it plans."""
+    import asyncpg
+
+    connection = await asyncpg.connect(TEST_DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1))
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        for statement in SEED:
+            await connection.execute(statement)
+        user_id = await connection.fetchval("SELECT min(id) FROM users WHERE username LIKE 'query-plan-%'")
+
+        results = {}
+        for name, (query, _) in hot_queries(user_id, "session-1").items():
+            sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            plan = await connection.fetchval("EXPLAIN (FORMAT JSON) " + sql)
+            plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+            scans = {"seq": [], "index": []}
+            for node in plan_nodes(plan):
+                if node["Node Type"] == "Seq Scan":
+                    # Empty partitions cost nothing to scan; only a scan of rows counts.
+                    if await connection.fetchval(f'SELECT EXISTS (SELECT 1 FROM "{node["Relation Name"]}")'):
+                        scans["seq"].append(node["Relation Name"])
+                elif "Index Name" in node:
+                    scans["index"].append(await connection.fetchval(INDEX_COLUMNS, node["Index Name"]))
+            results[name] = scans
+        return results
+    finally:
+        await transaction.rollback()
+        await connection.close()
+
+
+@pytest.fixture(scope="module")
+def planned():
+    return asyncio.run(explain_hot_queries())
+
+
+@pytest.mark.parametrize("name,leading_columns", [(name, columns) for name, (_, columns) in hot_queries(1, "session-1").items()])
+def test_hot_query_uses_its_index(planned, name, leading_columns):
+    scans = planned[name]
+
+    assert scans["seq"] == [], f"{name}: sequential scan on {', '.join(scans['seq'])}"
+    assert any(columns[:len(leading_columns)] == leading_columns for columns in scans["index"]), (
+        f"{name}: no index on {leading_columns} used, only {scans['index']}"
+    )
@@ -0,0 +1,112 @@
+# tests/test_reranking.py
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.database import embedding_database_services
+from app.services.database.embedding_database_services import retrieve_similar_importance_recent_messages
+from app.services.database.reranking import SCORING_PROFILES, rerank
+
+DIMENSIONS = 384
+
+
+def synthetic_conversation(topics: int, repeats: int, noise: float, rng: np.random.Generator):
+    """Embeddings of `topics` distinct turns, each said `repeats` times with a little noise, and the topic of each."""
+    centres = rng.standard_normal((topics, DIMENSIONS)).astype(np.float32)
+    topic_of = np.repeat(np.arange(topics), repeats)
+    embeddings = centres[topic_of] + noise * rng.standard_normal((len(topic_of), DIMENSIONS)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings, topic_of
+
+
+def duplicate_turns(picked, topic_of) -> int:
+    return len(picked) - len(set(topic_of[picked]))
+
+
+def test_counsellor_profile_drops_restated_turns():
+    rng = np.random.default_rng(0)
+    profile = SCORING_PROFILES["counsellor"]
+    duplicates_plain = duplicates_mmr = 0
+    for _ in range(200):
+        embeddings, topic_of = synthetic_conversation(topics=8, repeats=4, noise=0.05, rng=rng)
+        n = len(topic_of)
+        distances = rng.uniform(0.5, 0.7, n)
+        importance = rng.integers(4, 8, n).astype(np.float64)
+        age_seconds = rng.uniform(0, 30 * 86400, n)
+
+        plain = [index for index, _ in rerank(distances, importance, age_seconds, {**profile, "mmr_lambda": None}, 10)]
+        diverse = [index for index, _ in rerank(distances, importance, age_seconds, profile, 10, embeddings)]
+        duplicates_plain += duplicate_turns(plain, topic_of)
+        duplicates_mmr += duplicate_turns(diverse, topic_of)
+
+    # Scores alone let restated turns through; MMR never does.
+    assert duplicates_plain > 0
+    assert duplicates_mmr == 0
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSession:
+    """Returns the given rows, best combined_score first, as the SQL path's ORDER BY would."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def execute(self, query, params=None):
+        self.queries.append((str(query), params))
+        return FakeResult(sorted(self.rows, key=lambda row: -row.combined_score)[:params["top_k"]])
+
+
+def scored_row(id, combined_score, embedding):
+    values = {"id": id, "combined_score": combined_score, "_embedding": embedding}
+    return SimpleNamespace(**values, _mapping=values)
+
+
+@pytest.fixture
+def sql_path(monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_RERANK_IN_NUMPY", False)
+    monkeypatch.setattr(
+        embedding_database_services, "get_embedding_model",
+        lambda: SimpleNamespace(encode=lambda text, normalize_embeddings: np.zeros(DIMENSIONS)),
+    )
+
+
+def retrieve(db, scoring_profile, top_k):
+    return asyncio.run(retrieve_similar_importance_recent_messages(
+        db=db, user_id=1, query_text="I keep thinking about the move", table_name="counsellor_message_history",
+        embedding_column_name="embedding", return_column_names=["id"], top_k=top_k, scoring_profile=scoring_profile,
+    ))
+
+
+def test_sql_path_drops_restated_turns(sql_path):
+    embeddings, topic_of = synthetic_conversation(topics=3, repeats=4, noise=0.05, rng=np.random.default_rng(1))
+    # Every restatement of topic 0 outscores everything else.
+    scores = [1.0 - 0.01 * index if topic == 0 else 0.5 - 0.01 * index for index, topic in enumerate(topic_of)]
+    db = FakeSession([scored_row(index, score, embeddings[index]) for index, score in enumerate(scores)])
+
+    results = retrieve(db, "counsellor", top_k=3)
+
+    assert sorted(topic_of[[result["id"] for result in results]]) == [0, 1, 2]
+    assert set(results[0]) == {"id", "combined_score"}
+    sql, params = db.queries[-1]
+    assert "embedding IS NOT NULL" in sql
+    assert params["top_k"] == settings.RETRIEVAL_CANDIDATES
+
+
+def test_sql_path_without_mmr_returns_scores_only(sql_path):
+    db = FakeSession([scored_row(index, 1.0 - 0.1 * index, np.ones(DIMENSIONS)) for index in range(5)])
+
+    results = retrieve(db, "reflections", top_k=3)
+
+    assert [result["id"] for result in results] == [0, 1, 2]
+    assert db.queries[-1][1]["top_k"] == 3
@@ -0,0 +1,85 @@
+# tests/test_resumable.py
+import asyncio
+
+import pytest
+
+from app.services.streaming import resumable
+from app.services.streaming.broadcaster import Broadcaster
+from app.services.streaming.resumable import resume_stream
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def exists(self, key):
+        self.results.append(int(key in self.redis.buffers))
+
+    def hgetall(self, key):
+        self.results.append(dict(self.redis.hashes.get(key, {})))
+
+    async def execute(self):
+        return self.results
+
+
+class FakeRedis:
+    """Only what resume_stream reads before it starts relaying."""
+
+    def __init__(self):
+        self.buffers = set()
+        self.hashes = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(resumable, "create_redis_client", lambda: redis)
+    # The relay itself is not under test; it would block on XREAD.
+    monkeypatch.setattr(resumable, "cancel_when_abandoned", lambda broadcaster, task, grace_seconds=None: task.cancel())
+    return redis
+
+
+def resume(last_event_id, user_id, route):
+    return asyncio.run(resume_stream(last_event_id, user_id, route))
+
+
+def test_local_stream_resumes_only_for_its_user_and_route(monkeypatch):
+    broadcaster = Broadcaster(stream_id="abc", user_id=7, route="counsellor")
+    monkeypatch.setitem(resumable.streams, "abc", broadcaster)
+
+    assert resume("abc:3", 7, "counsellor") == (broadcaster, 3)
+    assert resume("abc:3", 8, "counsellor") is None
+    assert resume("abc:3", 7, "tarot") is None
+    assert resume("abc:3", None, "counsellor") is None
+
+
+def test_buffered_stream_resumes_only_for_its_user_and_route(redis):
+    redis.buffers.add("stream:abc")
+    redis.hashes["stream:abc:owner"] = {"user": "7", "route": "tarot"}
+
+    assert resume("abc:0", 8, "tarot") is None
+    assert resume("abc:0", 7, "counsellor") is None
+
+    broadcaster, last_seq = resume("abc:0", 7, "tarot")
+    assert (broadcaster.stream_id, broadcaster.offset, last_seq) == ("abc", 1, 0)
+
+
+def test_buffer_without_owner_is_not_resumable(redis):
+    redis.buffers.add("stream:abc")
+
+    assert resume("abc:0", None, "tarot") is None
+
+
+def test_anonymous_stream_resumes_only_anonymously(redis):
+    redis.buffers.add("stream:abc")
+    redis.hashes["stream:abc:owner"] = {"user": "", "route": "tarot"}
+
+    assert resume("abc:0", 7, "tarot") is None
+    assert resume("abc:0", None, "tarot") is not None
@@ -0,0 +1,58 @@
+# tests/test_sse_events.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.tarot_models import TarotAnalysisRequest, TarotCard
+from app.services.streaming.broadcaster import Broadcaster
+from app.services.streaming.resumable import sse_events
+from app.services.tarot_services import validate_tarot_request
+
+
+def collect(broadcaster):
+    async def run():
+        return [event async for event in sse_events(broadcaster)]
+    return asyncio.run(run())
+
+
+def test_clean_stream_ends_with_end_event():
+    broadcaster = Broadcaster(stream_id="s1")
+    broadcaster.publish("hello")
+    broadcaster.close()
+
+    events = collect(broadcaster)
+
+    assert events == ["id: s1:0\ndata: hello\n\n", "id: s1:1\nevent: end\ndata: \n\n"]
+
+
+def test_failed_stream_ends_with_error_event():
+    broadcaster = Broadcaster(stream_id="s1")
+    broadcaster.close(RuntimeError("connection reset by db-internal-host"))
+
+    events = collect(broadcaster)
+
+    # The exception text stays in the logs.
+    assert events == ["id: s1:0\nevent: error\ndata: Internal Server Error\n\n"]
+
+
+def test_client_error_detail_is_sent():
+    broadcaster = Broadcaster(stream_id="s1")
+    broadcaster.close(HTTPException(status_code=400, detail="Message cannot be empty"))
+
+    assert collect(broadcaster)[-1] == "id: s1:0\nevent: error\ndata: Message cannot be empty\n\n"
+
+
+def tarot_request(spread="Celtic Cross", card="The Fool"):
+    return TarotAnalysisRequest(
+        session_id="s", spread=spread, tarot_cards=[TarotCard(name=card, orientation="upright")],
+        user_context="", language="en",
+    )
+
+
+def test_tarot_request_validation():
+    validate_tarot_request(tarot_request())
+    with pytest.raises(ValueError, match="Invalid card"):
+        validate_tarot_request(tarot_request(card="The Plumber"))
+    with pytest.raises(ValueError, match="Unsupported spread"):
+        validate_tarot_request(tarot_request(spread="Horseshoe"))
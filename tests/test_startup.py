@@ -0,0 +1,133 @@
+# tests/test_startup.py
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from app.core import startup
+from app.core.config import settings
+from app.services.database import counsellor_database_services, partition_database_services, tarot_database_services
+from app.services.database.batch_writer import BatchWriter
+from app.services.streaming import resumable
+
+
+class FakeWriter:
+    def __init__(self):
+        self.closed = False
+        self.rows = []
+
+    def submit(self, row):
+        if self.closed:
+            raise RuntimeError("closed")
+        self.rows.append(row)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_shutdown_cancels_background_tasks_before_closing_writers(monkeypatch):
+    writers = [FakeWriter(), FakeWriter()]
+    monkeypatch.setattr(tarot_database_services, "tarot_history_writer", writers[0])
+    monkeypatch.setattr(counsellor_database_services, "counsellor_message_writer", writers[1])
+    app = FastAPI()
+
+    async def run():
+        app.state.warmup_task = asyncio.create_task(asyncio.sleep(3600))
+        app.state.partition_task = asyncio.create_task(asyncio.sleep(3600))
+        await startup.shutdown_event(app)
+        return app.state.warmup_task, app.state.partition_task
+
+    tasks = asyncio.run(run())
+
+    assert all(task.cancelled() for task in tasks)
+    assert all(writer.closed for writer in writers)
+
+
+def test_shutdown_without_background_tasks(monkeypatch):
+    monkeypatch.setattr(tarot_database_services, "tarot_history_writer", FakeWriter())
+    monkeypatch.setattr(counsellor_database_services, "counsellor_message_writer", FakeWriter())
+
+    asyncio.run(startup.shutdown_event(FastAPI()))
+
+
+def test_shutdown_lets_streams_save_before_closing_writers(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(tarot_database_services, "tarot_history_writer", FakeWriter())
+    monkeypatch.setattr(counsellor_database_services, "counsellor_message_writer", writer)
+    monkeypatch.setattr(resumable, "_background_tasks", set())
+    monkeypatch.setattr(settings, "STREAM_SHUTDOWN_DRAIN_SECONDS", 0.05)
+
+    async def finishing_stream():
+        await asyncio.sleep(0.01)
+        writer.submit({"turn": "finished"})
+
+    async def stuck_stream():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            # What a cancelled counsellor stream does with its partial reply.
+            writer.submit({"turn": "partial"})
+            raise
+
+    async def run():
+        resumable.spawn(finishing_stream())
+        resumable.spawn(stuck_stream())
+        await startup.shutdown_event(FastAPI())
+
+    asyncio.run(run())
+
+    assert writer.rows == [{"turn": "finished"}, {"turn": "partial"}]
+    assert writer.closed
+
+
+def test_rows_submitted_after_close_are_counted_as_failed():
+    writer = BatchWriter(counsellor_database_services.CounsellorMessageHistory)
+    failed = lambda: REGISTRY.get_sample_value("app_batch_writer_rows_total", {"table": writer.table, "result": "failed"}) or 0
+    before = failed()
+
+    async def run():
+        await writer.close()
+        writer.submit({"user_id": 1})
+
+    with pytest.raises(RuntimeError, match="closed"):
+        asyncio.run(run())
+
+    assert failed() == before + 1
+
+
+def partition_runs(result):
+    return REGISTRY.get_sample_value("app_message_partition_runs_total", {"result": result}) or 0
+
+
+def run_partition_check(monkeypatch, ensure):
+    monkeypatch.setattr(partition_database_services, "ensure_message_partitions", ensure)
+
+    async def run():
+        task = asyncio.create_task(partition_database_services.maintain_message_partitions())
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def test_failed_partition_run_is_counted(monkeypatch):
+    async def fail():
+        raise RuntimeError("permission denied for table counsellor_message_history")
+
+    before = partition_runs("failed")
+    run_partition_check(monkeypatch, fail)
+
+    assert partition_runs("failed") == before + 1
+
+
+def test_partition_run_counts_created_partitions(monkeypatch):
+    async def create():
+        return 2
+
+    before_runs = partition_runs("ok")
+    before_created = REGISTRY.get_sample_value("app_message_partitions_created_total") or 0
+    run_partition_check(monkeypatch, create)
+
+    assert partition_runs("ok") == before_runs + 1
+    assert REGISTRY.get_sample_value("app_message_partitions_created_total") == before_created + 2
@@ -0,0 +1,43 @@
+# tests/test_vector_search.py
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.database.embedding_database_services import configure_hnsw_scan, nearest_rows_sql
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, query, params=None):
+        self.statements.append(str(query))
+
+
+def configure(rows, filtered, mode):
+    db = RecordingSession()
+    asyncio.run(configure_hnsw_scan(db, rows, filtered=filtered, mode=mode))
+    return db.statements
+
+
+@pytest.mark.parametrize("mode", ["full", "halfvec", "binary"])
+def test_ef_search_covers_the_rows_fetched_from_the_index(mode, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_RESCORE_FACTOR", 4)
+    fetched = 100 if mode == "full" else 400
+
+    assert configure(100, False, mode) == [f"SET LOCAL hnsw.ef_search = {fetched}"]
+    # The quantized query asks the index for that many rows.
+    assert ("* 4" in nearest_rows_sql("id", "t", "embedding", "'[0]'::vector", mode=mode)) == (mode != "full")
+
+
+@pytest.mark.parametrize("mode", ["full", "halfvec", "binary"])
+def test_filtered_scans_iterate_when_enabled(mode, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_HNSW_ITERATIVE_SCAN", True)
+
+    assert configure(100, True, mode)[-1] == "SET LOCAL hnsw.iterative_scan = relaxed_order"
+    assert len(configure(100, False, mode)) == 1
+
+
+def test_iterative_scan_is_off_by_default():
+    assert len(configure(100, True, "binary")) == 1